@@ -0,0 +1,67 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+/**
+ * @title ArbInboxMock
+ * @author Sigp
+ * @notice Local stand-in for the Arbitrum `Inbox` used by `ArbAdapter`. Retryable tickets are recorded and
+           logged instead of being sent to L2: a relayer replays each one on the L2 chain, calling `to` with
+           `data` from the aliased address of `from`
+ * @dev like the Inbox, only the hash of the ticket's data is stored, the data itself is in the log
+ */
+contract ArbInboxMock {
+  struct Ticket {
+    address from;
+    address to;
+    uint256 gasLimit;
+    uint256 value;
+    bytes32 dataHash;
+  }
+
+  Ticket[] internal _tickets;
+
+  event RetryableTicketCreated(
+    uint256 indexed ticketId,
+    address indexed from,
+    address indexed to,
+    uint256 gasLimit,
+    uint256 value,
+    bytes data
+  );
+
+  /// @dev same formula as the Arbitrum Inbox
+  function calculateRetryableSubmissionFee(
+    uint256 dataLength,
+    uint256 baseFee
+  ) public view returns (uint256) {
+    return (1400 + 6 * dataLength) * (baseFee == 0 ? block.basefee : baseFee);
+  }
+
+  function createRetryableTicket(
+    address to,
+    uint256 l2CallValue,
+    uint256 maxSubmissionCost,
+    address,
+    address,
+    uint256 gasLimit,
+    uint256 maxFeePerGas,
+    bytes calldata data
+  ) external payable returns (uint256) {
+    require(
+      msg.value >= maxSubmissionCost + l2CallValue + gasLimit * maxFeePerGas,
+      'ArbInboxMock: insufficient value'
+    );
+    uint256 ticketId = _tickets.length;
+    _tickets.push(Ticket(msg.sender, to, gasLimit, msg.value, keccak256(data)));
+    emit RetryableTicketCreated(ticketId, msg.sender, to, gasLimit, msg.value, data);
+    return ticketId;
+  }
+
+  function ticketsCount() external view returns (uint256) {
+    return _tickets.length;
+  }
+
+  function getTicket(uint256 ticketId) external view returns (Ticket memory) {
+    return _tickets[ticketId];
+  }
+}
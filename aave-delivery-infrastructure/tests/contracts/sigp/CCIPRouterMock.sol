@@ -0,0 +1,157 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {IERC20} from 'solidity-utils/contracts/oz-common/interfaces/IERC20.sol';
+import {IRouterClient} from '../crosschain-infra/adapters/ccip/interfaces/IRouterClient.sol';
+import {IAny2EVMMessageReceiver} from '../crosschain-infra/adapters/ccip/interfaces/IAny2EVMMessageReceiver.sol';
+import {Client} from '../crosschain-infra/adapters/ccip/lib/Client.sol';
+
+/**
+ * @title CCIPRouterMock
+ * @author Sigp
+ * @notice Local stand-in for the CCIP router, used by `CCIPAdapter`. `ccipSend()` charges the quoted fee (in LINK,
+           or in native when the fee token is address(0)) and logs the message with a deterministic id,
+           `routeMessages()` delivers a batch of messages into the receivers' `ccipReceive()`
+ * @dev fee = baseFee + feePerByte * data length + gasPrice * gas limit (from the EVMExtraArgsV1).
+        message id = keccak256(abi.encode(source selector, destination selector, sequence number, sender,
+        receiver, data)), sequence numbers start at 1 per destination
+ */
+contract CCIPRouterMock is IRouterClient {
+  struct Delivery {
+    Client.Any2EVMMessage message;
+    address receiver;
+    uint256 gasLimit;
+  }
+
+  // gas limit when the message has no extra args, as CCIP's default
+  uint256 public constant DEFAULT_GAS_LIMIT = 200_000;
+
+  uint64 public immutable CHAIN_SELECTOR;
+  address public immutable LINK_TOKEN;
+  uint256 public baseFee;
+  uint256 public feePerByte;
+  uint256 public gasPrice;
+  uint256 public feesCollected;
+
+  mapping(uint64 => bool) public supportedChains;
+  mapping(uint64 => uint64) public sequenceNumbers;
+  mapping(bytes32 => bool) public executedMessages;
+
+  event CCIPSendRequested(
+    bytes32 indexed messageId,
+    uint64 indexed destinationChainSelector,
+    uint64 sequenceNumber,
+    address sender,
+    uint256 fee,
+    Client.EVM2AnyMessage message
+  );
+  event MessageExecuted(
+    bytes32 indexed messageId,
+    uint64 indexed sourceChainSelector,
+    address indexed receiver,
+    bool success,
+    bytes reason
+  );
+
+  constructor(
+    uint64 chainSelector,
+    address linkToken,
+    uint256 _baseFee,
+    uint256 _feePerByte,
+    uint256 _gasPrice
+  ) {
+    CHAIN_SELECTOR = chainSelector;
+    LINK_TOKEN = linkToken;
+    setFees(_baseFee, _feePerByte, _gasPrice);
+  }
+
+  function setFees(uint256 _baseFee, uint256 _feePerByte, uint256 _gasPrice) public {
+    baseFee = _baseFee;
+    feePerByte = _feePerByte;
+    gasPrice = _gasPrice;
+  }
+
+  function setChainSupported(uint64 chainSelector, bool supported) external {
+    supportedChains[chainSelector] = supported;
+  }
+
+  function isChainSupported(uint64 chainSelector) external view returns (bool) {
+    return supportedChains[chainSelector];
+  }
+
+  function getSupportedTokens(uint64) external pure returns (address[] memory) {
+    return new address[](0);
+  }
+
+  function getFee(uint64, Client.EVM2AnyMessage memory message) public view returns (uint256) {
+    return baseFee + feePerByte * message.data.length + gasPrice * _gasLimit(message.extraArgs);
+  }
+
+  function ccipSend(
+    uint64 destinationChainSelector,
+    Client.EVM2AnyMessage calldata message
+  ) external payable returns (bytes32) {
+    if (!supportedChains[destinationChainSelector]) {
+      revert UnsupportedDestinationChain(destinationChainSelector);
+    }
+    uint256 fee = getFee(destinationChainSelector, message);
+    if (message.feeToken == address(0)) {
+      if (msg.value < fee) revert InsufficientFeeTokenAmount();
+    } else {
+      if (msg.value != 0) revert InvalidMsgValue();
+      require(message.feeToken == LINK_TOKEN, 'CCIPRouterMock: fee token not supported');
+      require(
+        IERC20(LINK_TOKEN).transferFrom(msg.sender, address(this), fee),
+        'CCIPRouterMock: fee transfer failed'
+      );
+    }
+    feesCollected += fee;
+
+    uint64 sequenceNumber = ++sequenceNumbers[destinationChainSelector];
+    bytes32 messageId = _messageId(destinationChainSelector, sequenceNumber, message);
+    emit CCIPSendRequested(messageId, destinationChainSelector, sequenceNumber, msg.sender, fee, message);
+    return messageId;
+  }
+
+  function routeMessages(Delivery[] calldata deliveries) external {
+    for (uint256 i = 0; i < deliveries.length; i++) {
+      Delivery calldata delivery = deliveries[i];
+      bytes32 messageId = delivery.message.messageId;
+      require(!executedMessages[messageId], 'CCIPRouterMock: message already executed');
+      try
+        IAny2EVMMessageReceiver(delivery.receiver).ccipReceive{gas: delivery.gasLimit}(delivery.message)
+      {
+        executedMessages[messageId] = true;
+        emit MessageExecuted(messageId, delivery.message.sourceChainSelector, delivery.receiver, true, '');
+      } catch (bytes memory reason) {
+        emit MessageExecuted(messageId, delivery.message.sourceChainSelector, delivery.receiver, false, reason);
+      }
+    }
+  }
+
+  function _messageId(
+    uint64 destinationChainSelector,
+    uint64 sequenceNumber,
+    Client.EVM2AnyMessage calldata message
+  ) internal view returns (bytes32) {
+    return
+      keccak256(
+        abi.encode(
+          CHAIN_SELECTOR,
+          destinationChainSelector,
+          sequenceNumber,
+          msg.sender,
+          message.receiver,
+          message.data
+        )
+      );
+  }
+
+  /// @dev abi.encodeWithSelector(EVM_EXTRA_ARGS_V1_TAG, EVMExtraArgsV1(gasLimit, strict))
+  function _gasLimit(bytes memory extraArgs) internal pure returns (uint256 gasLimit) {
+    if (extraArgs.length < 36 || bytes4(extraArgs) != Client.EVM_EXTRA_ARGS_V1_TAG) return DEFAULT_GAS_LIMIT;
+    assembly {
+      gasLimit := mload(add(extraArgs, 36))
+    }
+  }
+}
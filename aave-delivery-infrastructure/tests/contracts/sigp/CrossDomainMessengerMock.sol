@@ -0,0 +1,77 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+/**
+ * @title CrossDomainMessengerMock
+ * @author Sigp
+ * @notice Local stand-in for the Optimism / Base / Metis CrossDomainMessenger used by `OpAdapter`, `CBaseAdapter`
+           and `MetisAdapter`. On the origin chain it records and logs outbound messages (`SentMessage`), on the
+           destination chain a relayer replays them with `relayMessage()`, which calls the target with
+           `xDomainMessageSender()` set to the origin sender, like the L2 messenger does
+ */
+contract CrossDomainMessengerMock {
+  // default value of the L2 messenger when no message is being relayed
+  address internal constant DEFAULT_SENDER = 0x000000000000000000000000000000000000dEaD;
+
+  address internal _xDomainMessageSender = DEFAULT_SENDER;
+  uint256 public messageNonce;
+  mapping(bytes32 => bool) public successfulMessages;
+
+  event SentMessage(
+    address indexed target,
+    address sender,
+    bytes message,
+    uint256 messageNonce,
+    uint256 gasLimit
+  );
+  event SentMessageViaChainId(uint256 indexed chainId, uint256 indexed messageNonce);
+  event RelayedMessage(bytes32 indexed msgHash);
+  event FailedRelayedMessage(bytes32 indexed msgHash);
+
+  function xDomainMessageSender() external view returns (address) {
+    require(_xDomainMessageSender != DEFAULT_SENDER, 'CrossDomainMessengerMock: not relaying');
+    return _xDomainMessageSender;
+  }
+
+  function sendMessage(address target, bytes calldata message, uint32 gasLimit) external {
+    emit SentMessage(target, msg.sender, message, messageNonce++, gasLimit);
+  }
+
+  /// @dev Metis
+  function sendMessageViaChainId(
+    uint256 chainId,
+    address target,
+    bytes calldata message,
+    uint32 gasLimit
+  ) external {
+    emit SentMessageViaChainId(chainId, messageNonce);
+    emit SentMessage(target, msg.sender, message, messageNonce++, gasLimit);
+  }
+
+  function relayMessage(
+    address target,
+    address sender,
+    bytes calldata message,
+    uint256 nonce
+  ) external {
+    bytes32 msgHash = keccak256(abi.encodeWithSignature(
+      'relayMessage(address,address,bytes,uint256)',
+      target,
+      sender,
+      message,
+      nonce
+    ));
+    require(!successfulMessages[msgHash], 'CrossDomainMessengerMock: message already relayed');
+
+    _xDomainMessageSender = sender;
+    (bool success, ) = target.call(message);
+    _xDomainMessageSender = DEFAULT_SENDER;
+
+    if (success) {
+      successfulMessages[msgHash] = true;
+      emit RelayedMessage(msgHash);
+    } else {
+      emit FailedRelayedMessage(msgHash);
+    }
+  }
+}
@@ -0,0 +1,64 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {Envelope, EncodedEnvelope, EnvelopeUtils, Transaction, EncodedTransaction, TransactionUtils} from '../crosschain-infra/libs/EncodingUtils.sol';
+
+/**
+ * @title EncodingUtilsMock
+ * @author Sigp
+ * @notice Exposes the EnvelopeUtils / TransactionUtils libraries, batched so many cases can be
+ * checked in a single eth_call
+ */
+contract EncodingUtilsMock {
+  function encodeEnvelopes(
+    Envelope[] memory envelopes
+  ) external pure returns (bytes[] memory data, bytes32[] memory ids) {
+    data = new bytes[](envelopes.length);
+    ids = new bytes32[](envelopes.length);
+    for (uint256 i = 0; i < envelopes.length; i++) {
+      EncodedEnvelope memory encodedEnvelope = envelopes[i].encode();
+      data[i] = encodedEnvelope.data;
+      ids[i] = encodedEnvelope.id;
+    }
+  }
+
+  function decodeEnvelopes(
+    bytes[] memory data
+  ) external pure returns (Envelope[] memory envelopes, bytes32[] memory ids) {
+    envelopes = new Envelope[](data.length);
+    ids = new bytes32[](data.length);
+    for (uint256 i = 0; i < data.length; i++) {
+      envelopes[i] = EnvelopeUtils.decode(data[i]);
+      ids[i] = EnvelopeUtils.getId(data[i]);
+    }
+  }
+
+  function encodeTransactions(
+    Transaction[] memory transactions
+  )
+    external
+    pure
+    returns (bytes[] memory data, bytes32[] memory ids, bytes32[] memory envelopeIds)
+  {
+    data = new bytes[](transactions.length);
+    ids = new bytes32[](transactions.length);
+    envelopeIds = new bytes32[](transactions.length);
+    for (uint256 i = 0; i < transactions.length; i++) {
+      EncodedTransaction memory encodedTransaction = transactions[i].encode();
+      data[i] = encodedTransaction.data;
+      ids[i] = encodedTransaction.id;
+      envelopeIds[i] = transactions[i].getEnvelopeId();
+    }
+  }
+
+  function decodeTransactions(
+    bytes[] memory data
+  ) external pure returns (Transaction[] memory transactions, Envelope[] memory envelopes) {
+    transactions = new Transaction[](data.length);
+    envelopes = new Envelope[](data.length);
+    for (uint256 i = 0; i < data.length; i++) {
+      transactions[i] = TransactionUtils.decode(data[i]);
+      envelopes[i] = transactions[i].getEnvelope();
+    }
+  }
+}
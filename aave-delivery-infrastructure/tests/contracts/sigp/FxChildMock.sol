@@ -0,0 +1,28 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {IFxMessageProcessor} from '../crosschain-infra/adapters/polygon/interfaces/IFxMessageProcessor.sol';
+
+/**
+ * @title FxChildMock
+ * @author Sigp
+ * @notice Local stand-in for the Polygon `FxChild`. `onStateReceive()` is called by a relayer (instead of the
+           Polygon system address) with the payload of `FxRootMock.StateSynced`, every state id at most once
+ */
+contract FxChildMock {
+  mapping(uint256 => bool) public processedStates;
+
+  event NewFxMessage(address rootMessageSender, address receiver, bytes data);
+
+  function onStateReceive(uint256 stateId, bytes calldata _data) external {
+    require(!processedStates[stateId], 'FxChildMock: state already processed');
+    processedStates[stateId] = true;
+
+    (address rootMessageSender, address receiver, bytes memory data) = abi.decode(
+      _data,
+      (address, address, bytes)
+    );
+    emit NewFxMessage(rootMessageSender, receiver, data);
+    IFxMessageProcessor(receiver).processMessageFromRoot(stateId, rootMessageSender, data);
+  }
+}
@@ -0,0 +1,26 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {IFxStateSender} from '../crosschain-infra/adapters/polygon/interfaces/IFxStateSender.sol';
+
+/**
+ * @title FxRootMock
+ * @author Sigp
+ * @notice Local stand-in for the Polygon `FxRoot` used by `PolygonAdapter`. Instead of syncing state to Polygon it
+           logs every message, with the same payload as the `StateSender`, for a relayer to replay into
+           `FxChildMock.onStateReceive()` on the destination chain
+ */
+contract FxRootMock is IFxStateSender {
+  address public immutable FX_CHILD;
+  uint256 public counter;
+
+  event StateSynced(uint256 indexed id, address indexed contractAddress, bytes data);
+
+  constructor(address fxChild) {
+    FX_CHILD = fxChild;
+  }
+
+  function sendMessageToChild(address _receiver, bytes calldata _data) external {
+    emit StateSynced(++counter, FX_CHILD, abi.encode(msg.sender, _receiver, _data));
+  }
+}
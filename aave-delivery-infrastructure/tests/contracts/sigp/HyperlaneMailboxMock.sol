@@ -0,0 +1,82 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {IMessageRecipient} from 'hyperlane-monorepo/interfaces/IMessageRecipient.sol';
+import {Message} from 'hyperlane-monorepo/libs/Message.sol';
+import {TypeCasts} from 'hyperlane-monorepo/libs/TypeCasts.sol';
+
+/**
+ * @title HyperlaneMailboxMock
+ * @author Sigp
+ * @notice Local stand-in for the Hyperlane `Mailbox`, used by `HyperLaneAdapter`. `dispatch()` formats and logs the
+           message like the Mailbox does (same format, same id), `processBatch()` delivers a batch of formatted
+           messages into the recipients' `handle()`, without any ISM
+ * @dev a message whose `handle()` reverts is logged with `ProcessFailed` and can be processed again
+ */
+contract HyperlaneMailboxMock {
+  using Message for bytes;
+  using TypeCasts for address;
+
+  uint8 public constant VERSION = 0;
+
+  uint32 public immutable localDomain;
+  uint32 public count;
+
+  mapping(bytes32 => bool) public delivered;
+
+  event Dispatch(
+    address indexed sender,
+    uint32 indexed destination,
+    bytes32 indexed recipient,
+    bytes message
+  );
+  event DispatchId(bytes32 indexed messageId);
+  event Process(uint32 indexed origin, bytes32 indexed sender, address indexed recipient);
+  event ProcessId(bytes32 indexed messageId);
+  event ProcessFailed(bytes32 indexed messageId, bytes reason);
+
+  constructor(uint32 _localDomain) {
+    localDomain = _localDomain;
+  }
+
+  function dispatch(
+    uint32 destinationDomain,
+    bytes32 recipientAddress,
+    bytes calldata messageBody
+  ) external returns (bytes32) {
+    bytes memory message = Message.formatMessage(
+      VERSION,
+      count++,
+      localDomain,
+      msg.sender.addressToBytes32(),
+      destinationDomain,
+      recipientAddress,
+      messageBody
+    );
+    bytes32 messageId = Message.id(message);
+    emit Dispatch(msg.sender, destinationDomain, recipientAddress, message);
+    emit DispatchId(messageId);
+    return messageId;
+  }
+
+  function processBatch(bytes[] calldata messages, uint256 gasLimit) external {
+    for (uint256 i = 0; i < messages.length; i++) {
+      bytes calldata message = messages[i];
+      require(message.version() == VERSION, 'HyperlaneMailboxMock: wrong version');
+      require(message.destination() == localDomain, 'HyperlaneMailboxMock: wrong domain');
+      bytes32 messageId = keccak256(message);
+      require(!delivered[messageId], 'HyperlaneMailboxMock: already delivered');
+
+      address recipient = message.recipientAddress();
+      try
+        IMessageRecipient(recipient).handle{gas: gasLimit}(message.origin(), message.sender(), message.body())
+      {
+        delivered[messageId] = true;
+        emit Process(message.origin(), message.sender(), recipient);
+        emit ProcessId(messageId);
+      } catch (bytes memory reason) {
+        emit ProcessFailed(messageId, reason);
+      }
+    }
+  }
+}
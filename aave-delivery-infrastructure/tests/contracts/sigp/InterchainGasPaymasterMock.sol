@@ -0,0 +1,47 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {IInterchainGasPaymaster} from 'hyperlane-monorepo/interfaces/IInterchainGasPaymaster.sol';
+
+/**
+ * @title InterchainGasPaymasterMock
+ * @author Sigp
+ * @notice Local stand-in for the Hyperlane interchain gas paymaster, used by `HyperLaneAdapter`: quotes
+           gasAmount * gas price of the destination domain (or the default one) and keeps the payment
+ */
+contract InterchainGasPaymasterMock is IInterchainGasPaymaster {
+  uint256 public defaultGasPrice;
+  uint256 public feesCollected;
+
+  mapping(uint32 => uint256) public gasPrices;
+
+  constructor(uint256 _defaultGasPrice) {
+    defaultGasPrice = _defaultGasPrice;
+  }
+
+  function setGasPrice(uint32 destinationDomain, uint256 gasPrice) external {
+    gasPrices[destinationDomain] = gasPrice;
+  }
+
+  function quoteGasPayment(uint32 destinationDomain, uint256 gasAmount) public view returns (uint256) {
+    uint256 gasPrice = gasPrices[destinationDomain];
+    return gasAmount * (gasPrice == 0 ? defaultGasPrice : gasPrice);
+  }
+
+  function payForGas(
+    bytes32 messageId,
+    uint32 destinationDomain,
+    uint256 gasAmount,
+    address refundAddress
+  ) external payable {
+    uint256 payment = quoteGasPayment(destinationDomain, gasAmount);
+    require(msg.value >= payment, 'InterchainGasPaymasterMock: insufficient payment');
+    feesCollected += payment;
+    emit GasPayment(messageId, gasAmount, payment);
+
+    if (msg.value > payment) {
+      (bool success, ) = refundAddress.call{value: msg.value - payment}('');
+      require(success, 'InterchainGasPaymasterMock: refund failed');
+    }
+  }
+}
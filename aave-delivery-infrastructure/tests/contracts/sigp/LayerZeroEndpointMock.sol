@@ -0,0 +1,153 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {ILayerZeroReceiver} from 'solidity-examples/interfaces/ILayerZeroReceiver.sol';
+
+/**
+ * @title LayerZeroEndpointMock
+ * @author Sigp
+ * @notice Local stand-in for a LayerZero (v1) endpoint, used by `LayerZeroAdapter`. `send()` charges the quoted
+           native fee and logs the packet with its outbound nonce (the path seen by the destination is
+           abi.encodePacked(srcAddress, dstAddress)), `receivePayloads()` delivers a batch of packets
+           into the receiving applications, in inbound nonce order per path
+ * @dev fee = baseFee + feePerByte * payload length + gasPrice * destination gas limit (from the adapter params).
+        A packet whose `lzReceive()` reverts is logged as failed and the rest of the batch is delivered
+ */
+contract LayerZeroEndpointMock {
+  struct Packet {
+    uint16 srcChainId;
+    // path, as seen by the receiver: abi.encodePacked(source application, destination application)
+    bytes srcAddress;
+    address dstAddress;
+    uint64 nonce;
+    uint256 gasLimit;
+    bytes payload;
+  }
+
+  // gas limit when the adapter params don't have one, as LayerZero's default
+  uint256 public constant DEFAULT_GAS_LIMIT = 200_000;
+
+  uint16 public immutable CHAIN_ID;
+  uint256 public baseFee;
+  uint256 public feePerByte;
+  uint256 public gasPrice;
+  uint256 public feesCollected;
+
+  mapping(uint16 => mapping(address => uint64)) public outboundNonce;
+  mapping(uint16 => mapping(bytes => uint64)) public inboundNonce;
+
+  event PacketSent(
+    uint16 indexed dstChainId,
+    address indexed dstAddress,
+    uint64 indexed nonce,
+    address srcAddress,
+    uint256 gasLimit,
+    uint256 fee,
+    bytes payload
+  );
+  event PacketReceived(
+    uint16 indexed srcChainId,
+    address indexed dstAddress,
+    uint64 indexed nonce,
+    bool success,
+    bytes reason
+  );
+
+  constructor(uint16 chainId, uint256 _baseFee, uint256 _feePerByte, uint256 _gasPrice) {
+    CHAIN_ID = chainId;
+    setFees(_baseFee, _feePerByte, _gasPrice);
+  }
+
+  function setFees(uint256 _baseFee, uint256 _feePerByte, uint256 _gasPrice) public {
+    baseFee = _baseFee;
+    feePerByte = _feePerByte;
+    gasPrice = _gasPrice;
+  }
+
+  function getChainId() external view returns (uint16) {
+    return CHAIN_ID;
+  }
+
+  function estimateFees(
+    uint16,
+    address,
+    bytes calldata _payload,
+    bool,
+    bytes calldata _adapterParams
+  ) external view returns (uint256 nativeFee, uint256 zroFee) {
+    return (_fee(_payload.length, _gasLimit(_adapterParams)), 0);
+  }
+
+  function getOutboundNonce(uint16 _dstChainId, address _srcAddress) external view returns (uint64) {
+    return outboundNonce[_dstChainId][_srcAddress];
+  }
+
+  function getInboundNonce(uint16 _srcChainId, bytes calldata _srcAddress) external view returns (uint64) {
+    return inboundNonce[_srcChainId][_srcAddress];
+  }
+
+  function send(
+    uint16 _dstChainId,
+    bytes calldata _destination,
+    bytes calldata _payload,
+    address payable _refundAddress,
+    address,
+    bytes calldata _adapterParams
+  ) external payable {
+    require(_destination.length == 40, 'LayerZeroEndpointMock: invalid destination');
+    uint256 gasLimit = _gasLimit(_adapterParams);
+    uint256 fee = _fee(_payload.length, gasLimit);
+    require(msg.value >= fee, 'LayerZeroEndpointMock: not enough native for fees');
+
+    feesCollected += fee;
+    _logPacket(_dstChainId, address(bytes20(_destination[0:20])), gasLimit, fee, _payload);
+
+    if (msg.value > fee) {
+      (bool success, ) = _refundAddress.call{value: msg.value - fee}('');
+      require(success, 'LayerZeroEndpointMock: refund failed');
+    }
+  }
+
+  function receivePayloads(Packet[] calldata packets) external {
+    for (uint256 i = 0; i < packets.length; i++) {
+      Packet calldata packet = packets[i];
+      require(
+        packet.nonce == ++inboundNonce[packet.srcChainId][packet.srcAddress],
+        'LayerZeroEndpointMock: wrong nonce'
+      );
+      try
+        ILayerZeroReceiver(packet.dstAddress).lzReceive{gas: packet.gasLimit}(
+          packet.srcChainId,
+          packet.srcAddress,
+          packet.nonce,
+          packet.payload
+        )
+      {
+        emit PacketReceived(packet.srcChainId, packet.dstAddress, packet.nonce, true, '');
+      } catch (bytes memory reason) {
+        emit PacketReceived(packet.srcChainId, packet.dstAddress, packet.nonce, false, reason);
+      }
+    }
+  }
+
+  function _logPacket(
+    uint16 dstChainId,
+    address dstAddress,
+    uint256 gasLimit,
+    uint256 fee,
+    bytes calldata payload
+  ) internal {
+    uint64 nonce = ++outboundNonce[dstChainId][msg.sender];
+    emit PacketSent(dstChainId, dstAddress, nonce, msg.sender, gasLimit, fee, payload);
+  }
+
+  function _fee(uint256 payloadLength, uint256 gasLimit) internal view returns (uint256) {
+    return baseFee + feePerByte * payloadLength + gasPrice * gasLimit;
+  }
+
+  /// @dev type 1 adapter params: abi.encodePacked(uint16 version, uint256 gasLimit)
+  function _gasLimit(bytes calldata adapterParams) internal pure returns (uint256) {
+    if (adapterParams.length < 34) return DEFAULT_GAS_LIMIT;
+    return uint256(bytes32(adapterParams[2:34]));
+  }
+}
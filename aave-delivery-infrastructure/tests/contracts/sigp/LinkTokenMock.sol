@@ -0,0 +1,54 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+/**
+ * @title LinkTokenMock
+ * @author Sigp
+ * @notice Minimal mintable ERC20 standing in for LINK, the fee token of `CCIPRouterMock`
+ */
+contract LinkTokenMock {
+  string public constant name = 'ChainLink Token';
+  string public constant symbol = 'LINK';
+  uint8 public constant decimals = 18;
+
+  uint256 public totalSupply;
+  mapping(address => uint256) public balanceOf;
+  mapping(address => mapping(address => uint256)) public allowance;
+
+  event Transfer(address indexed from, address indexed to, uint256 value);
+  event Approval(address indexed owner, address indexed spender, uint256 value);
+
+  function mint(address to, uint256 amount) external {
+    totalSupply += amount;
+    balanceOf[to] += amount;
+    emit Transfer(address(0), to, amount);
+  }
+
+  function approve(address spender, uint256 amount) external returns (bool) {
+    allowance[msg.sender][spender] = amount;
+    emit Approval(msg.sender, spender, amount);
+    return true;
+  }
+
+  function transfer(address to, uint256 amount) external returns (bool) {
+    _transfer(msg.sender, to, amount);
+    return true;
+  }
+
+  function transferFrom(address from, address to, uint256 amount) external returns (bool) {
+    uint256 allowed = allowance[from][msg.sender];
+    if (allowed != type(uint256).max) {
+      require(allowed >= amount, 'LinkTokenMock: insufficient allowance');
+      allowance[from][msg.sender] = allowed - amount;
+    }
+    _transfer(from, to, amount);
+    return true;
+  }
+
+  function _transfer(address from, address to, uint256 amount) internal {
+    require(balanceOf[from] >= amount, 'LinkTokenMock: insufficient balance');
+    balanceOf[from] -= amount;
+    balanceOf[to] += amount;
+    emit Transfer(from, to, amount);
+  }
+}
@@ -0,0 +1,31 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.8;
+
+import {IBaseReceiverPortal} from '../crosschain-infra/interfaces/IBaseReceiverPortal.sol';
+
+/**
+ * @title ReceiverPortalMock
+ * @author Sigp
+ * @notice Destination of bridged envelopes in simulations, counts and logs every delivered message
+ */
+contract ReceiverPortalMock is IBaseReceiverPortal {
+  uint256 public messagesReceived;
+  bool public toRevert;
+
+  event MessageReceived(address indexed originSender, uint256 indexed originChainId, bytes message);
+
+  // in some case, we need the delivery to fail, so we set the `toRevert` variable to true
+  function setToRevert(bool _toRevert) external {
+    toRevert = _toRevert;
+  }
+
+  function receiveCrossChainMessage(
+    address originSender,
+    uint256 originChainId,
+    bytes memory message
+  ) external {
+    require(!toRevert, 'ReceiverPortalMock: reverted');
+    messagesReceived++;
+    emit MessageReceived(originSender, originChainId, message);
+  }
+}
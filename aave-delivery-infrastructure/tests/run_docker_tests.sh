@@ -3,5 +3,10 @@
 HERE="$( cd "$( dirname "$0" )" >/dev/null 2>&1 && pwd )"
 # Builds and runs the tests via Docker.
 
-# set the build context to the parent directory
-cd $HERE/../ && docker build -f tests/Dockerfile -t review-testing . && docker run -it review-testing
+CACHE="${AAVE_COMPILE_CACHE:-$HOME/.cache/aave-public-tests/brownie}"
+mkdir -p "$CACHE"
+
+# set the build context to the repository root, for the shared tools/ folder
+# the compile cache is mounted so later runs skip compiling the unchanged contracts
+cd $HERE/../../ && docker build -f aave-delivery-infrastructure/tests/Dockerfile -t review-testing . && \
+docker run -it -v "$CACHE":/root/.cache/aave-public-tests/brownie review-testing
@@ -0,0 +1,194 @@
+"""
+Bridge adapter count scaling of the forwarder
+
+Purposes:
+- Grows the number of forwarder bridge adapters of a destination chain (1 to 64 by default,
+  a fresh destination chain id per count) and measures the gas of:
+    enableBridgeAdapters:   enabling all of them in one call (every push scans the chain's array)
+    forwardMessage:         delegatecalls every adapter, one log per adapter
+    retryTransaction:       retry lists of several sizes, made of the last registered adapters
+                            (worst case of the O(n^2) uniqueness check + linear lookup)
+    disableBridgeAdapters:  disabling all of them in one call
+- Fits gas = a + b*n + c*n^2 per operation and extrapolates the adapter count at which each
+  operation would no longer fit in a block of the usual chains
+
+Adapters are `Empty` contracts, so the adapter's own bridging costs are left out: the numbers
+are the forwarder's overhead only.
+
+Example:
+scaling = AdapterScaling(cross_chain_controller, owner, carol, Empty)
+results = scaling.run(adapter_counts=[1, 2, 4, 8, 16, 32, 64])
+write_csv("reports/adapter_scaling.csv", results)
+for operation, crossings in block_limit_crossings(results).items():
+    print(operation, crossings)  # {"ethereum": <adapter count>, "avalanche": ..., ...}
+
+"""
+
+import csv
+import math
+import os
+
+from brownie import accounts
+
+FIRST_DESTINATION_CHAIN_ID = 40_000
+FIELDS = ("operation", "adapters", "retried_adapters", "gas")
+
+# block gas limits, at the time of writing
+BLOCK_GAS_LIMITS = {
+    "ethereum": 30_000_000,
+    "polygon": 30_000_000,
+    "avalanche": 15_000_000,
+    "gnosis": 17_000_000,
+}
+
+
+class Measurement:
+    __slots__ = ("operation", "adapters", "retried_adapters", "gas")
+
+    def __init__(self, operation, adapters, retried_adapters, gas):
+        self.operation = operation
+        self.adapters = adapters
+        self.retried_adapters = retried_adapters
+        self.gas = gas
+
+    @property
+    def key(self):
+        """Series the measurement belongs to, e.g. "retryTransaction[all]"."""
+        if self.retried_adapters is None:
+            return self.operation
+        if self.retried_adapters == self.adapters:
+            return f"{self.operation}[all]"
+        if self.retried_adapters == 1:
+            return f"{self.operation}[1]"
+        return f"{self.operation}[half]"
+
+    def __repr__(self):
+        return f"Measurement({self.key}, adapters={self.adapters}, gas={self.gas})"
+
+
+class AdapterScaling:
+    def __init__(self, cross_chain_controller, owner, sender, adapter_container, message=b"adapter scaling" * 4):
+        """`sender` must be an approved sender of the controller."""
+        self.cross_chain_controller = cross_chain_controller
+        self.owner = owner
+        self.sender = sender
+        self.adapter_container = adapter_container
+        self.message = message
+        self.destination = accounts.add().address
+        self._destination_chain_id = FIRST_DESTINATION_CHAIN_ID
+        self._adapters = []
+
+    def adapters(self, count):
+        """The first `count` adapters, shared by every destination chain."""
+        while len(self._adapters) < count:
+            self._adapters.append(self.adapter_container.deploy({"from": self.owner}))
+        return self._adapters[:count]
+
+    @staticmethod
+    def retry_sizes(count):
+        return sorted({1, max(1, count // 2), count})
+
+    def measure(self, count):
+        controller = self.cross_chain_controller
+        owner = {"from": self.owner}
+        chain_id = self._destination_chain_id
+        self._destination_chain_id += 1
+        adapters = self.adapters(count)
+        results = []
+
+        tx = controller.enableBridgeAdapters([(adapter, adapter, chain_id) for adapter in adapters], owner)
+        results.append(Measurement("enableBridgeAdapters", count, None, tx.gas_used))
+
+        tx = controller.forwardMessage(chain_id, self.destination, 0, self.message, {"from": self.sender})
+        results.append(Measurement("forwardMessage", count, None, tx.gas_used))
+        encoded_transaction = tx.events["TransactionForwardingAttempted"][0]["encodedTransaction"]
+
+        registered = [config[1] for config in controller.getForwarderBridgeAdaptersByChain(chain_id)]
+        for size in self.retry_sizes(count):
+            # the last registered adapters are the ones found last by the lookup
+            tx = controller.retryTransaction(encoded_transaction, 0, registered[-size:][::-1], owner)
+            results.append(Measurement("retryTransaction", count, size, tx.gas_used))
+
+        tx = controller.disableBridgeAdapters([(adapter, [chain_id]) for adapter in adapters], owner)
+        results.append(Measurement("disableBridgeAdapters", count, None, tx.gas_used))
+        return results
+
+    def run(self, adapter_counts=(1, 2, 4, 8, 16, 32, 64)):
+        return [measurement for count in adapter_counts for measurement in self.measure(count)]
+
+
+#################
+##### Model #####
+#################
+
+
+def _solve(matrix, vector):
+    """Gaussian elimination with partial pivoting, for the small normal equations of `fit_quadratic()`."""
+    n = len(vector)
+    rows = [list(map(float, row)) + [float(value)] for row, value in zip(matrix, vector)]
+    for column in range(n):
+        pivot = max(range(column, n), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        if rows[column][column] == 0:
+            raise ValueError("singular system")
+        for row in range(n):
+            if row != column:
+                factor = rows[row][column] / rows[column][column]
+                rows[row] = [a - factor * b for a, b in zip(rows[row], rows[column])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def fit_quadratic(points, quantity="adapter counts"):
+    """
+    Least squares (a, b, c) of gas = a + b*n + c*n^2 over (n, gas) points (linear with 2 distinct n).
+    `quantity` names n in errors.
+    """
+    counts = {n for n, _ in points}
+    degree = min(2, len(counts) - 1)
+    if degree < 1:
+        raise ValueError(f"at least two {quantity} are needed")
+    powers = [[n**k for k in range(degree + 1)] for n, _ in points]
+    matrix = [[sum(p[i] * p[j] for p in powers) for j in range(degree + 1)] for i in range(degree + 1)]
+    vector = [sum(p[i] * gas for p, (_, gas) in zip(powers, points)) for i in range(degree + 1)]
+    coefficients = _solve(matrix, vector)
+    return tuple(coefficients + [0.0] * (2 - degree))
+
+
+def crossing(coefficients, limit):
+    """Smallest n (adapter count, batch size...) for which the model exceeds `limit` gas (None if it never does)."""
+    a, b, c = coefficients
+    a -= limit
+    if c > 0:
+        root = (-b + math.sqrt(b * b - 4 * c * a)) / (2 * c)
+    elif b > 0:
+        root = -a / b
+    else:
+        return None
+    return max(1, math.floor(root) + 1)
+
+
+def block_limit_crossings(results, limits=BLOCK_GAS_LIMITS):
+    """{series: {chain: adapter count}} from the measurements of `AdapterScaling.run()`."""
+    series = {}
+    for measurement in results:
+        series.setdefault(measurement.key, []).append((measurement.adapters, measurement.gas))
+    crossings = {}
+    for key, points in series.items():
+        if len({n for n, _ in points}) < 2:
+            # e.g. retrying half of the adapters with a single count measured
+            crossings[key] = {name: None for name in limits}
+            continue
+        coefficients = fit_quadratic(points)
+        crossings[key] = {name: crossing(coefficients, limit) for name, limit in limits.items()}
+    return crossings
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for measurement in results:
+            writer.writerow(
+                [measurement.operation, measurement.adapters, measurement.retried_adapters or "", measurement.gas]
+            )
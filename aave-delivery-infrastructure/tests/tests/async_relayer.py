@@ -0,0 +1,411 @@
+"""
+Asyncio relayer engine for sustained cross-chain load
+
+Purposes:
+- Follows `TransactionForwardingAttempted` logs on any number of local chains without
+  blocking on receipts, and queues the deliveries per destination chain
+- Submits `receiveCrossChainMessage()` from the pool of bridge adapter accounts of each
+  destination, many at a time: every batch of queued deliveries is sent as one JSON-RPC
+  batch request, and receipts are polled in batches as well
+- Bounded queues and a cap on in-flight transactions per destination give backpressure:
+  when a destination falls behind, the followers stop reading logs for it instead of
+  buffering without limit
+- Failed submissions and reverted transactions are retried with exponential backoff
+  (relaying is idempotent, the receiver ignores confirmations it already has)
+- Keeps latency / throughput metrics, and reports delivery attempts to a callback
+
+JSON-RPC is spoken directly over aiohttp (a web3 dependency), web3's own async support
+does not cover batching. Senders must be unlocked on the destination nodes, as they are
+in `multichain.Simulator`.
+
+Example:
+with Simulator([1, 137, 43114], adapters_per_route=2, required_confirmations=2) as simulator:
+    report, metrics = asyncio.run(relay_load(simulator, envelopes=5000, batch_size=100))
+    print(report)   # end-to-end, from `forwardMessage()` to delivery
+    print(metrics)  # relayer side, from the forwarding log to the confirmation receipt
+
+"""
+
+import asyncio
+import itertools
+import time
+
+import aiohttp
+from eth_hash.auto import keccak
+
+import forwarding_logs
+from multichain import GAS, delivery_attempts
+
+RECEIVE_CROSS_CHAIN_MESSAGE = keccak(b"receiveCrossChainMessage(bytes,uint256)")[:4]
+
+
+class RpcError(Exception):
+    pass
+
+
+class AsyncRpc:
+    """Minimal JSON-RPC client, with batch requests."""
+
+    def __init__(self, url, session):
+        self.url = url
+        self.session = session
+        self._ids = itertools.count()
+
+    async def _post(self, payload):
+        async with self.session.post(self.url, json=payload) as response:
+            if response.status != 200:
+                raise RpcError(f"{self.url}: HTTP {response.status}")
+            return await response.json(content_type=None)
+
+    async def call(self, method, *params):
+        response = await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)})
+        if "error" in response:
+            raise RpcError(response["error"].get("message", response["error"]))
+        return response["result"]
+
+    async def batch(self, calls):
+        """Results of several (method, params) calls sent as one request, errors are returned as RpcError."""
+        if not calls:
+            return []
+        ids = [next(self._ids) for _ in calls]
+        payload = [
+            {"jsonrpc": "2.0", "id": id, "method": method, "params": list(params)}
+            for id, (method, params) in zip(ids, calls)
+        ]
+        responses = {response["id"]: response for response in await self._post(payload)}
+        results = []
+        for id in ids:
+            response = responses.get(id, {"error": {"message": "missing from batch response"}})
+            if "error" in response:
+                results.append(RpcError(response["error"].get("message", response["error"])))
+            else:
+                results.append(response["result"])
+        return results
+
+
+###################
+##### Metrics #####
+###################
+
+
+class RelayerMetrics:
+    def __init__(self):
+        self.observed = 0
+        self.submitted = 0
+        self.confirmed = 0
+        self.retried = 0
+        self.failed = 0
+        self.delivered = 0
+        self.delivery_failed = 0
+        self.batches = 0
+        self.max_queue_depth = {}
+        self.latencies = []
+        self.started = time.perf_counter()
+        self.stopped = None
+
+    @property
+    def seconds(self):
+        return (self.stopped or time.perf_counter()) - self.started
+
+    @property
+    def confirmations_per_second(self):
+        return self.confirmed / self.seconds if self.seconds else 0.0
+
+    def latency(self, percentile):
+        """Seconds from observing a forwarding log to its confirmation being mined, at `percentile` (0-100)."""
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def __repr__(self):
+        return (
+            f"RelayerMetrics({self.observed} observed, {self.submitted} submitted in {self.batches} batches, "
+            f"{self.confirmed} confirmed, {self.retried} retried, {self.failed} failed, "
+            f"{self.delivered} delivered, {self.confirmations_per_second:,.1f} confirmations/s, "
+            f"latency p50 {self.latency(50) * 1000:.0f}ms p95 {self.latency(95) * 1000:.0f}ms, "
+            f"max queue depth {self.max_queue_depth})"
+        )
+
+
+##################
+##### Engine #####
+##################
+
+
+class Delivery:
+    """A forwarded transaction to confirm on its destination, from one bridge adapter."""
+
+    __slots__ = ("origin_chain_id", "destination_chain_id", "adapter", "data", "observed_at", "attempts", "tx_hash")
+
+    def __init__(self, origin_chain_id, destination_chain_id, adapter, data):
+        self.origin_chain_id = origin_chain_id
+        self.destination_chain_id = destination_chain_id
+        self.adapter = adapter
+        self.data = data
+        self.observed_at = time.perf_counter()
+        self.attempts = 0
+        self.tx_hash = None
+
+
+class RelayerEngine:
+    def __init__(
+        self,
+        endpoints,
+        controllers,
+        adapters=None,
+        queue_size=1000,
+        batch_size=50,
+        max_in_flight=200,
+        max_retries=3,
+        retry_delay=0.1,
+        poll_interval=0.05,
+        from_blocks=None,
+        on_delivery=None,
+    ):
+        """
+        `endpoints` / `controllers`: RPC url / CrossChainController address of every chain id.
+        `adapters`: addresses this engine relays for, per destination chain id (default: any).
+        `max_in_flight`: submitted but not yet mined confirmations per destination, batches are capped to it.
+        `on_delivery(envelope_id, delivered, timestamp)` is called for every `EnvelopeDeliveryAttempted`.
+        """
+        self.endpoints = endpoints
+        self.controllers = {chain_id: address.lower() for chain_id, address in controllers.items()}
+        self.adapters = (
+            {chain_id: {address.lower() for address in pool} for chain_id, pool in adapters.items()}
+            if adapters is not None
+            else None
+        )
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.from_blocks = dict(from_blocks or {})
+        self.on_delivery = on_delivery
+        self.metrics = RelayerMetrics()
+        self.dead_letters = []
+        self._retries = set()
+
+    @classmethod
+    def from_simulator(cls, simulator, **kwargs):
+        """Engine relaying between the chains of a `multichain.Simulator`, reporting deliveries to it."""
+        chains = simulator.chains.values()
+        kwargs.setdefault("on_delivery", simulator.on_delivery_attempt)
+        kwargs.setdefault("from_blocks", {chain.chain_id: chain.web3.eth.block_number + 1 for chain in chains})
+        kwargs.setdefault(
+            "adapters", {chain.chain_id: simulator.adapter_accounts(chain) for chain in chains}
+        )
+        return cls(
+            {chain.chain_id: chain.web3.provider.endpoint_uri for chain in chains},
+            {chain.chain_id: chain.contracts["cross_chain_controller"].address for chain in chains},
+            **kwargs,
+        )
+
+    async def run(self, stop):
+        """Relay until the `stop` event is set, then cancel everything still in flight."""
+        self.metrics = RelayerMetrics()
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+            self._rpc = {chain_id: AsyncRpc(url, session) for chain_id, url in self.endpoints.items()}
+            self._queues = {chain_id: asyncio.Queue(self.queue_size) for chain_id in self.endpoints}
+            self._slots = {chain_id: asyncio.Semaphore(self.max_in_flight) for chain_id in self.endpoints}
+            self._in_flight = {chain_id: {} for chain_id in self.endpoints}
+            tasks = []
+            for chain_id in self.endpoints:
+                tasks.append(asyncio.create_task(self._follow(chain_id)))
+                tasks.append(asyncio.create_task(self._submit(chain_id)))
+                tasks.append(asyncio.create_task(self._confirm(chain_id)))
+            stopped = asyncio.create_task(stop.wait())
+            try:
+                done, _ = await asyncio.wait(tasks + [stopped], return_when=asyncio.FIRST_COMPLETED)
+                # workers only return by raising
+                for task in done:
+                    if task is not stopped:
+                        task.result()
+            finally:
+                pending = tasks + [stopped] + list(self._retries)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                self.metrics.stopped = time.perf_counter()
+        return self.metrics
+
+    async def run_until(self, condition, timeout=600):
+        """Relay until `condition()` is true (checked every poll interval)."""
+        stop = asyncio.Event()
+
+        async def watch():
+            deadline = time.monotonic() + timeout
+            while not condition():
+                if time.monotonic() > deadline:
+                    stop.set()
+                    raise TimeoutError(f"relayer condition not met after {timeout}s: {self.metrics}")
+                await asyncio.sleep(self.poll_interval)
+            stop.set()
+
+        watcher = asyncio.create_task(watch())
+        try:
+            metrics = await self.run(stop)
+        finally:
+            if not watcher.done():
+                watcher.cancel()
+        if not watcher.cancelled():
+            # raises if the condition timed out
+            watcher.result()
+        return metrics
+
+    #####  Followers  #####
+
+    async def _follow(self, chain_id):
+        rpc = self._rpc[chain_id]
+        topic = "0x" + forwarding_logs.TRANSACTION_FORWARDING_ATTEMPTED.hex()
+        if chain_id not in self.from_blocks:
+            self.from_blocks[chain_id] = int(await rpc.call("eth_blockNumber"), 16) + 1
+        while True:
+            latest = int(await rpc.call("eth_blockNumber"), 16)
+            if latest >= self.from_blocks[chain_id]:
+                logs = await rpc.call(
+                    "eth_getLogs",
+                    {
+                        "address": self.controllers[chain_id],
+                        "fromBlock": hex(self.from_blocks[chain_id]),
+                        "toBlock": hex(latest),
+                        "topics": [topic],
+                    },
+                )
+                self.from_blocks[chain_id] = latest + 1
+                for log in logs:
+                    delivery = self._delivery(chain_id, forwarding_logs.decode_rpc_log(log))
+                    if delivery is None:
+                        continue
+                    self.metrics.observed += 1
+                    # blocks while the destination queue is full
+                    await self._queues[delivery.destination_chain_id].put(delivery)
+                    queue = self._queues[delivery.destination_chain_id]
+                    depth = self.metrics.max_queue_depth.get(delivery.destination_chain_id, 0)
+                    self.metrics.max_queue_depth[delivery.destination_chain_id] = max(depth, queue.qsize())
+            await asyncio.sleep(self.poll_interval)
+
+    def _delivery(self, origin_chain_id, forwarded):
+        destination_chain_id = forwarded.destination_chain_id
+        if not forwarded.adapter_successful or destination_chain_id not in self.endpoints:
+            return None
+        adapter = "0x" + forwarded.destination_bridge_adapter.hex()
+        if self.adapters is not None and adapter not in self.adapters.get(destination_chain_id, ()):
+            return None
+        # receiveCrossChainMessage(bytes encodedTransaction, uint256 originChainId)
+        encoded_transaction = bytes(forwarded.encoded_transaction)
+        calldata = (
+            RECEIVE_CROSS_CHAIN_MESSAGE
+            + (64).to_bytes(32, "big")
+            + origin_chain_id.to_bytes(32, "big")
+            + len(encoded_transaction).to_bytes(32, "big")
+            + encoded_transaction
+            + bytes(-len(encoded_transaction) % 32)
+        )
+        return Delivery(origin_chain_id, destination_chain_id, adapter, "0x" + calldata.hex())
+
+    #####  Submitters  #####
+
+    async def _submit(self, chain_id):
+        queue = self._queues[chain_id]
+        slots = self._slots[chain_id]
+        # every item of a batch takes a slot before the batch is sent: a batch larger than the slots
+        # would wait forever for slots that only its own confirmations release
+        batch_size = min(self.batch_size, self.max_in_flight)
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            for _ in batch:
+                await slots.acquire()
+            calls = [
+                (
+                    "eth_sendTransaction",
+                    [{"from": d.adapter, "to": self.controllers[chain_id], "data": d.data, "gas": hex(GAS), "gasPrice": "0x0"}],
+                )
+                for d in batch
+            ]
+            try:
+                results = await self._rpc[chain_id].batch(calls)
+            except (aiohttp.ClientError, asyncio.TimeoutError, RpcError) as e:
+                results = [RpcError(str(e))] * len(batch)
+            self.metrics.batches += 1
+            for delivery, result in zip(batch, results):
+                if isinstance(result, RpcError):
+                    slots.release()
+                    self._retry(delivery)
+                    continue
+                delivery.tx_hash = result
+                self._in_flight[chain_id][result] = delivery
+                self.metrics.submitted += 1
+
+    def _retry(self, delivery):
+        delivery.attempts += 1
+        if delivery.attempts > self.max_retries:
+            self.metrics.failed += 1
+            self.dead_letters.append(delivery)
+            return
+        self.metrics.retried += 1
+        task = asyncio.create_task(self._requeue(delivery, self.retry_delay * 2 ** (delivery.attempts - 1)))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, delivery, delay):
+        await asyncio.sleep(delay)
+        await self._queues[delivery.destination_chain_id].put(delivery)
+
+    #####  Receipts  #####
+
+    async def _confirm(self, chain_id):
+        in_flight = self._in_flight[chain_id]
+        slots = self._slots[chain_id]
+        controller = self.controllers[chain_id]
+        while True:
+            if in_flight:
+                hashes = list(itertools.islice(in_flight, self.max_in_flight))
+                try:
+                    receipts = await self._rpc[chain_id].batch(
+                        [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes]
+                    )
+                except (aiohttp.ClientError, asyncio.TimeoutError, RpcError):
+                    receipts = [None] * len(hashes)
+                now = time.perf_counter()
+                for tx_hash, receipt in zip(hashes, receipts):
+                    if receipt is None or isinstance(receipt, RpcError):
+                        continue
+                    delivery = in_flight.pop(tx_hash)
+                    slots.release()
+                    if int(receipt["status"], 16) != 1:
+                        self._retry(delivery)
+                        continue
+                    self.metrics.confirmed += 1
+                    self.metrics.latencies.append(now - delivery.observed_at)
+                    for envelope_id, delivered in delivery_attempts(receipt, controller):
+                        if delivered:
+                            self.metrics.delivered += 1
+                        else:
+                            self.metrics.delivery_failed += 1
+                        if self.on_delivery is not None:
+                            self.on_delivery(envelope_id, delivered, now)
+            await asyncio.sleep(self.poll_interval)
+
+
+async def relay_load(simulator, envelopes, message_size=128, send_batch_size=50, timeout=600, **kwargs):
+    """
+    Send `envelopes` envelopes through a `multichain.Simulator` (from a worker thread) while the
+    engine relays them. Returns (simulator report, relayer metrics).
+    """
+    engine = RelayerEngine.from_simulator(simulator, **kwargs)
+    report = simulator.report
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    sending = loop.run_in_executor(None, simulator.send_load, envelopes, message_size, send_batch_size)
+    metrics = await engine.run_until(
+        lambda: sending.done() and report.delivered + report.failed >= report.sent, timeout=timeout
+    )
+    await sending
+    report.seconds = time.perf_counter() - start
+    return report, metrics
@@ -0,0 +1,261 @@
+"""
+Chain id translation tables of the bridge adapters
+
+Purposes:
+- Reads the chain ids of `ChainIds.sol` and calls `infraToNativeChainId()` of every adapter on
+  each of them, then `nativeToInfraChainId()` on every native id found, as batched `eth_call`s
+  (one JSON-RPC batch per direction), with an `eth_estimateGas` of every lookup in the same batch
+- Verifies the mappings:
+    round trip:  nativeToInfra(infraToNative(id)) == id for every supported chain
+    collisions:  two chains sharing a native id
+    aliases:     ids of `ChainIds.sol` that `nativeToInfraChainId()` accepts as native ids
+                 although they are no chain's native id (pass-through of unknown ids)
+- Emits constant lookup tables ({infra id: native id} and back, per adapter) as JSON and as a
+  Python module, so the relayer and the indexer don't need a call per translation
+- Reports the execution gas of every lookup (estimate minus the intrinsic gas of the call), so
+  the adapters with long if/else chains stand out
+
+Example:
+adapters = deploy_adapters(project, owner, cross_chain_controller)
+tables = asyncio.run(generate(web3.provider.endpoint_uri, adapters, read_chain_ids()))
+for table in tables.values():
+    print(table)  # TranslationTable(LayerZeroAdapter, 9/11 chains, 0 round trip failures, ... max ... gas)
+write_json("reports/chain_id_tables.json", tables)
+write_python("reports/chain_id_tables.py", tables)
+write_gas_csv("reports/chain_id_lookup_gas.csv", tables)
+
+"""
+
+import csv
+import json
+import os
+import re
+
+import aiohttp
+from brownie import accounts, chain
+from eth_hash.auto import keccak
+
+from async_relayer import AsyncRpc, RpcError
+
+CHAIN_IDS_PATH = os.path.join(os.path.dirname(__file__), "..", "contracts", "crosschain-infra", "libs", "ChainIds.sol")
+INFRA_TO_NATIVE = "infraToNativeChainId"
+NATIVE_TO_INFRA = "nativeToInfraChainId"
+SELECTORS = {name: keccak(f"{name}(uint256)".encode())[:4] for name in (INFRA_TO_NATIVE, NATIVE_TO_INFRA)}
+INTRINSIC_GAS = 21_000
+GAS_FIELDS = ("adapter", "function", "argument", "chain", "result", "gas")
+
+
+def read_chain_ids(path=CHAIN_IDS_PATH, local=True):
+    """{name: chain id} of the `ChainIds` library, plus the local chain as "LOCAL" (for `SameChainAdapter`)."""
+    with open(path) as f:
+        chain_ids = {name: int(value) for name, value in re.findall(r"uint256 constant (\w+) = (\d+);", f.read())}
+    if local and chain.id not in chain_ids.values():
+        chain_ids["LOCAL"] = chain.id
+    return chain_ids
+
+
+def deploy_adapters(containers, owner, cross_chain_controller):
+    """
+    {name: adapter} of every adapter contract. The lookups are pure (view for `SameChainAdapter`),
+    so the bridge entry points are any non zero address.
+    """
+    tx = {"from": owner}
+    bridge = accounts.add().address
+    other = accounts.add().address
+    return {
+        "ArbAdapter": containers["ArbAdapter"].deploy(cross_chain_controller, bridge, other, [], tx),
+        "OpAdapter": containers["OpAdapter"].deploy(cross_chain_controller, bridge, [], tx),
+        "CBaseAdapter": containers["CBaseAdapter"].deploy(cross_chain_controller, bridge, [], tx),
+        "MetisAdapter": containers["MetisAdapter"].deploy(cross_chain_controller, bridge, [], tx),
+        "PolygonAdapter": containers["PolygonAdapter"].deploy(cross_chain_controller, bridge, other, [], tx),
+        "LayerZeroAdapter": containers["LayerZeroAdapter"].deploy(bridge, cross_chain_controller, [], tx),
+        "CCIPAdapter": containers["CCIPAdapter"].deploy(cross_chain_controller, bridge, [], other, tx),
+        "HyperLaneAdapter": containers["HyperLaneAdapter"].deploy(cross_chain_controller, bridge, other, [], tx),
+        "SameChainAdapter": containers["SameChainAdapter"].deploy(tx),
+    }
+
+
+def lookup_calldata(function, argument):
+    return SELECTORS[function] + argument.to_bytes(32, "big")
+
+
+def intrinsic_gas(data):
+    """Gas of a call before execution: the transaction base cost and its calldata."""
+    return INTRINSIC_GAS + sum(16 if byte else 4 for byte in data)
+
+
+##################
+##### Tables #####
+##################
+
+
+class TranslationTable:
+    def __init__(self, adapter, address, chain_ids):
+        self.adapter = adapter
+        self.address = address
+        self.chain_ids = chain_ids  # {name: infra id} probed
+        self.infra_to_native = {}  # supported chains only
+        self.native_to_infra = {}
+        self.unsupported = []  # infra ids mapped to 0
+        self.round_trip_failures = []  # (infra id, native id, infra id back)
+        self.collisions = {}  # {native id: [infra ids]}
+        self.aliases = {}  # {id read as a native id: infra id}
+        self.errors = []  # (function, argument, error)
+        self.gas = []  # (function, argument, result, gas)
+
+    @property
+    def names(self):
+        return {chain_id: name for name, chain_id in self.chain_ids.items()}
+
+    @property
+    def ok(self):
+        return not (self.round_trip_failures or self.collisions or self.errors)
+
+    def _measured_gas(self):
+        return [gas for *_, gas in self.gas if gas is not None]
+
+    @property
+    def max_gas(self):
+        return max(self._measured_gas(), default=0)
+
+    @property
+    def mean_gas(self):
+        gas = self._measured_gas()
+        return sum(gas) / len(gas) if gas else 0.0
+
+    def to_dict(self):
+        return {
+            "address": self.address,
+            INFRA_TO_NATIVE: {str(infra): native for infra, native in sorted(self.infra_to_native.items())},
+            NATIVE_TO_INFRA: {str(native): infra for native, infra in sorted(self.native_to_infra.items())},
+            "unsupported": sorted(self.unsupported),
+            "aliases": {str(native): infra for native, infra in sorted(self.aliases.items())},
+        }
+
+    def __repr__(self):
+        return (
+            f"TranslationTable({self.adapter}, {len(self.infra_to_native)}/{len(self.chain_ids)} chains, "
+            f"{len(self.round_trip_failures)} round trip failures, {len(self.collisions)} collisions, "
+            f"{len(self.aliases)} aliases, mean {self.mean_gas:,.0f} / max {self.max_gas:,} gas per lookup)"
+        )
+
+
+async def _lookups(rpc, calls):
+    """[(result or RpcError, gas or None)] of (address, function, argument) calls, as one batch."""
+    requests = []
+    for address, function, argument in calls:
+        call = {"to": address, "data": "0x" + lookup_calldata(function, argument).hex()}
+        requests += [("eth_call", [call, "latest"]), ("eth_estimateGas", [call])]
+    responses = await rpc.batch(requests)
+    results = []
+    for (_, function, argument), result, estimate in zip(calls, responses[::2], responses[1::2]):
+        if isinstance(result, RpcError):
+            results.append((result, None))
+            continue
+        gas = None
+        if not isinstance(estimate, RpcError):
+            gas = int(estimate, 16) - intrinsic_gas(lookup_calldata(function, argument))
+        results.append((int(result, 16), gas))
+    return results
+
+
+async def generate(url, adapters, chain_ids):
+    """{adapter name: TranslationTable} for `adapters` ({name: contract}) over `chain_ids` ({name: id})."""
+    tables = {
+        name: TranslationTable(name, str(getattr(adapter, "address", adapter)), chain_ids)
+        for name, adapter in adapters.items()
+    }
+    by_address = {table.address: table for table in tables.values()}
+    infra_ids = sorted(set(chain_ids.values()))
+    async with aiohttp.ClientSession() as session:
+        rpc = AsyncRpc(url, session)
+
+        calls = [(table.address, INFRA_TO_NATIVE, infra) for table in tables.values() for infra in infra_ids]
+        for (address, function, infra), (native, gas) in zip(calls, await _lookups(rpc, calls)):
+            table = by_address[address]
+            if isinstance(native, RpcError):
+                table.errors.append((function, infra, str(native)))
+                continue
+            table.gas.append((function, infra, native, gas))
+            if native == 0:
+                table.unsupported.append(infra)
+            else:
+                table.infra_to_native[infra] = native
+
+        # back from every native id found, and from every infra id read as a native id
+        calls = []
+        for table in tables.values():
+            probes = sorted(set(table.infra_to_native.values()) | set(infra_ids))
+            calls += [(table.address, NATIVE_TO_INFRA, native) for native in probes]
+        for (address, function, native), (infra, gas) in zip(calls, await _lookups(rpc, calls)):
+            table = by_address[address]
+            if isinstance(infra, RpcError):
+                table.errors.append((function, native, str(infra)))
+                continue
+            table.gas.append((function, native, infra, gas))
+            if native in table.infra_to_native.values():
+                table.native_to_infra[native] = infra
+            elif infra != 0:
+                table.aliases[native] = infra
+
+    for table in tables.values():
+        by_native = {}
+        for infra, native in table.infra_to_native.items():
+            by_native.setdefault(native, []).append(infra)
+            back = table.native_to_infra.get(native)
+            if back != infra:
+                table.round_trip_failures.append((infra, native, back))
+        table.collisions = {native: infras for native, infras in by_native.items() if len(infras) > 1}
+    return tables
+
+
+def gas_ranking(tables):
+    """[(adapter, max gas, mean gas)], most expensive lookups first."""
+    return sorted(
+        ((name, table.max_gas, table.mean_gas) for name, table in tables.items()), key=lambda row: (-row[1], row[0])
+    )
+
+
+##################
+##### Output #####
+##################
+
+
+def write_json(path, tables):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({name: table.to_dict() for name, table in sorted(tables.items())}, f, indent=2)
+
+
+def render_python(tables):
+    """Source of a module with the lookup tables as constants."""
+    lines = [
+        '"""Chain id translation tables of the bridge adapters, generated by `chain_id_tables.py`."""',
+        "",
+        "INFRA_TO_NATIVE = {",
+    ]
+    for name, table in sorted(tables.items()):
+        lines.append(f"    {name!r}: {dict(sorted(table.infra_to_native.items()))!r},")
+    lines += ["}", "", "NATIVE_TO_INFRA = {"]
+    for name, table in sorted(tables.items()):
+        lines.append(f"    {name!r}: {dict(sorted(table.native_to_infra.items()))!r},")
+    lines += ["}", ""]
+    return "\n".join(lines)
+
+
+def write_python(path, tables):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(render_python(tables))
+
+
+def write_gas_csv(path, tables):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(GAS_FIELDS)
+        for name, table in sorted(tables.items()):
+            names = table.names
+            for function, argument, result, gas in table.gas:
+                chain_name = names.get(argument if function == INFRA_TO_NATIVE else result, "")
+                writer.writerow([name, function, argument, chain_name, result, gas if gas is not None else ""])
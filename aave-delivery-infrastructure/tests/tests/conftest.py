@@ -1,5 +1,5 @@
-import json
 import os
+import sys
 import types
 from typing import Dict, Tuple
 
@@ -7,6 +7,13 @@ import brownie
 import pytest
 from brownie import (chain, web3)
 
+# modules shared by the test suites: tools/ at the repository root (/tools in the Docker image)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "..", "tools"))
+import fixture_reuse
+from account_pool import AccountPool
+from stream_invariants import InvariantMonitor
+from tx_pipeline import TxPipeline, load_compiled
+
 # To setup before the function-level snapshot,
 # put a module-level autouse fixture like the following in your test module.
 #
@@ -34,6 +41,16 @@ NAME_WITH_INSTANCE = Tuple[str, CONTRACT_INSTANCE]
 NAME_TO_INSTANCE = Dict[str, CONTRACT_INSTANCE]
 
 
+@pytest.fixture(scope="module")
+def module_isolation(request):
+    """
+    Overrides brownie's `module_isolation`: resets ganache before and after each module, or,
+    with --reuse-fixtures, before and after each group of modules sharing the same module fixtures.
+    """
+    plugin = request.config.pluginmanager.get_plugin("fixture_reuse")
+    yield from plugin.module_isolation(request.node.nodeid)
+
+
 @pytest.fixture(scope="module", autouse=True)
 def mod_isolation(module_isolation):
     """Snapshot ganache at start of module."""
@@ -78,6 +95,28 @@ def MainnetChainIds():
     )
 
 
+@pytest.fixture(scope="session")
+def account_pool():
+    """
+    Deterministic pool of pre-derived accounts with known private keys.
+    Use this instead of `accounts.add()` when a test needs extra signers or addresses.
+    """
+    return AccountPool.load()
+
+
+@pytest.fixture
+def invariant_monitor():
+    """
+    Streaming invariant monitor of the test: `invariant_monitor.watch(chain.id, web3, controller.address)`
+    (or `watch_simulator()`), optionally `start()` to poll during a load. Closed and checked at teardown,
+    close it first when the chains it watches stop before (`multichain.Simulator`).
+    """
+    monitor = InvariantMonitor()
+    yield monitor
+    monitor.close()
+    assert not monitor.violations, monitor.report()
+
+
 # Pytest Adjustments
 ####################
 
@@ -87,10 +126,20 @@ def MainnetChainIds():
 
 def pytest_addoption(parser):
     parser.addoption("--runslow", action="store_true", default=False, help="run slow tests")
+    parser.addoption(
+        "--reuse-fixtures",
+        action="store_true",
+        default=False,
+        help="group modules by module fixtures and build them once per group",
+    )
+    parser.addoption(
+        "--fixture-costs", action="store_true", default=False, help="report fixture setup costs"
+    )
 
 
 def pytest_configure(config):
     config.addinivalue_line("markers", "slow: mark test as slow to run")
+    fixture_reuse.register(config)
 
 
 def pytest_collection_modifyitems(config, items):
@@ -167,15 +216,7 @@ def build_deployer(file_name, deployer, *args):
     If folder name change is required, modify the folder_path variable.
     """
 
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    folder_path = dir_path + "/../compiled"
-    json_path = folder_path + "/" + file_name
-
-    with open(json_path) as f:
-        data = json.load(f)
-
-    abi = data["abi"]
-    bytecode = data["bytecode"]
+    abi, bytecode = load_compiled(file_name)
 
     web3.eth.default_account = deployer
     contract = web3.eth.contract(abi=abi, bytecode=bytecode)
@@ -234,41 +275,31 @@ def deploy_usdc(owner, proxy_admin, lost_and_found_addr, constants):
 
     folder_name = "usdc"
 
+    # The implementations and the proxy don't depend on each other's receipts,
+    # submit them back-to-back and wait for all of them at once
+    pipeline = TxPipeline()
+
     # FiatTokenV1
-    file_name = folder_name + "/" + "FiatTokenV1.json"
-    # constructor arguments
-    args = []
-    # deployment
-    fiat_token_v1 = build_deployer(file_name, proxy_admin, *args)
+    fiat_token_v1 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV1.json", sender=proxy_admin)
 
     # FiatTokenV1_1
     # Not really used
-    # file_name = folder_name + "/" + "FiatTokenV1_1.json"
-    # # constructor arguments
-    # args = []
-    # # deployment
-    # fiat_token_v1_1 = build_deployer(file_name, proxy_admin, *args)
+    # fiat_token_v1_1 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV1_1.json", sender=proxy_admin)
 
     # FiatTokenV2
-    file_name = folder_name + "/" + "FiatTokenV2.json"
-    # constructor arguments
-    args = []
-    # deployment
-    fiat_token_v2 = build_deployer(file_name, proxy_admin, *args)
+    fiat_token_v2 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV2.json", sender=proxy_admin)
 
     # FiatTokenV2_1
-    file_name = folder_name + "/" + "FiatTokenV2_1.json"
-    # constructor arguments
-    args = []
-    # deployment
-    fiat_token_v2_1 = build_deployer(file_name, proxy_admin, *args)
+    fiat_token_v2_1 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV2_1.json", sender=proxy_admin)
 
-    # FiatTokenProxy
-    file_name = folder_name + "/" + "FiatTokenProxy.json"
-    # constructor arguments
-    args = [fiat_token_v1.address]
-    # deployment
-    proxy = build_deployer(file_name, proxy_admin, *args)
+    # FiatTokenProxy, constructor argument is the (precomputed) FiatTokenV1 address
+    proxy = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenProxy.json", fiat_token_v1, sender=proxy_admin)
+
+    pipeline.flush()
+    fiat_token_v1 = fiat_token_v1.contract
+    fiat_token_v2 = fiat_token_v2.contract
+    fiat_token_v2_1 = fiat_token_v2_1.contract
+    proxy = proxy.contract
 
     # implementation V1
     token_name = "USD Coin"
@@ -342,21 +373,40 @@ def setup_protocol(
     """
     Deploying contracts and setting up the protocol
     """
+    # None of these deployments depend on another's receipt: submit them back-to-back
+    # and collect the receipts together
+    pipeline = TxPipeline()
     # Using the factory pattern
-    proxy_factory = TransparentProxyFactory.deploy({"from": owner})
-    # Get our admin contract
-    tx = proxy_factory.createProxyAdmin(owner, {"from": owner})
-    proxy_admin_factory = ProxyAdmin.at(tx.events["ProxyAdminCreated"]["proxyAdmin"])
+    proxy_factory = pipeline.deploy(TransparentProxyFactory, sender=owner)
     #Deploy CLEmergencyOracleMock
-    cl_emergency_oracle = CLEmergencyOracleMock.deploy({"from": owner})
+    cl_emergency_oracle = pipeline.deploy(CLEmergencyOracleMock, sender=owner)
     # Deploy CrossChainController
-    cross_chain_controller_logic = CrossChainController.deploy({"from": owner})
-    # Deploy CrossChainControllerWithEmergencyMode
-    cross_chain_controller_emergency_mode_logic = CrossChainControllerWithEmergencyMode.deploy(cl_emergency_oracle, {"from": owner})
+    cross_chain_controller_logic = pipeline.deploy(CrossChainController, sender=owner)
+    # Deploy CrossChainControllerWithEmergencyMode, the oracle address is already known
+    cross_chain_controller_emergency_mode_logic = pipeline.deploy(
+        CrossChainControllerWithEmergencyMode, cl_emergency_oracle, sender=owner
+    )
+    current_chain_bridge_adapter = pipeline.deploy(Empty, sender=owner)
+    destination_chain_bridge_adapter = pipeline.deploy(Empty, sender=owner)
+    # Deploy `EmergencyRegistry`
+    emergency_registry = pipeline.deploy(EmergencyRegistry, sender=owner)
+    # Deploy `SameChainAdapter`
+    same_chain_adapter = pipeline.deploy(SameChainAdapter, sender=owner)
+    pipeline.flush()
+
+    proxy_factory = proxy_factory.contract
+    cl_emergency_oracle = cl_emergency_oracle.contract
+    cross_chain_controller_logic = cross_chain_controller_logic.contract
+    cross_chain_controller_emergency_mode_logic = cross_chain_controller_emergency_mode_logic.contract
+    current_chain_bridge_adapter = current_chain_bridge_adapter.contract
+    destination_chain_bridge_adapter = destination_chain_bridge_adapter.contract
+    emergency_registry = emergency_registry.contract
+    same_chain_adapter = same_chain_adapter.contract
 
+    # Get our admin contract
+    tx = proxy_factory.createProxyAdmin(owner, {"from": owner})
+    proxy_admin_factory = ProxyAdmin.at(tx.events["ProxyAdminCreated"]["proxyAdmin"])
 
-    current_chain_bridge_adapter = Empty.deploy({"from": owner})
-    destination_chain_bridge_adapter = Empty.deploy({"from": owner})
     # encode a call to the initialize function for CrossChainController
     data = cross_chain_controller_logic.initialize.encode_input(
         owner,
@@ -413,12 +463,6 @@ def setup_protocol(
     tx = proxy_factory.create(cross_chain_controller_emergency_mode_logic, proxy_admin_factory, data, {"from": owner})
     cross_chain_controller_emergency_mode_proxy = CrossChainControllerWithEmergencyMode.at(tx.events["ProxyCreated"]["proxy"])
 
-    # Deploy `EmergencyRegistry`
-    emergency_registry = EmergencyRegistry.deploy({"from": owner})
-
-    # Deploy `SameChainAdapter`
-    same_chain_adapter = SameChainAdapter.deploy({"from": owner})
-
     # Deploy `BaseAdapterMock`
     origin_configs = [[alice.address, chain.id], [carol.address, MainnetChainIds.POLYGON]]
     base_adapter = BaseAdapterMock.deploy(cross_chain_controller_proxy, origin_configs, {"from": owner})
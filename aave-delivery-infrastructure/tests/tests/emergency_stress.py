@@ -0,0 +1,317 @@
+"""
+Emergency mode stress harness of `CrossChainControllerWithEmergencyMode`
+
+Purposes:
+- Raises emergency after emergency through `CLEmergencyOracleMock.setAnswer()` and solves each
+  one with a single `solveEmergency()` carrying large batches, over a range of batch sizes n:
+    confirmations:  new required confirmations of n chains (alternating 1 and 2)
+    validity:       new validity timestamps of n chains
+    receivers:      n new receiver adapters allowed (one per chain) and the previous n disallowed
+    senders:        n new senders approved and n of the previous ones removed
+    forwarders:     n forwarder adapters enabled (one per chain) and the ones they replace disabled
+    combined:       all of the above in the same call
+- Measures the gas of every `solveEmergency()` against n, and fits gas = a + b*n + c*n^2 per
+  category, with the batch size at which a call no longer fits in a block
+- Measures the time to restore service after each emergency: from `setAnswer()` to a message
+  forwarded through the reconfigured forwarding path (new sender / new adapter) and a message
+  delivered through the reconfigured receiving path (new adapter, new confirmations)
+
+The stressed chains are fresh chain ids (from `FIRST_CHAIN_ID`), every one of them keeps an
+"anchor" receiver adapter that is never rotated, so required confirmations of 2 stay valid and
+any category can run alone. Rotated addresses are plain addresses, except the first of every
+batch, a funded local account, which sends the probes.
+
+Example:
+stress = EmergencyStress(cross_chain_controller_emergency_mode, cl_emergency_oracle, guardian, owner, Empty)
+stress.setup(max_batch_size=256)
+results = stress.run(batch_sizes=[1, 16, 64, 128, 256], rounds=2)
+write_csv("reports/emergency_stress.csv", results)
+for category, model in fit(results).items():
+    print(category, model)  # (a, b, c), {"ethereum": <batch size>, ...}
+
+"""
+
+import csv
+import os
+import time
+
+from brownie import accounts, chain
+from brownie.exceptions import VirtualMachineError
+
+from adapter_scaling import BLOCK_GAS_LIMITS, crossing, fit_quadratic
+from encoding_utils import Envelope, Transaction
+
+FIRST_CHAIN_ID = 60_000
+CATEGORIES = ("confirmations", "validity", "receivers", "senders", "forwarders", "combined")
+FIELDS = ("category", "round", "batch_size", "gas", "solve_seconds", "restore_seconds", "restore_transactions", "error")
+ENVELOPE_DELIVERED = 2
+PROBE_GAS_LIMIT = 0
+PROBE_FUNDS = "10 ether"
+CONFIGURATION_CHUNK = 64
+
+
+class Measurement:
+    __slots__ = ("category", "round", "batch_size", "gas", "solve_seconds", "restore_seconds", "restore_transactions", "error")
+
+    def __init__(self, category, round, batch_size, gas=None, solve_seconds=None, restore_seconds=None, restore_transactions=0, error=None):
+        self.category = category
+        self.round = round
+        self.batch_size = batch_size
+        self.gas = gas
+        self.solve_seconds = solve_seconds
+        self.restore_seconds = restore_seconds
+        self.restore_transactions = restore_transactions
+        self.error = error
+
+    @property
+    def solved(self):
+        return self.error is None
+
+    def row(self):
+        return [
+            self.category,
+            self.round,
+            self.batch_size,
+            self.gas if self.gas is not None else "",
+            f"{self.solve_seconds:.3f}" if self.solve_seconds is not None else "",
+            f"{self.restore_seconds:.3f}" if self.restore_seconds is not None else "",
+            self.restore_transactions,
+            self.error or "",
+        ]
+
+    def __repr__(self):
+        if not self.solved:
+            return f"Measurement({self.category}, n={self.batch_size}, round {self.round}: {self.error})"
+        return (
+            f"Measurement({self.category}, n={self.batch_size}, round {self.round}: gas {self.gas:,}, "
+            f"restored in {self.restore_seconds:.2f}s / {self.restore_transactions} transactions)"
+        )
+
+
+class EmergencyStress:
+    def __init__(self, cross_chain_controller, emergency_oracle, guardian, owner, empty_container, first_chain_id=FIRST_CHAIN_ID):
+        self.cross_chain_controller = cross_chain_controller
+        self.emergency_oracle = emergency_oracle
+        self.guardian = guardian
+        self.owner = owner
+        self.empty_container = empty_container
+        self.first_chain_id = first_chain_id
+        self.chain_ids = []
+        self.destination = None  # receiver portal of the probes
+        self.anchor = None  # receiver adapter of every stressed chain, never rotated
+        self.prober = None  # approved sender, never removed
+        self.anchor_forwarder = None  # forwarder adapter of the first chain, never disabled
+        # current state, replaced by every solved emergency
+        self.receivers = {}  # {chain id: rotated receiver adapter}
+        self.confirmations = {}  # {chain id: required confirmations}
+        self.validity = {}  # {chain id: validity timestamp}
+        self.senders = []
+        self.forwarders = {}  # {chain id: forwarder adapter}
+        self._forwarder_pairs = {}  # {chain id: two adapters, used in turn}
+        self._round = 0
+        self._nonce = 0
+
+    def _local_account(self):
+        account = accounts.add()
+        self.owner.transfer(account, PROBE_FUNDS)
+        return account
+
+    def _chunks(self, items):
+        return [items[i : i + CONFIGURATION_CHUNK] for i in range(0, len(items), CONFIGURATION_CHUNK)]
+
+    def setup(self, max_batch_size):
+        """Configure `max_batch_size` stressed chains (as the owner) with two receiver adapters each."""
+        controller = self.cross_chain_controller
+        owner = {"from": self.owner}
+        self.chain_ids = list(range(self.first_chain_id, self.first_chain_id + max_batch_size))
+        self.destination = self.empty_container.deploy(owner)
+        self.anchor = self._local_account()
+        self.prober = self._local_account()
+        self.anchor_forwarder = self.empty_container.deploy(owner)
+
+        self.receivers = {chain_id: accounts.add().address for chain_id in self.chain_ids[1:]}
+        self.receivers[self.chain_ids[0]] = self._local_account()
+        for chain_ids in self._chunks(self.chain_ids):
+            controller.allowReceiverBridgeAdapters(
+                [(self.anchor, chain_ids)] + [(self.receivers[chain_id], [chain_id]) for chain_id in chain_ids], owner
+            )
+            controller.updateConfirmations([(chain_id, 1) for chain_id in chain_ids], owner)
+        self.confirmations = {chain_id: 1 for chain_id in self.chain_ids}
+        self.validity = {chain_id: 0 for chain_id in self.chain_ids}
+        controller.approveSenders([self.prober], owner)
+        controller.enableBridgeAdapters([(self.anchor_forwarder, accounts.add().address, self.chain_ids[0])], owner)
+
+    def next_forwarder(self, chain_id):
+        """The `Empty` adapter of the chain's pair that is not its current forwarder adapter."""
+        pair = self._forwarder_pairs.setdefault(chain_id, [])
+        while len(pair) < 2:
+            pair.append(self.empty_container.deploy({"from": self.owner}))
+        return pair[1] if self.forwarders.get(chain_id) == pair[0] else pair[0]
+
+    ###################
+    ##### Batches #####
+    ###################
+
+    def batch(self, category, size):
+        """
+        (arguments of `solveEmergency()`, state after it) for `size` changes of `category`
+        ("combined": of every category). The first new address of a batch is a funded account.
+        """
+        combined = category == "combined"
+        chain_ids = self.chain_ids[:size]
+        confirmations, validity, allow, disallow, approve, remove, enable, disable = [], [], [], [], [], [], [], []
+        state = {}
+
+        if combined or category == "receivers":
+            receivers = {chain_id: accounts.add().address for chain_id in chain_ids[1:]}
+            receivers[chain_ids[0]] = self._local_account()
+            allow = [(receivers[chain_id], [chain_id]) for chain_id in chain_ids]
+            disallow = [(self.receivers[chain_id], [chain_id]) for chain_id in chain_ids]
+            state["receivers"] = receivers
+        if combined or category == "confirmations":
+            required = {chain_id: 3 - self.confirmations[chain_id] for chain_id in chain_ids}
+            confirmations = list(required.items())
+            state["confirmations"] = required
+        if combined or category == "validity":
+            timestamps = {chain_id: self._validity_timestamp(chain_id) for chain_id in chain_ids}
+            validity = list(timestamps.items())
+            state["validity"] = timestamps
+        if combined or category == "senders":
+            approve = [self._local_account()] + [accounts.add().address for _ in range(size - 1)]
+            remove = self.senders[:size]
+            state["senders"] = approve + self.senders[size:]
+        if combined or category == "forwarders":
+            adapters = {chain_id: self.next_forwarder(chain_id) for chain_id in chain_ids}
+            enable = [(adapter, accounts.add().address, chain_id) for chain_id, adapter in adapters.items()]
+            disable = [(self.forwarders[chain_id], [chain_id]) for chain_id in chain_ids if chain_id in self.forwarders]
+            state["forwarders"] = adapters
+
+        return (confirmations, validity, allow, disallow, approve, remove, enable, disable), state
+
+    def _validity_timestamp(self, chain_id):
+        """Latest block timestamp, after the previous validity timestamp of the chain."""
+        while chain[-1].timestamp <= self.validity[chain_id]:
+            chain.sleep(1)
+            chain.mine()
+        return chain[-1].timestamp
+
+    def _apply(self, state):
+        for name in ("receivers", "confirmations", "validity", "forwarders"):
+            getattr(self, name).update(state.get(name, {}))
+        if "senders" in state:
+            self.senders = state["senders"]
+
+    ##################
+    ##### Probes #####
+    ##################
+
+    def probe_forward(self, state):
+        """Forward through the new sender and adapters (if any), True if every adapter succeeded."""
+        sender = state["senders"][0] if "senders" in state else self.prober
+        tx = self.cross_chain_controller.forwardMessage(
+            self.chain_ids[0], self.destination, PROBE_GAS_LIMIT, b"emergency probe", {"from": sender}
+        )
+        attempts = tx.events["TransactionForwardingAttempted"] if "TransactionForwardingAttempted" in tx.events else []
+        adapters = {attempt["bridgeAdapter"] for attempt in attempts}
+        expected = {self.anchor_forwarder.address}
+        if self.chain_ids[0] in self.forwarders:
+            expected.add(self.forwarders[self.chain_ids[0]].address)
+        return tx, bool(attempts) and all(attempt["adapterSuccessful"] for attempt in attempts) and adapters == expected
+
+    def probe_receive(self):
+        """Deliver a fresh envelope from the first chain through its current adapters, as many as required."""
+        chain_id = self.chain_ids[0]
+        envelope = Envelope(self._nonce, self.prober.address, self.destination.address, chain_id, chain.id, b"emergency probe")
+        self._nonce += 1
+        transaction = Transaction(envelope.nonce, envelope.encode().data).encode().data
+        receives = []
+        for adapter in (self.receivers[chain_id], self.anchor)[: self.confirmations[chain_id]]:
+            receives.append(self.cross_chain_controller.receiveCrossChainMessage(transaction, chain_id, {"from": adapter}))
+        state = self.cross_chain_controller.getEnvelopeState["bytes32"](envelope.get_id())
+        return receives, state == ENVELOPE_DELIVERED
+
+    ##################
+    ##### Rounds #####
+    ##################
+
+    def solve(self, category, size):
+        """Raise an emergency, solve it with a batch of `size` changes of `category` and probe the service."""
+        arguments, state = self.batch(category, size)
+        emergency_round = self._round
+        answer = self.cross_chain_controller.getEmergencyCount() + 1
+
+        started = time.perf_counter()
+        self.emergency_oracle.setAnswer(answer, {"from": self.owner})
+        try:
+            tx = self.cross_chain_controller.solveEmergency(*arguments, {"from": self.guardian})
+        except (VirtualMachineError, ValueError) as error:
+            # e.g. over the block gas limit, the emergency stays open for the next round
+            return Measurement(category, emergency_round, size, error=str(error).splitlines()[0])
+        solve_seconds = time.perf_counter() - started
+        self._round += 1
+        self._apply(state)
+        if "validity" in state:
+            # the probe's confirmations only count when first bridged after the new validity timestamp
+            chain.sleep(1)
+            chain.mine()
+
+        forward, forwarded = self.probe_forward(state)
+        receives, delivered = self.probe_receive()
+        restore_seconds = time.perf_counter() - started
+        # setAnswer, solveEmergency, the forward probe and the receive probes
+        transactions = 3 + len(receives)
+        measurement = Measurement(category, emergency_round, size, tx.gas_used, solve_seconds, restore_seconds, transactions)
+        if not (forwarded and delivered):
+            measurement.error = f"service not restored (forwarded: {forwarded}, delivered: {delivered})"
+        return measurement
+
+    def run(self, batch_sizes=(1, 16, 64, 128, 256), rounds=2, categories=CATEGORIES):
+        """Every category at every batch size, `rounds` emergencies each. A category stops at its first failed size."""
+        if max(batch_sizes) > len(self.chain_ids):
+            raise ValueError(f"setup() covers {len(self.chain_ids)} chains, batches of {max(batch_sizes)} requested")
+        results = []
+        for category in categories:
+            for size in sorted(batch_sizes):
+                measurements = [self.solve(category, size) for _ in range(rounds)]
+                results += measurements
+                if not all(measurement.solved for measurement in measurements):
+                    break
+        return results
+
+
+#################
+##### Model #####
+#################
+
+
+def fit(results, limits=BLOCK_GAS_LIMITS):
+    """{category: ((a, b, c), {chain: batch size})} of gas = a + b*n + c*n^2, over the solved emergencies."""
+    series = {}
+    for measurement in results:
+        if measurement.gas is not None:
+            series.setdefault(measurement.category, []).append((measurement.batch_size, measurement.gas))
+    models = {}
+    for category, points in series.items():
+        if len({n for n, _ in points}) < 2:
+            continue
+        coefficients = fit_quadratic(points, quantity="batch sizes")
+        models[category] = (coefficients, {name: crossing(coefficients, limit) for name, limit in limits.items()})
+    return models
+
+
+def restore_times(results):
+    """{(category, batch size): (mean, max) seconds to restore the service}, over the restored emergencies."""
+    series = {}
+    for measurement in results:
+        if measurement.solved:
+            series.setdefault((measurement.category, measurement.batch_size), []).append(measurement.restore_seconds)
+    return {key: (sum(times) / len(times), max(times)) for key, times in series.items()}
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for measurement in results:
+            writer.writerow(measurement.row())
@@ -0,0 +1,245 @@
+"""
+Differential fuzzing of `encoding_utils` against the on-chain `EncodingUtils` library
+
+Purposes:
+- Generates random envelopes, biased towards edge cases (empty / word boundary / large
+  messages, zero and max uint256 values, real and extreme chain ids)
+- Runs them through `EncodingUtilsMock` in batches, one eth_call per batch and function
+- Compares the raw return data with the ABI encoding `encoding_utils` predicts, so no
+  Python ABI decoding happens unless a batch mismatches
+
+Checked, for every case:
+- encodeEnvelopes:     abi.encode(envelope) and its id
+- decodeEnvelopes:     decoding the Python encoding gives back the envelope, and its id
+- encodeTransactions:  abi.encode(transaction), its id and the id of its envelope
+- decodeTransactions:  decoding the Python encoding gives back the transaction and envelope
+
+Example:
+fuzzer = EncodingFuzzer(EncodingUtilsMock.deploy({"from": owner}), seed=1)
+report = fuzzer.run(cases=10_000, batch_size=100)
+assert not report.mismatches, report.mismatches[0]
+
+"""
+
+import random
+import time
+
+from brownie import web3
+from eth_hash.auto import keccak
+
+from encoding_utils import (
+    Envelope,
+    Transaction,
+    UINT256_MAX,
+    WORD,
+)
+
+SIGNATURES = {
+    "encodeEnvelopes": "encodeEnvelopes((uint256,address,address,uint256,uint256,bytes)[])",
+    "decodeEnvelopes": "decodeEnvelopes(bytes[])",
+    "encodeTransactions": "encodeTransactions((uint256,bytes)[])",
+    "decodeTransactions": "decodeTransactions(bytes[])",
+}
+SELECTORS = {name: keccak(signature.encode())[:4] for name, signature in SIGNATURES.items()}
+
+EDGE_UINTS = [0, 1, 2**64 - 1, 2**64, 2**128, 2**255, UINT256_MAX - 1, UINT256_MAX]
+# MainnetChainIds, plus testnets and ids beyond the uint64 range some bridges use
+EDGE_CHAIN_IDS = [0, 1, 10, 56, 137, 250, 1088, 8453, 42161, 43114, 1666600000, 11155111, 2**32, 2**64 - 1] + EDGE_UINTS
+EDGE_ADDRESSES = ["0x" + "00" * 20, "0x" + "00" * 19 + "01", "0x" + "ff" * 20]
+EDGE_MESSAGE_SIZES = [0, 1, 31, 32, 33, 63, 64, 65, 1023, 1024, 1025]
+
+
+######################
+##### ABI layout #####
+######################
+
+
+def _word(value):
+    return value.to_bytes(WORD, "big")
+
+
+def _bytes(data):
+    return _word(len(data)) + data + bytes(-len(data) % WORD)
+
+
+def _dynamic_array(elements):
+    """ABI encoding of an array of already encoded dynamic elements."""
+    head = [_word(len(elements))]
+    offset = len(elements) * WORD
+    for element in elements:
+        head.append(_word(offset))
+        offset += len(element)
+    return b"".join(head + elements)
+
+
+def _bytes32_array(values):
+    return _word(len(values)) + b"".join(values)
+
+
+def _tuple(*members):
+    """ABI encoding of a tuple of dynamic members (each already encoded)."""
+    offset = len(members) * WORD
+    head = []
+    for member in members:
+        head.append(_word(offset))
+        offset += len(member)
+    return b"".join(head + list(members))
+
+
+def _envelope_tuple(envelope):
+    # abi.encode(envelope) is the tuple preceded by its offset
+    return envelope.to_bytes()[WORD:]
+
+
+def _transaction_tuple(transaction):
+    return transaction.to_bytes()[WORD:]
+
+
+##################
+##### Fuzzer #####
+##################
+
+
+class Mismatch:
+    __slots__ = ("function", "envelope", "transaction_nonce", "expected", "actual")
+
+    def __init__(self, function, envelope, transaction_nonce, expected, actual):
+        self.function = function
+        self.envelope = envelope
+        self.transaction_nonce = transaction_nonce
+        self.expected = expected
+        self.actual = actual
+
+    def __repr__(self):
+        return (
+            f"Mismatch({self.function}, {self.envelope!r}, transaction nonce {self.transaction_nonce}, "
+            f"expected 0x{self.expected.hex()}, got {self.actual})"
+        )
+
+
+class FuzzReport:
+    def __init__(self):
+        self.cases = 0
+        self.calls = 0
+        self.seconds = 0.0
+        self.mismatches = []
+
+    @property
+    def cases_per_minute(self):
+        return 60 * self.cases / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (
+            f"FuzzReport({self.cases} cases, {self.calls} eth_calls, {self.seconds:.1f}s, "
+            f"{self.cases_per_minute:,.0f} cases/min, {len(self.mismatches)} mismatches)"
+        )
+
+
+class EncodingFuzzer:
+    def __init__(self, mock, seed=None, max_message_size=64 * 1024, large_message_rate=0.02):
+        self.mock = mock
+        self.random = random.Random(seed)
+        self.max_message_size = max_message_size
+        self.large_message_rate = large_message_rate
+
+    def _uint(self, edges):
+        if self.random.random() < 0.3:
+            return self.random.choice(edges)
+        return self.random.getrandbits(self.random.choice((8, 32, 64, 256)))
+
+    def _address(self):
+        if self.random.random() < 0.1:
+            return self.random.choice(EDGE_ADDRESSES)
+        return "0x" + self.random.getrandbits(160).to_bytes(20, "big").hex()
+
+    def _message(self):
+        roll = self.random.random()
+        if roll < self.large_message_rate:
+            size = self.random.randint(self.max_message_size // 2, self.max_message_size)
+        elif roll < 0.3:
+            size = self.random.choice(EDGE_MESSAGE_SIZES)
+        else:
+            size = self.random.randint(0, 512)
+        return self.random.getrandbits(8 * size).to_bytes(size, "big") if size else b""
+
+    def random_envelope(self):
+        return Envelope(
+            self._uint(EDGE_UINTS),
+            self._address(),
+            self._address(),
+            self._uint(EDGE_CHAIN_IDS),
+            self._uint(EDGE_CHAIN_IDS),
+            self._message(),
+        )
+
+    def _call(self, function, arguments):
+        """Raw return data of `function` called with one dynamic argument (already encoded)."""
+        data = SELECTORS[function] + _word(WORD) + arguments
+        return bytes(web3.eth.call({"to": self.mock.address, "data": "0x" + data.hex()}))
+
+    def expected(self, envelopes, transaction_nonces):
+        """Expected (call arguments, return data) for every mock function."""
+        encoded = [envelope.to_bytes() for envelope in envelopes]
+        envelope_ids = [keccak(data) for data in encoded]
+        transactions = [Transaction(nonce, data) for nonce, data in zip(transaction_nonces, encoded)]
+        encoded_transactions = [transaction.to_bytes() for transaction in transactions]
+        envelope_tuples = [_envelope_tuple(envelope) for envelope in envelopes]
+        encoded_bytes = _dynamic_array([_bytes(data) for data in encoded])
+        encoded_transaction_bytes = _dynamic_array([_bytes(data) for data in encoded_transactions])
+
+        return {
+            "encodeEnvelopes": (
+                _dynamic_array(envelope_tuples),
+                _tuple(encoded_bytes, _bytes32_array(envelope_ids)),
+            ),
+            "decodeEnvelopes": (
+                encoded_bytes,
+                _tuple(_dynamic_array(envelope_tuples), _bytes32_array(envelope_ids)),
+            ),
+            "encodeTransactions": (
+                _dynamic_array([_transaction_tuple(transaction) for transaction in transactions]),
+                _tuple(
+                    encoded_transaction_bytes,
+                    _bytes32_array([keccak(data) for data in encoded_transactions]),
+                    _bytes32_array(envelope_ids),
+                ),
+            ),
+            "decodeTransactions": (
+                encoded_transaction_bytes,
+                _tuple(
+                    _dynamic_array([_transaction_tuple(transaction) for transaction in transactions]),
+                    _dynamic_array(envelope_tuples),
+                ),
+            ),
+        }
+
+    def check(self, envelopes, transaction_nonces, report):
+        """Run one batch through every mock function, narrow mismatching batches down to single cases."""
+        for function, (arguments, expected) in self.expected(envelopes, transaction_nonces).items():
+            try:
+                actual = self._call(function, arguments)
+            except ValueError as e:
+                actual = e
+            report.calls += 1
+            if actual == expected:
+                continue
+            if len(envelopes) == 1:
+                report.mismatches.append(
+                    Mismatch(function, envelopes[0], transaction_nonces[0], expected, actual)
+                )
+                continue
+            for envelope, nonce in zip(envelopes, transaction_nonces):
+                self.check([envelope], [nonce], report)
+            return
+
+    def run(self, cases, batch_size=100):
+        report = FuzzReport()
+        start = time.perf_counter()
+        for batch_start in range(0, cases, batch_size):
+            size = min(batch_size, cases - batch_start)
+            envelopes = [self.random_envelope() for _ in range(size)]
+            transaction_nonces = [self._uint(EDGE_UINTS) for _ in range(size)]
+            self.check(envelopes, transaction_nonces, report)
+            report.cases += size
+        report.seconds = time.perf_counter() - start
+        return report
@@ -0,0 +1,426 @@
+"""
+Local endpoint stand-ins for the LayerZero, CCIP and Hyperlane adapters
+
+Purposes:
+- Deploys the stand-ins of the third-party endpoints (`LayerZeroEndpointMock`, `CCIPRouterMock`
+  with `LinkTokenMock`, `HyperlaneMailboxMock` with `InterchainGasPaymasterMock`) and the
+  adapters on top of them, enabled both as forwarder adapters (one destination chain each) and
+  as receiver adapters of Ethereum, trusting a made up Ethereum controller
+- Forwards N envelopes through each adapter and records the gas of `forwardMessage()`, the fee
+  taken from the controller (native, or LINK for CCIP) and the message id returned by the
+  adapter, checked against the id computed here
+- Receives N envelopes through each adapter, delivered by the stand-in in batches of B
+  (`receivePayloads()`, `routeMessages()`, `processBatch()`), and records the gas per batch and
+  per message, down to the `ReceiverPortalMock`
+
+Fees follow a linear model (see `quote()`): a base fee, a fee per byte of the encoded
+transaction and a price for the destination gas limit. The stand-ins represent the local
+chain, inbound messages come from Ethereum.
+
+Example:
+load = EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+results = [load.forward(route, 100, message_size=256) for route in load.routes]
+results += [load.receive(route, 100, batch_size=10) for route in load.routes]
+write_csv("reports/endpoint_load.csv", results)
+for result in results:
+    print(result)  # EndpointResult(ccip forward, 100 messages, 256 bytes, mean gas ..., fees ... LINK)
+
+"""
+
+import csv
+import os
+
+from brownie import accounts, chain
+from eth_abi import decode_abi, encode_abi
+from eth_utils import keccak
+
+from encoding_utils import Envelope, Transaction
+
+ETHEREUM = 1
+# route => (destination chain id, native destination chain id, adapter contract)
+ROUTES = {
+    "layer_zero": (42161, 110, "LayerZeroAdapter"),
+    "ccip": (43114, 6433500567565415381, "CCIPAdapter"),
+    "hyperlane": (10, 10, "HyperLaneAdapter"),
+}
+# native ids of Ethereum, as inbound messages carry them
+ETHEREUM_NATIVE_IDS = {
+    "layer_zero": 101,
+    "ccip": 5009297550715157269,
+    "hyperlane": ETHEREUM,
+}
+DEFAULT_FEES = {
+    "layer_zero": {"base_fee": 10**14, "fee_per_byte": 10**10, "gas_price": 10**9},
+    "ccip": {"base_fee": 10**16, "fee_per_byte": 10**12, "gas_price": 10**9},
+    "hyperlane": {"base_fee": 0, "fee_per_byte": 0, "gas_price": 10**9},
+}
+# the stand-ins' gas limit when the adapter doesn't pass one
+DEFAULT_GAS_LIMIT = 200_000
+RECEIVE_GAS_LIMIT = 1_000_000
+CONTROLLER_FUNDS = 1_000 * 10**18
+HYPERLANE_VERSION = 0
+FIELDS = (
+    "route",
+    "direction",
+    "messages",
+    "message_size",
+    "batch_size",
+    "successful",
+    "id_mismatches",
+    "total_gas",
+    "mean_gas",
+    "gas_per_message",
+    "fee_token",
+    "total_fees",
+    "mean_fee",
+)
+
+
+def quote(fees, payload_size, gas_limit):
+    """Fee of a stand-in for a `payload_size` bytes message and a destination gas limit."""
+    return fees["base_fee"] + fees["fee_per_byte"] * payload_size + fees["gas_price"] * gas_limit
+
+
+def layer_zero_path(source, destination):
+    """LayerZero (v1) path, as the receiving application sees it."""
+    return bytes.fromhex(source[2:]) + bytes.fromhex(destination[2:])
+
+
+def ccip_message_id(source_selector, destination_selector, sequence_number, sender, receiver, data):
+    """`CCIPRouterMock` message id, sequence numbers start at 1 per destination."""
+    return keccak(
+        encode_abi(
+            ["uint64", "uint64", "uint64", "address", "bytes", "bytes"],
+            [source_selector, destination_selector, sequence_number, sender, receiver, data],
+        )
+    )
+
+
+def hyperlane_message(nonce, origin, sender, destination, recipient, body):
+    """`Message.formatMessage()`, the Hyperlane message id is its keccak256."""
+    return (
+        bytes([HYPERLANE_VERSION])
+        + nonce.to_bytes(4, "big")
+        + origin.to_bytes(4, "big")
+        + bytes(12)
+        + bytes.fromhex(sender[2:])
+        + destination.to_bytes(4, "big")
+        + bytes(12)
+        + bytes.fromhex(recipient[2:])
+        + body
+    )
+
+
+###################
+##### Results #####
+###################
+
+
+class EndpointResult:
+    def __init__(self, route, direction, messages, message_size, batch_size, fee_token):
+        self.route = route
+        self.direction = direction
+        self.messages = messages
+        self.message_size = message_size
+        self.batch_size = batch_size
+        self.fee_token = fee_token
+        self.gas = []  # per transaction: per forwarded message, or per delivered batch
+        self.fees = []
+        self.successful = 0
+        self.id_mismatches = 0
+
+    @property
+    def total_gas(self):
+        return sum(self.gas)
+
+    @property
+    def mean_gas(self):
+        return self.total_gas / len(self.gas) if self.gas else 0.0
+
+    @property
+    def gas_per_message(self):
+        return self.total_gas / self.messages if self.messages else 0.0
+
+    @property
+    def total_fees(self):
+        return sum(self.fees)
+
+    @property
+    def mean_fee(self):
+        return self.total_fees / len(self.fees) if self.fees else 0.0
+
+    def row(self):
+        return [
+            self.route,
+            self.direction,
+            self.messages,
+            self.message_size,
+            self.batch_size,
+            self.successful,
+            self.id_mismatches,
+            self.total_gas,
+            f"{self.mean_gas:.1f}",
+            f"{self.gas_per_message:.1f}",
+            self.fee_token if self.fees else "",
+            self.total_fees if self.fees else "",
+            f"{self.mean_fee:.1f}" if self.fees else "",
+        ]
+
+    def __repr__(self):
+        fees = f", fees {self.total_fees / 10**18:.6f} {self.fee_token}" if self.fees else ""
+        return (
+            f"EndpointResult({self.route} {self.direction}, {self.successful}/{self.messages} messages, "
+            f"{self.message_size} bytes, batches of {self.batch_size}, mean gas {self.mean_gas:,.0f}, "
+            f"{self.gas_per_message:,.0f} gas / message{fees})"
+        )
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for result in results:
+            writer.writerow(result.row())
+
+
+################
+##### Load #####
+################
+
+
+class Route:
+    __slots__ = (
+        "name", "destination_chain_id", "native_chain_id", "adapter", "endpoint", "fees", "fee_token", "fee_collector"
+    )
+
+    def __init__(self, name, destination_chain_id, native_chain_id, adapter, endpoint, fees, fee_token, fee_collector):
+        self.name = name
+        self.destination_chain_id = destination_chain_id
+        self.native_chain_id = native_chain_id
+        self.adapter = adapter
+        self.endpoint = endpoint
+        self.fees = fees
+        self.fee_token = fee_token
+        # the contract that is paid and counts `feesCollected()`: the endpoint, Hyperlane's gas paymaster
+        self.fee_collector = fee_collector
+
+    def __repr__(self):
+        return f"Route({self.name}, adapter={self.adapter.address}, destination={self.destination_chain_id})"
+
+
+class EndpointLoad:
+    def __init__(self, cross_chain_controller, sender, relayer, routes, portal, link, remote, destination_adapter):
+        self.cross_chain_controller = cross_chain_controller
+        self.sender = sender
+        self.relayer = relayer
+        self.routes = routes
+        self.portal = portal
+        self.link = link
+        # the Ethereum controller trusted by every adapter, and the adapter it forwards to on every destination
+        self.remote = remote
+        self.destination_adapter = destination_adapter
+        self._envelope_nonce = 0
+        self._hyperlane_nonce = 0
+        self._ccip_sequence = 0
+
+    @classmethod
+    def setup(cls, cross_chain_controller, owner, sender, containers, routes=tuple(ROUTES), fees=DEFAULT_FEES):
+        """
+        Deploy the stand-ins and adapters of `routes`. `containers` maps contract names to brownie
+        containers (e.g. the loaded project), `sender` must be an approved sender of the controller.
+        """
+        tx = {"from": owner}
+        remote = accounts.add().address
+        destination_adapter = accounts.add().address
+        trusted_remotes = [(remote, ETHEREUM)]
+        portal = containers["ReceiverPortalMock"].deploy(tx)
+        link = containers["LinkTokenMock"].deploy(tx)
+
+        deployed = {}
+        for name in routes:
+            destination_chain_id, native_chain_id, adapter_name = ROUTES[name]
+            route_fees = fees[name]
+            if name == "layer_zero":
+                endpoint = containers["LayerZeroEndpointMock"].deploy(
+                    chain.id, route_fees["base_fee"], route_fees["fee_per_byte"], route_fees["gas_price"], tx
+                )
+                adapter = containers[adapter_name].deploy(endpoint, cross_chain_controller, trusted_remotes, tx)
+                fee_token = "native"
+                fee_collector = endpoint
+            elif name == "ccip":
+                endpoint = containers["CCIPRouterMock"].deploy(
+                    chain.id, link, route_fees["base_fee"], route_fees["fee_per_byte"], route_fees["gas_price"], tx
+                )
+                endpoint.setChainSupported(native_chain_id, True, tx)
+                adapter = containers[adapter_name].deploy(cross_chain_controller, endpoint, trusted_remotes, link, tx)
+                fee_token = "LINK"
+                fee_collector = endpoint
+            else:
+                endpoint = containers["HyperlaneMailboxMock"].deploy(chain.id, tx)
+                # quoted by the paymaster, the mailbox itself is free
+                paymaster = containers["InterchainGasPaymasterMock"].deploy(route_fees["gas_price"], tx)
+                adapter = containers[adapter_name].deploy(
+                    cross_chain_controller, endpoint, paymaster, trusted_remotes, tx
+                )
+                fee_token = "native"
+                fee_collector = paymaster
+            deployed[name] = Route(
+                name, destination_chain_id, native_chain_id, adapter, endpoint, route_fees, fee_token, fee_collector
+            )
+
+        # `enableBridgeAdapters()` runs the adapters' `setupPayments()`: CCIP approves the router for LINK
+        cross_chain_controller.enableBridgeAdapters(
+            [(route.adapter, destination_adapter, route.destination_chain_id) for route in deployed.values()], tx
+        )
+        cross_chain_controller.allowReceiverBridgeAdapters(
+            [(route.adapter, [ETHEREUM]) for route in deployed.values()], tx
+        )
+        cross_chain_controller.updateConfirmations([(ETHEREUM, 1)], tx)
+        owner.transfer(cross_chain_controller, CONTROLLER_FUNDS)
+        link.mint(cross_chain_controller, CONTROLLER_FUNDS, tx)
+        return cls(cross_chain_controller, sender, owner, deployed, portal, link, remote, destination_adapter)
+
+    def _balance(self, route):
+        if route.fee_token == "LINK":
+            return self.link.balanceOf(self.cross_chain_controller)
+        return self.cross_chain_controller.balance()
+
+    def _expected_id(self, route, native_chain_id, encoded_transaction):
+        """Message id the adapter should return, before the stand-in sees the message."""
+        if route.name == "layer_zero":
+            return route.endpoint.getOutboundNonce(native_chain_id, self.cross_chain_controller)
+        if route.name == "ccip":
+            return int.from_bytes(
+                ccip_message_id(
+                    chain.id,
+                    native_chain_id,
+                    route.endpoint.sequenceNumbers(native_chain_id) + 1,
+                    self.cross_chain_controller.address,
+                    encode_abi(["address"], [self.destination_adapter]),
+                    encoded_transaction,
+                ),
+                "big",
+            )
+        message = hyperlane_message(
+            route.endpoint.count(),
+            chain.id,
+            self.cross_chain_controller.address,
+            native_chain_id,
+            self.destination_adapter,
+            encoded_transaction,
+        )
+        return int.from_bytes(keccak(message), "big")
+
+    def forward(self, route, messages, message_size=128, gas_limit=DEFAULT_GAS_LIMIT, destination_chain_id=None):
+        """
+        Forward `messages` envelopes through the adapter of `route` (a name or a `Route`), to its
+        destination chain or to `destination_chain_id`, for which it must be the only enabled adapter.
+        """
+        route = self.routes[route] if isinstance(route, str) else route
+        destination_chain_id = destination_chain_id or route.destination_chain_id
+        native_chain_id = route.adapter.infraToNativeChainId(destination_chain_id)
+        controller = self.cross_chain_controller
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        result = EndpointResult(route.name, "forward", messages, message_size, 1, route.fee_token)
+        envelope_nonce = controller.getCurrentEnvelopeNonce()
+        transaction_nonce = controller.getCurrentTransactionNonce()
+        for i in range(messages):
+            envelope = Envelope(
+                envelope_nonce + i, self.sender, self.portal, chain.id, destination_chain_id, message
+            )
+            encoded_transaction = Transaction(transaction_nonce + i, envelope.to_bytes()).to_bytes()
+            expected_id = self._expected_id(route, native_chain_id, encoded_transaction)
+            balance = self._balance(route)
+
+            tx = controller.forwardMessage(destination_chain_id, self.portal, gas_limit, message, {"from": self.sender})
+            event = tx.events["TransactionForwardingAttempted"][0]
+            result.gas.append(tx.gas_used)
+            result.fees.append(balance - self._balance(route))
+            if event["adapterSuccessful"]:
+                result.successful += 1
+                _, message_id = decode_abi(["address", "uint256"], bytes(event["returnData"]))
+                if message_id != expected_id or bytes(event["encodedTransaction"]) != encoded_transaction:
+                    result.id_mismatches += 1
+        return result
+
+    def inbound(self, route, messages, message_size=128, remote=None):
+        """`messages` encoded transactions from the Ethereum controller (or `remote`) to the portal."""
+        remote = remote or self.remote
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        transactions = []
+        for _ in range(messages):
+            nonce = self._envelope_nonce
+            self._envelope_nonce += 1
+            envelope = Envelope(nonce, remote, self.portal, ETHEREUM, chain.id, message)
+            transactions.append(Transaction(nonce, envelope.to_bytes()).to_bytes())
+        return transactions
+
+    def _deliveries(self, route, transactions, remote, gas_limit):
+        """The stand-in's batch of deliveries of `transactions` into the adapter of `route`."""
+        adapter = route.adapter.address
+        source = ETHEREUM_NATIVE_IDS[route.name]
+        if route.name == "layer_zero":
+            path = layer_zero_path(remote, adapter)
+            nonce = route.endpoint.getInboundNonce(source, path)
+            return [
+                (source, path, adapter, nonce + i + 1, gas_limit, transaction)
+                for i, transaction in enumerate(transactions)
+            ]
+        if route.name == "ccip":
+            deliveries = []
+            for transaction in transactions:
+                self._ccip_sequence += 1
+                receiver = encode_abi(["address"], [adapter])
+                message_id = ccip_message_id(source, chain.id, self._ccip_sequence, remote, receiver, transaction)
+                sender = encode_abi(["address"], [remote])
+                deliveries.append(((message_id, source, sender, transaction, []), adapter, gas_limit))
+            return deliveries
+        deliveries = []
+        for transaction in transactions:
+            deliveries.append(hyperlane_message(self._hyperlane_nonce, source, remote, chain.id, adapter, transaction))
+            self._hyperlane_nonce += 1
+        return deliveries
+
+    def _deliver(self, route, deliveries, gas_limit):
+        """Submit one batch, returns (receipt, successful deliveries)."""
+        tx = {"from": self.relayer}
+        if route.name == "layer_zero":
+            receipt = route.endpoint.receivePayloads(deliveries, tx)
+            return receipt, sum(1 for event in receipt.events["PacketReceived"] if event["success"])
+        if route.name == "ccip":
+            receipt = route.endpoint.routeMessages(deliveries, tx)
+            return receipt, sum(1 for event in receipt.events["MessageExecuted"] if event["success"])
+        receipt = route.endpoint.processBatch(deliveries, gas_limit, tx)
+        return receipt, len(receipt.events["ProcessId"]) if "ProcessId" in receipt.events else 0
+
+    def deliver(self, route, transactions, gas_limit=RECEIVE_GAS_LIMIT, remote=None):
+        """Deliver encoded transactions (see `inbound()`) in one stand-in call, returns (receipt, successful deliveries)."""
+        route = self.routes[route] if isinstance(route, str) else route
+        deliveries = self._deliveries(route, transactions, remote or self.remote, gas_limit)
+        return self._deliver(route, deliveries, gas_limit)
+
+    def receive(self, route, messages, batch_size=10, message_size=128, gas_limit=RECEIVE_GAS_LIMIT, remote=None):
+        """
+        Receive `messages` envelopes through the adapter of `route`, `batch_size` per stand-in call.
+        Messages from anything but the trusted `remote` are rejected by the adapter.
+        """
+        route = self.routes[route] if isinstance(route, str) else route
+        remote = remote or self.remote
+        result = EndpointResult(route.name, "receive", messages, message_size, batch_size, route.fee_token)
+        transactions = self.inbound(route, messages, message_size, remote)
+        for start in range(0, messages, batch_size):
+            receipt, successful = self.deliver(route, transactions[start : start + batch_size], gas_limit, remote)
+            result.gas.append(receipt.gas_used)
+            result.successful += successful
+        return result
+
+    def run(self, messages, message_sizes=(128,), batch_sizes=(10,), gas_limit=DEFAULT_GAS_LIMIT):
+        """Forward and receive `messages` envelopes per route, message size and batch size."""
+        results = []
+        for route in self.routes.values():
+            for message_size in message_sizes:
+                results.append(self.forward(route, messages, message_size, gas_limit))
+                for batch_size in batch_sizes:
+                    results.append(self.receive(route, messages, batch_size, message_size))
+        return results
@@ -0,0 +1,348 @@
+"""
+Incremental SQLite index of envelope / transaction state
+
+Purposes:
+- Consumes the CrossChainController events of one or more chains:
+    EnvelopeRegistered               (origin)       envelope registered
+    TransactionForwardingAttempted   (origin)       one row per adapter attempt
+    TransactionReceived              (destination)  confirmation count, per adapter receipt flag
+    EnvelopeDeliveryAttempted        (destination)  Confirmed (delivery failed) / Delivered
+- Keeps one row per envelope, across chains: what the origin registered and what the
+  destination received, so undelivered envelopes are found with one indexed query instead
+  of a `getEnvelopeState()` call per id
+- Processes block ranges incrementally: every page of logs is applied in one SQLite
+  transaction together with the chain's checkpoint, so a sync can be interrupted and resumed
+
+Envelope states (the ones after REGISTERED follow `EnvelopeState` on the destination):
+    REGISTERED  forwarded by the origin, no confirmation seen yet
+    RECEIVING   confirmations received, quorum not reached
+    CONFIRMED   quorum reached but delivery to the destination reverted
+    DELIVERED
+States only move forward, so chains can be synced in any order.
+
+Example:
+index = EnvelopeIndex("build/envelopes.sqlite")
+index.add_source(1, ethereum.web3, ethereum_controller.address)
+index.add_source(137, polygon.web3, polygon_controller.address)
+index.sync()
+index.stuck(min_age_blocks=100)  # undelivered envelopes registered 100+ blocks ago on their origin
+index.counts()                   # {"REGISTERED": 3, "RECEIVING": 0, "CONFIRMED": 1, "DELIVERED": 9000}
+
+"""
+
+import sqlite3
+
+from eth_hash.auto import keccak
+
+import forwarding_logs
+from encoding_utils import WORD, Envelope, address_at, to_bytes, word_at
+
+REGISTERED = 0
+RECEIVING = 1
+CONFIRMED = 2
+DELIVERED = 3
+STATE_NAMES = {REGISTERED: "REGISTERED", RECEIVING: "RECEIVING", CONFIRMED: "CONFIRMED", DELIVERED: "DELIVERED"}
+
+ENVELOPE_TUPLE = "(uint256,address,address,uint256,uint256,bytes)"
+ENVELOPE_REGISTERED = keccak(f"EnvelopeRegistered(bytes32,{ENVELOPE_TUPLE})".encode())
+TRANSACTION_FORWARDING_ATTEMPTED = forwarding_logs.TRANSACTION_FORWARDING_ATTEMPTED
+TRANSACTION_RECEIVED = keccak(b"TransactionReceived(bytes32,bytes32,uint256,(uint256,bytes),address,uint8)")
+ENVELOPE_DELIVERY_ATTEMPTED = keccak(f"EnvelopeDeliveryAttempted(bytes32,{ENVELOPE_TUPLE},bool)".encode())
+TOPICS = [ENVELOPE_REGISTERED, TRANSACTION_FORWARDING_ATTEMPTED, TRANSACTION_RECEIVED, ENVELOPE_DELIVERY_ATTEMPTED]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    chain_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, address)
+);
+CREATE TABLE IF NOT EXISTS envelopes (
+    envelope_id BLOB PRIMARY KEY,
+    nonce TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    origin_chain_id INTEGER NOT NULL,
+    destination_chain_id INTEGER NOT NULL,
+    message BLOB NOT NULL,
+    state INTEGER NOT NULL,
+    registered_block INTEGER,
+    confirmations INTEGER NOT NULL DEFAULT 0,
+    delivery_attempts INTEGER NOT NULL DEFAULT 0,
+    updated_block INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS envelopes_undelivered
+    ON envelopes (origin_chain_id, registered_block) WHERE state != 3;
+CREATE INDEX IF NOT EXISTS envelopes_state ON envelopes (state);
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id BLOB PRIMARY KEY,
+    envelope_id BLOB NOT NULL,
+    nonce TEXT,
+    confirmations INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS transactions_envelope ON transactions (envelope_id);
+CREATE TABLE IF NOT EXISTS forwardings (
+    chain_id INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    transaction_id BLOB NOT NULL,
+    envelope_id BLOB NOT NULL,
+    destination_chain_id INTEGER NOT NULL,
+    bridge_adapter TEXT NOT NULL,
+    destination_bridge_adapter TEXT NOT NULL,
+    successful INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, block, log_index)
+);
+CREATE INDEX IF NOT EXISTS forwardings_transaction ON forwardings (transaction_id);
+CREATE TABLE IF NOT EXISTS receipts (
+    transaction_id BLOB NOT NULL,
+    bridge_adapter TEXT NOT NULL,
+    chain_id INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    confirmations INTEGER NOT NULL,
+    PRIMARY KEY (transaction_id, bridge_adapter)
+);
+"""
+
+
+###################
+##### Decoding ####
+###################
+
+
+def _envelope_at(data, offset):
+    """Envelope whose tuple starts at `offset` of an event's data."""
+    return Envelope.decode((WORD).to_bytes(WORD, "big") + bytes(data[offset:]))
+
+
+def decode_delivery_attempt(data):
+    """(envelope id, envelope, isDelivered) of the data of an `EnvelopeDeliveryAttempted` log."""
+    data = to_bytes(data)
+    # envelopeId | envelope offset | isDelivered | envelope
+    return bytes(data[:WORD]), _envelope_at(data, word_at(data, WORD)), word_at(data, 2 * WORD) != 0
+
+
+##################
+##### Index ######
+##################
+
+
+class Source:
+    __slots__ = ("chain_id", "web3", "address")
+
+    def __init__(self, chain_id, web3, address):
+        self.chain_id = chain_id
+        self.web3 = web3
+        self.address = address
+
+
+class EnvelopeIndex:
+    topics = TOPICS
+    schema = SCHEMA
+
+    def __init__(self, path=":memory:"):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.schema)
+        self.sources = []
+
+    def close(self):
+        self.db.close()
+
+    def add_source(self, chain_id, web3, address, from_block=0):
+        """Index the controller at `address` of chain `chain_id`, from `from_block` unless already checkpointed."""
+        self.sources.append(Source(chain_id, web3, str(address)))
+        with self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO checkpoints (chain_id, address, block) VALUES (?, ?, ?)",
+                (chain_id, str(address).lower(), from_block - 1),
+            )
+
+    def checkpoint(self, chain_id, address):
+        """Last block of the source that is fully indexed."""
+        row = self.db.execute(
+            "SELECT block FROM checkpoints WHERE chain_id = ? AND address = ?", (chain_id, str(address).lower())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    #####  Sync  #####
+
+    def sync(self, to_block=None, step=2000):
+        """Index every source up to `to_block` (default: its latest block). Returns the number of logs applied."""
+        applied = 0
+        for source in self.sources:
+            latest = source.web3.eth.block_number if to_block is None else to_block
+            start = self.checkpoint(source.chain_id, source.address) + 1
+            while start <= latest:
+                end = min(start + step - 1, latest)
+                logs = source.web3.eth.get_logs(
+                    {
+                        "address": source.address,
+                        "fromBlock": start,
+                        "toBlock": end,
+                        "topics": [["0x" + topic.hex() for topic in self.topics]],
+                    }
+                )
+                with self.db:
+                    for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+                        self.apply(source.chain_id, log)
+                    self.db.execute(
+                        "UPDATE checkpoints SET block = ? WHERE chain_id = ? AND address = ?",
+                        (end, source.chain_id, source.address.lower()),
+                    )
+                applied += len(logs)
+                start = end + 1
+        return applied
+
+    def apply(self, chain_id, log):
+        """Apply one log (as returned by `eth_getLogs`), to be called inside a transaction."""
+        topics = [to_bytes(topic) for topic in log["topics"]]
+        data = to_bytes(log["data"])
+        block = log["blockNumber"]
+        if topics[0] == ENVELOPE_REGISTERED:
+            self._envelope(topics[1], Envelope.decode(data), REGISTERED, block, registered=True)
+        elif topics[0] == TRANSACTION_FORWARDING_ATTEMPTED:
+            self._forwarding(chain_id, block, log["logIndex"], forwarding_logs.decode(topics, data))
+        elif topics[0] == TRANSACTION_RECEIVED:
+            self._received(chain_id, topics, data, block)
+        elif topics[0] == ENVELOPE_DELIVERY_ATTEMPTED:
+            envelope_id, envelope, delivered = decode_delivery_attempt(data)
+            self._envelope(envelope_id, envelope, DELIVERED if delivered else CONFIRMED, block, delivery_attempt=True)
+
+    def _envelope(self, envelope_id, envelope, state, block, registered=False, confirmations=0, delivery_attempt=False):
+        nonce, origin, destination, origin_chain_id, destination_chain_id, message = envelope
+        self.db.execute(
+            """
+            INSERT INTO envelopes (envelope_id, nonce, origin, destination, origin_chain_id, destination_chain_id,
+                                   message, state, registered_block, confirmations, delivery_attempts, updated_block)
+            VALUES (:id, :nonce, :origin, :destination, :origin_chain_id, :destination_chain_id,
+                    :message, :state, :registered_block, :confirmations, :attempts, :block)
+            ON CONFLICT (envelope_id) DO UPDATE SET
+                state = MAX(state, excluded.state),
+                registered_block = COALESCE(registered_block, excluded.registered_block),
+                confirmations = MAX(confirmations, excluded.confirmations),
+                delivery_attempts = delivery_attempts + excluded.delivery_attempts,
+                updated_block = excluded.updated_block
+            """,
+            {
+                "id": bytes(envelope_id),
+                # uint256 doesn't fit in an SQLite integer
+                "nonce": str(nonce),
+                "origin": origin.lower(),
+                "destination": destination.lower(),
+                "origin_chain_id": origin_chain_id,
+                "destination_chain_id": destination_chain_id,
+                "message": message,
+                "state": state,
+                "registered_block": block if registered else None,
+                "confirmations": confirmations,
+                "attempts": int(delivery_attempt),
+                "block": block,
+            },
+        )
+
+    def _forwarding(self, chain_id, block, log_index, forwarded):
+        self.db.execute(
+            "INSERT OR IGNORE INTO transactions (transaction_id, envelope_id, nonce) VALUES (?, ?, ?)",
+            (bytes(forwarded.transaction_id), bytes(forwarded.envelope_id), str(forwarded.transaction_nonce)),
+        )
+        self.db.execute(
+            """
+            INSERT OR IGNORE INTO forwardings (chain_id, block, log_index, transaction_id, envelope_id,
+                                               destination_chain_id, bridge_adapter, destination_bridge_adapter, successful)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                chain_id,
+                block,
+                log_index,
+                bytes(forwarded.transaction_id),
+                bytes(forwarded.envelope_id),
+                forwarded.destination_chain_id,
+                address_at(forwarded.bridge_adapter),
+                address_at(forwarded.destination_bridge_adapter),
+                int(forwarded.adapter_successful),
+            ),
+        )
+
+    def _received(self, chain_id, topics, data, block):
+        # topics: envelopeId | originChainId | bridgeAdapter
+        # data:   transactionId | transaction offset | confirmations | (nonce, encodedEnvelope)
+        transaction_id = bytes(data[:WORD])
+        confirmations = word_at(data, 2 * WORD)
+        base = word_at(data, WORD)
+        envelope_offset = base + word_at(data, base + WORD)
+        length = word_at(data, envelope_offset)
+        envelope = Envelope.decode(data[envelope_offset + WORD : envelope_offset + WORD + length])
+
+        self.db.execute(
+            """
+            INSERT INTO transactions (transaction_id, envelope_id, nonce, confirmations) VALUES (?, ?, ?, ?)
+            ON CONFLICT (transaction_id) DO UPDATE SET confirmations = MAX(confirmations, excluded.confirmations)
+            """,
+            (transaction_id, topics[1], str(word_at(data, base)), confirmations),
+        )
+        self.db.execute(
+            "INSERT OR IGNORE INTO receipts (transaction_id, bridge_adapter, chain_id, block, confirmations) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (transaction_id, address_at(topics[3]), chain_id, block, confirmations),
+        )
+        self._envelope(topics[1], envelope, RECEIVING, block, confirmations=confirmations)
+
+    #####  Queries  #####
+
+    def envelope(self, envelope_id):
+        return self.db.execute("SELECT * FROM envelopes WHERE envelope_id = ?", (bytes(envelope_id),)).fetchone()
+
+    def state(self, envelope_id):
+        row = self.db.execute("SELECT state FROM envelopes WHERE envelope_id = ?", (bytes(envelope_id),)).fetchone()
+        return None if row is None else row[0]
+
+    def counts(self):
+        """Number of envelopes per state name."""
+        counts = dict.fromkeys(STATE_NAMES.values(), 0)
+        for state, count in self.db.execute("SELECT state, COUNT(*) FROM envelopes GROUP BY state"):
+            counts[STATE_NAMES[state]] = count
+        return counts
+
+    def stuck(self, min_age_blocks=0, limit=None):
+        """
+        Undelivered envelopes registered at least `min_age_blocks` blocks before the origin chain's
+        checkpoint, oldest first. Envelopes only seen on their destination (origin not indexed) have no
+        registration block to age them by: they are always reported, first, whatever `min_age_blocks`.
+        """
+        query = """
+            SELECT envelopes.* FROM envelopes
+            LEFT JOIN (SELECT chain_id, MAX(block) AS block FROM checkpoints GROUP BY chain_id) AS checkpoint
+                ON checkpoint.chain_id = envelopes.origin_chain_id
+            WHERE envelopes.state != 3
+              AND (envelopes.registered_block IS NULL OR envelopes.registered_block <= checkpoint.block - ?)
+            ORDER BY envelopes.origin_chain_id, envelopes.registered_block
+        """
+        parameters = [min_age_blocks]
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return self.db.execute(query, parameters).fetchall()
+
+    def confirmed_undelivered(self):
+        """Envelopes whose delivery reverted: `deliverEnvelope()` candidates."""
+        return self.db.execute("SELECT * FROM envelopes WHERE state = ?", (CONFIRMED,)).fetchall()
+
+    def receipts(self, transaction_id):
+        """{bridge adapter: confirmations after its receipt} of a transaction."""
+        return {
+            row["bridge_adapter"]: row["confirmations"]
+            for row in self.db.execute(
+                "SELECT bridge_adapter, confirmations FROM receipts WHERE transaction_id = ?", (bytes(transaction_id),)
+            )
+        }
+
+    def forwardings(self, transaction_id):
+        return self.db.execute(
+            "SELECT * FROM forwardings WHERE transaction_id = ? ORDER BY chain_id, block, log_index",
+            (bytes(transaction_id),),
+        ).fetchall()
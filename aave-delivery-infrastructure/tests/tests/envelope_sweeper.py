@@ -0,0 +1,237 @@
+"""
+Bulk sweeper for `Confirmed` but undelivered envelopes
+
+Purposes:
+- Finds the envelopes a reverted delivery left `Confirmed`: the `EnvelopeDeliveryAttempted`
+  logs with `isDelivered = false`, minus the envelopes delivered since, with the full
+  `Envelope` rebuilt from the log data (or from an `envelope_index.EnvelopeIndex`)
+- Pre-checks every envelope with an `eth_call` of `deliverEnvelope()` (which reverts when the
+  destination still reverts), so only the deliveries that would succeed now are submitted
+- Submits the deliveries concurrently: JSON-RPC batches of `eth_sendTransaction`, several
+  batches in flight, receipts polled in batches
+- Reports the throughput and how many envelopes remain stuck
+
+`deliverEnvelope()` can be called by anyone, the sender only needs to be unlocked on the node.
+
+Example:
+envelopes = confirmed_envelopes(web3, cross_chain_controller.address)
+sweeper = Sweeper(web3.provider.endpoint_uri, cross_chain_controller.address, alice.address)
+report = asyncio.run(sweeper.sweep(envelopes))
+print(report)  # SweepReport(found 120, deliverable 100, delivered 100, stuck 20, ... envelopes/s)
+
+"""
+
+import asyncio
+import time
+
+import aiohttp
+from eth_hash.auto import keccak
+
+from async_relayer import AsyncRpc, RpcError
+from encoding_utils import Envelope
+from envelope_index import ENVELOPE_DELIVERY_ATTEMPTED, decode_delivery_attempt
+from multichain import delivery_attempts
+
+DELIVER_ENVELOPE = keccak(b"deliverEnvelope((uint256,address,address,uint256,uint256,bytes))")[:4]
+DEFAULT_GAS = 2_000_000
+
+
+def deliver_envelope_calldata(envelope):
+    # `abi.encode(envelope)` is also the encoding of the single (dynamic) argument
+    return "0x" + (DELIVER_ENVELOPE + envelope.to_bytes()).hex()
+
+
+##################
+##### Finding ####
+##################
+
+
+def confirmed_envelopes(web3, address, from_block=0, to_block=None, step=2000):
+    """{envelope id: Envelope} of the envelopes whose last delivery attempt failed, in log order."""
+    to_block = web3.eth.block_number if to_block is None else to_block
+    envelopes = {}
+    for start in range(from_block, to_block + 1, step):
+        logs = web3.eth.get_logs(
+            {
+                "address": str(address),
+                "fromBlock": start,
+                "toBlock": min(start + step - 1, to_block),
+                "topics": ["0x" + ENVELOPE_DELIVERY_ATTEMPTED.hex()],
+            }
+        )
+        for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+            envelope_id, envelope, delivered = decode_delivery_attempt(log["data"])
+            if delivered:
+                envelopes.pop(envelope_id, None)
+            else:
+                envelopes[envelope_id] = envelope
+    return envelopes
+
+
+def from_index(index):
+    """{envelope id: Envelope} of the `CONFIRMED` envelopes of an `envelope_index.EnvelopeIndex`."""
+    return {
+        bytes(row["envelope_id"]): Envelope(
+            int(row["nonce"]),
+            row["origin"],
+            row["destination"],
+            row["origin_chain_id"],
+            row["destination_chain_id"],
+            bytes(row["message"]),
+        )
+        for row in index.confirmed_undelivered()
+    }
+
+
+##################
+##### Report #####
+##################
+
+
+class SweepReport:
+    def __init__(self, found):
+        self.found = found
+        self.deliverable = 0
+        self.submitted = 0
+        self.delivered = 0
+        # rejected by the node or reverted once mined
+        self.failed = 0
+        self.precheck_seconds = 0.0
+        self.seconds = 0.0
+        # envelope id => revert reason of the pre-check
+        self.stuck = {}
+
+    @property
+    def still_stuck(self):
+        return self.found - self.delivered
+
+    @property
+    def envelopes_per_second(self):
+        return self.delivered / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (
+            f"SweepReport(found {self.found}, deliverable {self.deliverable}, delivered {self.delivered}, "
+            f"failed {self.failed}, stuck {self.still_stuck}, pre-check {self.precheck_seconds:.2f}s, "
+            f"delivery {self.seconds:.2f}s, {self.envelopes_per_second:,.1f} envelopes/s)"
+        )
+
+
+###################
+##### Sweeper #####
+###################
+
+
+class Sweeper:
+    def __init__(self, url, controller, sender, batch_size=50, max_in_flight=200, gas=DEFAULT_GAS, poll_interval=0.05):
+        """`max_in_flight`: cap on submitted transactions without a receipt, over all batches."""
+        self.url = url
+        self.controller = str(controller)
+        self.sender = str(sender)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.gas = gas
+        self.poll_interval = poll_interval
+
+    def _batches(self, items):
+        return [items[start : start + self.batch_size] for start in range(0, len(items), self.batch_size)]
+
+    def _call(self, envelope):
+        return {"from": self.sender, "to": self.controller, "data": deliver_envelope_calldata(envelope)}
+
+    async def precheck(self, rpc, envelopes):
+        """[(envelope id, envelope, revert reason or None)], every batch of `eth_call` sent at once."""
+        items = list(envelopes.items())
+        results = await asyncio.gather(
+            *(
+                rpc.batch([("eth_call", [self._call(envelope), "latest"]) for _, envelope in batch])
+                for batch in self._batches(items)
+            )
+        )
+        return [
+            (envelope_id, envelope, str(result) if isinstance(result, RpcError) else None)
+            for (envelope_id, envelope), result in zip(items, [result for batch in results for result in batch])
+        ]
+
+    async def _deliver(self, rpc, batch, slots, report):
+        async with slots:
+            calls = [
+                ("eth_sendTransaction", [{**self._call(envelope), "gas": hex(self.gas), "gasPrice": "0x0"}])
+                for _, envelope in batch
+            ]
+            try:
+                results = await rpc.batch(calls)
+            except (aiohttp.ClientError, asyncio.TimeoutError, RpcError) as e:
+                results = [RpcError(str(e))] * len(batch)
+            pending = set()
+            for result in results:
+                if isinstance(result, RpcError):
+                    report.failed += 1
+                else:
+                    pending.add(result)
+                    report.submitted += 1
+
+            while pending:
+                await asyncio.sleep(self.poll_interval)
+                hashes = list(pending)
+                receipts = await rpc.batch([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes])
+                for tx_hash, receipt in zip(hashes, receipts):
+                    if receipt is None or isinstance(receipt, RpcError):
+                        continue
+                    pending.discard(tx_hash)
+                    attempts = delivery_attempts(receipt, self.controller)
+                    if int(receipt["status"], 16) == 1 and attempts and attempts[0][1]:
+                        report.delivered += 1
+                    else:
+                        report.failed += 1
+
+    async def sweep(self, envelopes):
+        """Pre-check and deliver `envelopes` ({envelope id: Envelope}), returns a `SweepReport`."""
+        report = SweepReport(len(envelopes))
+        async with aiohttp.ClientSession() as session:
+            rpc = AsyncRpc(self.url, session)
+
+            start = time.perf_counter()
+            deliverable = []
+            for envelope_id, envelope, reason in await self.precheck(rpc, envelopes):
+                if reason is None:
+                    deliverable.append((envelope_id, envelope))
+                else:
+                    report.stuck[envelope_id] = reason
+            report.deliverable = len(deliverable)
+            report.precheck_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            slots = asyncio.Semaphore(max(1, self.max_in_flight // self.batch_size))
+            await asyncio.gather(*(self._deliver(rpc, batch, slots, report) for batch in self._batches(deliverable)))
+            report.seconds = time.perf_counter() - start
+        return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from web3 import Web3
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8545")
+    parser.add_argument("--controller", required=True, help="address of the CrossChainController")
+    parser.add_argument("--sender", required=True, help="account unlocked on the node")
+    parser.add_argument("--from-block", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="only find and pre-check")
+    args = parser.parse_args()
+
+    envelopes = confirmed_envelopes(Web3(Web3.HTTPProvider(args.url)), args.controller, args.from_block)
+    sweeper = Sweeper(args.url, args.controller, args.sender, args.batch_size, args.max_in_flight)
+    if args.dry_run:
+
+        async def dry_run():
+            async with aiohttp.ClientSession() as session:
+                return await sweeper.precheck(AsyncRpc(args.url, session), envelopes)
+
+        for envelope_id, envelope, reason in asyncio.run(dry_run()):
+            print("0x" + envelope_id.hex(), envelope, reason or "deliverable")
+    else:
+        print(asyncio.run(sweeper.sweep(envelopes)))
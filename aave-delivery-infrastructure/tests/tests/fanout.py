@@ -0,0 +1,302 @@
+"""
+Multi-destination fan-out benchmark
+
+Purposes:
+- Governance fans one proposal out to many chains, each destination with several adapters. On an
+  origin chain of the multi-chain simulator, configures D destination chains x A adapters through
+  `enableBridgeAdapters()` (after disabling whatever was enabled before, both measured) and sends
+  the same message to every destination, one `forwardMessage()` each
+- Measures, per (D, A):
+    gas             of the configuration, of the forwards on the origin and of the confirmations
+                    relayed on the destinations
+    event volume    logs and logged bytes (data and topics) on the origin and on the destinations
+    wall time       from the first `forwardMessage()` sent to the delivery on every destination,
+                    and to the delivery on each of them (resolution: one relayer step)
+- Projects how far one origin controller scales: the destinations a fan-out can reach within one
+  origin block, and the adapter configurations one `enableBridgeAdapters()` can carry
+
+The simulator is started with every destination chain and the largest adapter count of the grid,
+smaller configurations use the first D destinations and the first A adapters of each. Forwarder
+adapters are `Empty` contracts, so the adapters' own bridging costs are left out.
+
+Example:
+with Simulator([1] + DESTINATION_CHAIN_IDS[:8], adapters_per_route=4) as simulator:
+    fan_out = FanOut(simulator, origin_chain_id=1)
+    results = fan_out.run_grid(destination_counts=[1, 2, 4, 8], adapter_counts=[1, 2, 4])
+    write_csv("reports/fanout.csv", results)
+    for adapters, limits in scaling_limits(results).items():
+        print(adapters, limits)  # {"destinations_per_block": ..., "configurations_per_transaction": ...}
+
+"""
+
+import csv
+import os
+import time
+
+from adapter_scaling import BLOCK_GAS_LIMITS
+from encoding_utils import to_bytes
+from multichain import SimulationError
+
+# chain ids of the destinations, the origin being Ethereum
+DESTINATION_CHAIN_IDS = [137, 43114, 42161, 10, 56, 250, 100, 1088, 8453, 1666600000, 1101, 59144]
+CONFIGURATION_CHUNK = 100
+FIELDS = (
+    "destinations",
+    "adapters",
+    "message_size",
+    "disable_gas",
+    "enable_gas",
+    "forward_gas",
+    "forward_gas_per_destination",
+    "receive_gas",
+    "origin_logs",
+    "origin_log_bytes",
+    "destination_logs",
+    "destination_log_bytes",
+    "delivered",
+    "seconds",
+    "slowest_destination_seconds",
+)
+
+
+class Volume:
+    """Gas and logs of the transactions mined on a chain over a block range."""
+
+    __slots__ = ("transactions", "gas", "logs", "log_bytes")
+
+    def __init__(self):
+        self.transactions = 0
+        self.gas = 0
+        self.logs = 0
+        self.log_bytes = 0
+
+    def add(self, receipt):
+        self.transactions += 1
+        self.gas += receipt["gasUsed"]
+        self.logs += len(receipt["logs"])
+        self.log_bytes += sum(len(to_bytes(log["data"])) + 32 * len(log["topics"]) for log in receipt["logs"])
+        return self
+
+
+def block_volume(chain, from_block, to_block=None, volume=None):
+    """`Volume` of every transaction of `chain` in [from_block, to_block] (default: its latest block), added to `volume`."""
+    web3 = chain.web3
+    to_block = web3.eth.block_number if to_block is None else to_block
+    volume = Volume() if volume is None else volume
+    for number in range(from_block, to_block + 1):
+        for tx_hash in web3.eth.get_block(number)["transactions"]:
+            volume.add(web3.eth.get_transaction_receipt(tx_hash))
+    return volume
+
+
+###################
+##### Results #####
+###################
+
+
+class FanOutResult:
+    def __init__(self, destinations, adapters, message_size):
+        self.destinations = destinations
+        self.adapters = adapters
+        self.message_size = message_size
+        self.disable_gas = 0
+        self.enable_gas = 0
+        self.origin = Volume()
+        self.destination = Volume()
+        self.delivered = 0
+        self.seconds = 0.0
+        self.delivery_seconds = {}  # {destination chain id: seconds from the first send}
+
+    @property
+    def forward_gas_per_destination(self):
+        return self.origin.gas / self.destinations if self.destinations else 0.0
+
+    @property
+    def slowest_destination_seconds(self):
+        return max(self.delivery_seconds.values(), default=0.0)
+
+    def row(self):
+        return [
+            self.destinations,
+            self.adapters,
+            self.message_size,
+            self.disable_gas,
+            self.enable_gas,
+            self.origin.gas,
+            f"{self.forward_gas_per_destination:.1f}",
+            self.destination.gas,
+            self.origin.logs,
+            self.origin.log_bytes,
+            self.destination.logs,
+            self.destination.log_bytes,
+            self.delivered,
+            f"{self.seconds:.3f}",
+            f"{self.slowest_destination_seconds:.3f}",
+        ]
+
+    def __repr__(self):
+        return (
+            f"FanOutResult({self.destinations} destinations x {self.adapters} adapters, {self.message_size} bytes: "
+            f"{self.delivered}/{self.destinations} delivered in {self.seconds:.2f}s, enable {self.enable_gas:,} gas, "
+            f"forward {self.origin.gas:,} gas ({self.origin.logs} logs, {self.origin.log_bytes:,} bytes), "
+            f"receive {self.destination.gas:,} gas ({self.destination.logs} logs, {self.destination.log_bytes:,} bytes))"
+        )
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for result in results:
+            writer.writerow(result.row())
+
+
+###################
+##### Fan-out #####
+###################
+
+
+class FanOut:
+    def __init__(self, simulator, origin_chain_id, chunk_size=CONFIGURATION_CHUNK):
+        self.simulator = simulator
+        self.origin_chain_id = origin_chain_id
+        self.origin = simulator.chains[origin_chain_id]
+        self.controller = self.origin.contracts["cross_chain_controller"]
+        self.destination_chain_ids = [chain_id for chain_id in simulator.chains if chain_id != origin_chain_id]
+        self.chunk_size = chunk_size
+        self.adapters = []  # `Empty` forwarder adapters deployed on the origin
+        self.enabled = None  # {forwarder adapter: [destination chain ids]}
+
+    def _enabled_adapters(self):
+        """{forwarder adapter: [destination chain ids]} currently enabled on the origin."""
+        enabled = {}
+        for chain_id in self.destination_chain_ids:
+            for _, current_chain_adapter in self.controller.functions.getForwarderBridgeAdaptersByChain(chain_id).call():
+                enabled.setdefault(current_chain_adapter, []).append(chain_id)
+        return enabled
+
+    def _chunks(self, items):
+        return [items[i : i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+
+    def configure(self, destinations, adapters):
+        """
+        Disable every forwarder adapter of the origin, then enable `adapters` adapters for each of
+        the first `destinations` destination chains. Returns (disable gas, enable gas).
+        """
+        if destinations > len(self.destination_chain_ids):
+            raise ValueError(f"{destinations} destinations requested, the simulator has {len(self.destination_chain_ids)}")
+        if adapters > self.simulator.adapters_per_route:
+            raise ValueError(f"{adapters} adapters requested, the simulator has {self.simulator.adapters_per_route}")
+        if self.enabled is None:
+            self.enabled = self._enabled_adapters()
+
+        disable_gas = 0
+        for chunk in self._chunks(list(self.enabled.items())):
+            disable_gas += self.origin.call(self.controller, "disableBridgeAdapters", chunk)["gasUsed"]
+
+        while len(self.adapters) < adapters:
+            self.adapters.append(self.origin.deploy("Empty").address)
+        configurations = []
+        for chain_id in self.destination_chain_ids[:destinations]:
+            destination_adapters = self.simulator.adapter_accounts(self.simulator.chains[chain_id])
+            configurations += [
+                (adapter, destination_adapter, chain_id)
+                for adapter, destination_adapter in zip(self.adapters[:adapters], destination_adapters)
+            ]
+        enable_gas = 0
+        for chunk in self._chunks(configurations):
+            enable_gas += self.origin.call(self.controller, "enableBridgeAdapters", chunk)["gasUsed"]
+
+        self.enabled = {}
+        for adapter, _, chain_id in configurations:
+            self.enabled.setdefault(adapter, []).append(chain_id)
+        return disable_gas, enable_gas
+
+    def send(self, destinations, adapters, message_size=128, timeout=600):
+        """Send one message to each of the first `destinations` chains, relay until every one is delivered."""
+        simulator = self.simulator
+        result = FanOutResult(destinations, adapters, message_size)
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        chain_ids = self.destination_chain_ids[:destinations]
+        first_blocks = {chain_id: chain.web3.eth.block_number + 1 for chain_id, chain in simulator.chains.items()}
+        received_before = sum(self._messages_received(chain_id) for chain_id in chain_ids)
+
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        envelopes = {simulator.send(self.origin_chain_id, chain_id, message): chain_id for chain_id in chain_ids}
+        while len(result.delivery_seconds) < len(envelopes):
+            if not simulator.relayer.step():
+                time.sleep(0.01)
+            now = time.perf_counter() - start
+            for envelope_id, chain_id in envelopes.items():
+                if envelope_id not in simulator.pending and chain_id not in result.delivery_seconds:
+                    result.delivery_seconds[chain_id] = now
+            if time.monotonic() > deadline:
+                raise SimulationError(f"{len(envelopes) - len(result.delivery_seconds)} destinations not reached after {timeout}s")
+        result.seconds = time.perf_counter() - start
+
+        result.delivered = sum(self._messages_received(chain_id) for chain_id in chain_ids) - received_before
+        result.origin = block_volume(self.origin, first_blocks[self.origin_chain_id])
+        for chain_id in chain_ids:
+            block_volume(simulator.chains[chain_id], first_blocks[chain_id], volume=result.destination)
+        return result
+
+    def _messages_received(self, chain_id):
+        return self.simulator.chains[chain_id].contracts["receiver_portal"].functions.messagesReceived().call()
+
+    def run(self, destinations, adapters, message_size=128):
+        disable_gas, enable_gas = self.configure(destinations, adapters)
+        result = self.send(destinations, adapters, message_size)
+        result.disable_gas = disable_gas
+        result.enable_gas = enable_gas
+        return result
+
+    def run_grid(self, destination_counts, adapter_counts, message_size=128):
+        return [
+            self.run(destinations, adapters, message_size)
+            for adapters in adapter_counts
+            for destinations in destination_counts
+        ]
+
+
+###################
+##### Scaling #####
+###################
+
+
+def _linear_fit(points):
+    """(a, b) of the least squares line y = a + b*x."""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 0.0
+    return mean_y - slope * mean_x, slope
+
+
+def scaling_limits(results, gas_budget=min(BLOCK_GAS_LIMITS.values())):
+    """
+    {adapters: {"forward_gas_per_destination", "destinations_per_block", "gas_per_configuration",
+    "configurations_per_transaction"}}: how many destinations one origin block can reach with that
+    many adapters each, and how many (adapter, destination) pairs one `enableBridgeAdapters()` takes.
+    `gas_budget` defaults to the lowest of `BLOCK_GAS_LIMITS`.
+    """
+    by_adapters = {}
+    for result in results:
+        by_adapters.setdefault(result.adapters, []).append(result)
+    limits = {}
+    for adapters, series in sorted(by_adapters.items()):
+        forward = _linear_fit([(result.destinations, result.origin.gas) for result in series])
+        enable = _linear_fit([(result.destinations * adapters, result.enable_gas) for result in series])
+        per_destination = forward[1] if len(series) > 1 else series[0].forward_gas_per_destination
+        per_configuration = enable[1] if len(series) > 1 else series[0].enable_gas / (series[0].destinations * adapters)
+        limits[adapters] = {
+            "forward_gas_per_destination": round(per_destination),
+            "destinations_per_block": int(gas_budget // per_destination) if per_destination > 0 else None,
+            "gas_per_configuration": round(per_configuration),
+            "configurations_per_transaction": (
+                int((gas_budget - max(enable[0], 0)) // per_configuration) if per_configuration > 0 else None
+            ),
+        }
+    return limits
@@ -0,0 +1,299 @@
+"""
+Per-adapter forwarding cost model and fee table
+
+Purposes:
+- Measures, against the local endpoint stand-ins of `endpoint_load`, the gas of `forwardMessage()`
+  and the fee it pays when a single adapter is enabled for the destination, over a grid of
+  adapters x destination chains x message sizes x destination gas limits
+- Measures the forwarder's own share the same way with `Empty` adapters: one and two of them,
+  the difference being the cost of one more (empty) adapter in the loop
+- Fits gas (and fee) = a + b*size + c*size^2 per adapter, destination and gas limit, the
+  quadratic term being memory expansion of the larger messages
+- Predicts a fan-out: `forwardMessage()` delegatecalls every adapter of the destination, so its
+  gas is the forwarder's share plus the marginal gas of every adapter, and its fees the sum of
+  the adapters' fees, per fee token
+- Writes the measurements, the model coefficients and a lookup table of predicted gas and fee
+  per adapter, destination, gas limit and message size
+
+The first call to a destination writes the endpoints' nonces from zero: every cell is warmed
+up with one call that is not measured, so the numbers are the steady state.
+
+Example:
+costs = ForwardCosts(load, Empty)  # load = endpoint_load.EndpointLoad.setup(...)
+measurements = costs.run(message_sizes=[0, 256, 1024, 4096], gas_limits=[200_000, 500_000])
+models = fit(measurements)
+write_csv("reports/forward_costs.csv", measurements)
+write_models("reports/forward_cost_models.csv", models)
+write_table("reports/forward_fee_table.csv", fee_table(models, message_sizes=range(0, 8193, 512)))
+gas, fees = predict_fanout(models, ["layer_zero", "ccip", "hyperlane"], 43114, 2048, 200_000)
+
+"""
+
+import csv
+import os
+
+from adapter_scaling import fit_quadratic
+from endpoint_load import DEFAULT_GAS_LIMIT
+
+FORWARDER = "forwarder"
+# destination chains every adapter supports, Avalanche and Polygon are supported by all of them
+DESTINATIONS = {
+    "layer_zero": (43114, 137, 42161, 10),
+    "ccip": (43114, 137),
+    "hyperlane": (43114, 137, 42161, 10),
+}
+MEASUREMENT_FIELDS = ("adapter", "destination_chain_id", "message_size", "gas_limit", "samples", "gas", "fee", "fee_token")
+MODEL_FIELDS = ("adapter", "destination_chain_id", "gas_limit", "fee_token", "gas_a", "gas_b", "gas_c", "fee_a", "fee_b", "fee_c")
+TABLE_FIELDS = ("adapter", "destination_chain_id", "gas_limit", "message_size", "gas", "marginal_gas", "fee", "fee_token")
+
+
+class Measurement:
+    __slots__ = ("adapter", "destination_chain_id", "message_size", "gas_limit", "samples", "gas", "fee", "fee_token")
+
+    def __init__(self, adapter, destination_chain_id, message_size, gas_limit, samples, gas, fee, fee_token):
+        self.adapter = adapter
+        self.destination_chain_id = destination_chain_id
+        self.message_size = message_size
+        self.gas_limit = gas_limit
+        self.samples = samples
+        self.gas = gas
+        self.fee = fee
+        self.fee_token = fee_token
+
+    @property
+    def key(self):
+        return (self.adapter, self.destination_chain_id, self.gas_limit)
+
+    def row(self):
+        return [
+            self.adapter,
+            self.destination_chain_id,
+            self.message_size,
+            self.gas_limit,
+            self.samples,
+            f"{self.gas:.1f}",
+            f"{self.fee:.0f}",
+            self.fee_token or "",
+        ]
+
+    def __repr__(self):
+        return (
+            f"Measurement({self.adapter}, chain {self.destination_chain_id}, {self.message_size} bytes, "
+            f"gas limit {self.gas_limit}: gas {self.gas:,.0f}, fee {self.fee:,.0f} {self.fee_token or ''})"
+        )
+
+
+class ForwardCosts:
+    def __init__(self, load, empty_container, destinations=DESTINATIONS, samples=2):
+        """`load`: an `endpoint_load.EndpointLoad`, whose adapters are (re)configured per measured destination."""
+        self.load = load
+        self.empty_container = empty_container
+        self.destinations = {name: chain_ids for name, chain_ids in destinations.items() if name in load.routes}
+        self.samples = samples
+        self._empty_adapters = []
+
+    @property
+    def owner(self):
+        return {"from": self.load.relayer}
+
+    def empty_adapters(self, count):
+        while len(self._empty_adapters) < count:
+            self._empty_adapters.append(self.empty_container.deploy(self.owner))
+        return self._empty_adapters[:count]
+
+    def _enable(self, adapters, destination_chain_id):
+        controller = self.load.cross_chain_controller
+        controller.enableBridgeAdapters(
+            [(adapter, self.load.destination_adapter, destination_chain_id) for adapter in adapters], self.owner
+        )
+
+    def _disable(self, adapters, destination_chain_id):
+        controller = self.load.cross_chain_controller
+        controller.disableBridgeAdapters([(adapter, [destination_chain_id]) for adapter in adapters], self.owner)
+
+    def _forward_empty(self, destination_chain_id, message_size, gas_limit):
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        tx = self.load.cross_chain_controller.forwardMessage(
+            destination_chain_id, self.load.portal, gas_limit, message, {"from": self.load.sender}
+        )
+        return tx.gas_used
+
+    def measure_forwarder(self, destination_chain_id, message_sizes, gas_limits):
+        """
+        Forwarder share of `forwardMessage()`: with g1 / g2 the gas with one / two `Empty` adapters,
+        g2 - g1 is the cost of one adapter in the loop, and 2*g1 - g2 what is left without any.
+        """
+        measurements = []
+        gas = {}
+        for count in (1, 2):
+            adapters = self.empty_adapters(count)
+            self._enable(adapters, destination_chain_id)
+            for gas_limit in gas_limits:
+                for message_size in message_sizes:
+                    self._forward_empty(destination_chain_id, message_size, gas_limit)
+                    samples = [
+                        self._forward_empty(destination_chain_id, message_size, gas_limit) for _ in range(self.samples)
+                    ]
+                    gas[count, gas_limit, message_size] = sum(samples) / len(samples)
+            self._disable(adapters, destination_chain_id)
+        for gas_limit in gas_limits:
+            for message_size in message_sizes:
+                forwarder_gas = 2 * gas[1, gas_limit, message_size] - gas[2, gas_limit, message_size]
+                measurements.append(
+                    Measurement(FORWARDER, destination_chain_id, message_size, gas_limit, self.samples, forwarder_gas, 0, None)
+                )
+        return measurements
+
+    def measure(self, name, destination_chain_id, message_sizes, gas_limits):
+        """`forwardMessage()` gas and fee with the adapter of route `name` alone enabled for the destination."""
+        route = self.load.routes[name]
+        if name == "ccip":
+            route.endpoint.setChainSupported(route.adapter.infraToNativeChainId(destination_chain_id), True, self.owner)
+        self._enable([route.adapter], destination_chain_id)
+        measurements = []
+        for gas_limit in gas_limits:
+            for message_size in message_sizes:
+                self.load.forward(route, 1, message_size, gas_limit, destination_chain_id)
+                result = self.load.forward(route, self.samples, message_size, gas_limit, destination_chain_id)
+                if result.successful != self.samples:
+                    raise ValueError(f"{name} failed to forward to {destination_chain_id}")
+                measurements.append(
+                    Measurement(
+                        name,
+                        destination_chain_id,
+                        message_size,
+                        gas_limit,
+                        self.samples,
+                        result.mean_gas,
+                        result.mean_fee,
+                        route.fee_token,
+                    )
+                )
+        self._disable([route.adapter], destination_chain_id)
+        return measurements
+
+    def run(self, message_sizes=(0, 256, 1024, 4096, 16384), gas_limits=(DEFAULT_GAS_LIMIT,)):
+        """Measure the whole grid, the forwarder share first. Each route's own destination is left disabled."""
+        chain_ids = sorted({chain_id for chain_ids in self.destinations.values() for chain_id in chain_ids})
+        for route in self.load.routes.values():
+            self._disable([route.adapter], route.destination_chain_id)
+        measurements = []
+        for chain_id in chain_ids:
+            measurements += self.measure_forwarder(chain_id, message_sizes, gas_limits)
+        for name, chain_ids in self.destinations.items():
+            for chain_id in chain_ids:
+                measurements += self.measure(name, chain_id, message_sizes, gas_limits)
+        return measurements
+
+
+#################
+##### Model #####
+#################
+
+
+class CostModel:
+    __slots__ = ("adapter", "destination_chain_id", "gas_limit", "fee_token", "gas", "fee")
+
+    def __init__(self, adapter, destination_chain_id, gas_limit, fee_token, gas, fee):
+        self.adapter = adapter
+        self.destination_chain_id = destination_chain_id
+        self.gas_limit = gas_limit
+        self.fee_token = fee_token
+        self.gas = gas  # (a, b, c) of a + b*size + c*size^2
+        self.fee = fee
+
+    @staticmethod
+    def _evaluate(coefficients, message_size):
+        a, b, c = coefficients
+        return a + b * message_size + c * message_size**2
+
+    def predict_gas(self, message_size):
+        return self._evaluate(self.gas, message_size)
+
+    def predict_fee(self, message_size):
+        return max(0.0, self._evaluate(self.fee, message_size))
+
+    def row(self):
+        return [self.adapter, self.destination_chain_id, self.gas_limit, self.fee_token or ""] + [
+            f"{value:.6g}" for value in self.gas + self.fee
+        ]
+
+    def __repr__(self):
+        a, b, c = self.gas
+        return (
+            f"CostModel({self.adapter}, chain {self.destination_chain_id}, gas limit {self.gas_limit}: "
+            f"gas {a:,.0f} + {b:.2f}*size + {c:.2e}*size^2)"
+        )
+
+
+def fit(measurements):
+    """{(adapter, destination chain id, gas limit): CostModel} from `ForwardCosts.run()`."""
+    series = {}
+    for measurement in measurements:
+        series.setdefault(measurement.key, []).append(measurement)
+    models = {}
+    for (adapter, chain_id, gas_limit), points in series.items():
+        gas = fit_quadratic([(m.message_size, m.gas) for m in points])
+        fee = fit_quadratic([(m.message_size, m.fee) for m in points])
+        models[adapter, chain_id, gas_limit] = CostModel(adapter, chain_id, gas_limit, points[0].fee_token, gas, fee)
+    return models
+
+
+def predict_fanout(models, adapters, destination_chain_id, message_size, gas_limit=DEFAULT_GAS_LIMIT):
+    """
+    (gas, {fee token: fee}) of a `forwardMessage()` to a destination with `adapters` (route names)
+    enabled: the forwarder's share plus each adapter's gas on top of it.
+    """
+    forwarder = models[FORWARDER, destination_chain_id, gas_limit].predict_gas(message_size)
+    gas = forwarder
+    fees = {}
+    for adapter in adapters:
+        model = models[adapter, destination_chain_id, gas_limit]
+        gas += model.predict_gas(message_size) - forwarder
+        fees[model.fee_token] = fees.get(model.fee_token, 0.0) + model.predict_fee(message_size)
+    return gas, fees
+
+
+def fee_table(models, message_sizes):
+    """Lookup table rows: predicted gas, marginal gas (on top of the forwarder) and fee of every model."""
+    rows = []
+    for (adapter, chain_id, gas_limit), model in sorted(models.items()):
+        if adapter == FORWARDER:
+            continue
+        forwarder = models.get((FORWARDER, chain_id, gas_limit))
+        for message_size in message_sizes:
+            gas = model.predict_gas(message_size)
+            marginal = gas - forwarder.predict_gas(message_size) if forwarder else ""
+            rows.append(
+                [
+                    adapter,
+                    chain_id,
+                    gas_limit,
+                    message_size,
+                    round(gas),
+                    round(marginal) if forwarder else marginal,
+                    round(model.predict_fee(message_size)),
+                    model.fee_token,
+                ]
+            )
+    return rows
+
+
+def _write(path, fields, rows):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(rows)
+
+
+def write_csv(path, measurements):
+    _write(path, MEASUREMENT_FIELDS, [measurement.row() for measurement in measurements])
+
+
+def write_models(path, models):
+    _write(path, MODEL_FIELDS, [model.row() for _, model in sorted(models.items())])
+
+
+def write_table(path, rows):
+    _write(path, TABLE_FIELDS, rows)
@@ -0,0 +1,285 @@
+"""
+`forwardMessage()` load generator
+
+Purposes:
+- Approves many senders (`approveSenders()`) and enables `Empty` forwarder adapters for
+  many destination chains, with a different number of adapters per destination
+- Sends N envelopes round robin over senders and destinations, pipelined in batches
+  (`TxPipeline`), and measures transactions per second and gas per call
+- Tracks gas drift while `_currentEnvelopeNonce` / `_currentTransactionNonce` and the
+  `_registeredEnvelopes` / `_forwardedTransactions` mappings grow: overall as a least squares
+  slope over the envelope nonce, and per configuration as first vs last window means
+- Streams one CSV row per call, and writes one summary row per configuration
+
+Senders are drawn from the account pool (`tools/account_pool.py`): with the development
+network's gas price of 0 they don't need funds, so there can be as many as the pool holds.
+
+Example:
+load = ForwardLoad.setup(cross_chain_controller, owner, Empty, account_pool, senders=50,
+                         destination_chain_ids=range(20_000, 20_012), adapters_per_destination=[1, 2, 4])
+result = load.run(envelopes=20_000, message_size=128, path="reports/forward_load.csv")
+result.write_summary("reports/forward_load_summary.csv")
+print(result)  # LoadResult(20000 calls, ... tx/s, mean gas ..., drift ... gas / 1k envelopes)
+
+"""
+
+import csv
+import os
+import time
+from collections import deque
+
+from tx_pipeline import TxPipeline
+
+CALL_FIELDS = (
+    "envelope_nonce",
+    "sender",
+    "destination_chain_id",
+    "adapters",
+    "message_size",
+    "gas_used",
+    "block_number",
+    "batch",
+)
+SUMMARY_FIELDS = (
+    "destination_chain_id",
+    "adapters",
+    "calls",
+    "mean_gas",
+    "min_gas",
+    "max_gas",
+    "first_window_mean_gas",
+    "last_window_mean_gas",
+    "drift_gas",
+)
+DEFAULT_WINDOW = 100
+# gas drift of a configuration still read as flat, as a fraction of its mean gas
+DRIFT_TOLERANCE = 0.001
+
+
+###################
+##### Results #####
+###################
+
+
+class GasStats:
+    """Running gas statistics, with the mean of the first and of the last `window` calls."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.calls = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.first = []
+        self.last = deque(maxlen=window)
+
+    def add(self, gas):
+        self.calls += 1
+        self.total += gas
+        self.min = gas if self.min is None else min(self.min, gas)
+        self.max = gas if self.max is None else max(self.max, gas)
+        if len(self.first) < self.window:
+            self.first.append(gas)
+        self.last.append(gas)
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    @property
+    def first_window_mean(self):
+        return sum(self.first) / len(self.first) if self.first else 0.0
+
+    @property
+    def last_window_mean(self):
+        return sum(self.last) / len(self.last) if self.last else 0.0
+
+    @property
+    def drift(self):
+        return self.last_window_mean - self.first_window_mean
+
+
+class LoadResult:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.seconds = 0.0
+        self.gas = GasStats(window)
+        # (destination chain id, adapters) => GasStats
+        self.configurations = {}
+        self.window = window
+        # least squares over (envelope nonce, gas used)
+        self._sums = [0, 0, 0, 0]
+
+    def add(self, envelope_nonce, destination_chain_id, adapters, gas):
+        self.gas.add(gas)
+        key = (destination_chain_id, adapters)
+        if key not in self.configurations:
+            self.configurations[key] = GasStats(self.window)
+        self.configurations[key].add(gas)
+        sums = self._sums
+        sums[0] += envelope_nonce
+        sums[1] += gas
+        sums[2] += envelope_nonce * gas
+        sums[3] += envelope_nonce * envelope_nonce
+
+    @property
+    def calls(self):
+        return self.gas.calls
+
+    @property
+    def transactions_per_second(self):
+        return self.calls / self.seconds if self.seconds else 0.0
+
+    @property
+    def gas_slope(self):
+        """Gas per call change per envelope, least squares over the envelope nonce."""
+        n = self.calls
+        sum_x, sum_y, sum_xy, sum_xx = self._sums
+        denominator = n * sum_xx - sum_x * sum_x
+        return (n * sum_xy - sum_x * sum_y) / denominator if n > 1 and denominator else 0.0
+
+    def write_summary(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_FIELDS)
+            for (destination_chain_id, adapters), stats in sorted(self.configurations.items()):
+                writer.writerow(
+                    [
+                        destination_chain_id,
+                        adapters,
+                        stats.calls,
+                        f"{stats.mean:.1f}",
+                        stats.min,
+                        stats.max,
+                        f"{stats.first_window_mean:.1f}",
+                        f"{stats.last_window_mean:.1f}",
+                        f"{stats.drift:.1f}",
+                    ]
+                )
+
+    def __repr__(self):
+        return (
+            f"LoadResult({self.calls} calls, {self.seconds:.1f}s, {self.transactions_per_second:,.1f} tx/s, "
+            f"mean gas {self.gas.mean:,.0f} (min {self.gas.min}, max {self.gas.max}), "
+            f"drift {self.gas_slope * 1000:+.2f} gas / 1k envelopes, {len(self.configurations)} configurations)"
+        )
+
+
+################
+##### Load #####
+################
+
+
+class ForwardLoad:
+    def __init__(self, cross_chain_controller, senders, destinations):
+        """`destinations`: list of (destination chain id, number of adapters enabled for it)."""
+        self.cross_chain_controller = cross_chain_controller
+        self.senders = senders
+        self.destinations = destinations
+
+    @classmethod
+    def setup(
+        cls,
+        cross_chain_controller,
+        owner,
+        adapter_container,
+        account_pool,
+        senders=10,
+        destination_chain_ids=range(20_000, 20_004),
+        adapters_per_destination=1,
+        chunk_size=100,
+    ):
+        """
+        Approve the first `senders` accounts of `account_pool` and enable forwarder adapters for every
+        destination.
+        `adapters_per_destination` is a number, or a list cycled over the destinations.
+        """
+        if isinstance(adapters_per_destination, int):
+            adapters_per_destination = [adapters_per_destination]
+        destination_chain_ids = list(destination_chain_ids)
+        destinations = [
+            (chain_id, adapters_per_destination[i % len(adapters_per_destination)])
+            for i, chain_id in enumerate(destination_chain_ids)
+        ]
+
+        pipeline = TxPipeline()
+        adapters = [
+            pipeline.deploy(adapter_container, sender=owner) for _ in range(max(count for _, count in destinations))
+        ]
+        pipeline.flush()
+        adapter_configs = [
+            # the destination adapter is only passed along, any non zero address will do
+            (adapters[i].address, adapters[i].address, chain_id)
+            for chain_id, count in destinations
+            for i in range(count)
+        ]
+        sender_accounts = account_pool.accounts(senders)
+        for start in range(0, len(adapter_configs), chunk_size):
+            pipeline.transact(
+                cross_chain_controller, "enableBridgeAdapters", adapter_configs[start : start + chunk_size], sender=owner
+            )
+        for start in range(0, senders, chunk_size):
+            pipeline.transact(
+                cross_chain_controller, "approveSenders", sender_accounts[start : start + chunk_size], sender=owner
+            )
+        pipeline.flush()
+        return cls(cross_chain_controller, sender_accounts, destinations)
+
+    def run(self, envelopes, message_size=128, destination=None, gas_limit=200_000, batch_size=200, path=None, window=DEFAULT_WINDOW):
+        """
+        Send `envelopes` envelopes, `batch_size` transactions per pipeline flush.
+        With `path`, every call is written to it as a CSV row.
+        """
+        destination = destination or self.cross_chain_controller.address
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        result = LoadResult(window)
+        first_nonce = self.cross_chain_controller.getCurrentEnvelopeNonce()
+
+        f = None
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            f = open(path, "w", newline="")
+            writer = csv.writer(f)
+            writer.writerow(CALL_FIELDS)
+        try:
+            for batch, start in enumerate(range(0, envelopes, batch_size)):
+                pipeline = TxPipeline()
+                calls = []
+                for i in range(start, min(start + batch_size, envelopes)):
+                    sender = self.senders[i % len(self.senders)]
+                    destination_chain_id, adapters = self.destinations[i % len(self.destinations)]
+                    pipeline.transact(
+                        self.cross_chain_controller,
+                        "forwardMessage",
+                        destination_chain_id,
+                        destination,
+                        gas_limit,
+                        message,
+                        sender=sender,
+                    )
+                    calls.append((first_nonce + i, sender, destination_chain_id, adapters))
+
+                batch_start = time.perf_counter()
+                receipts = pipeline.flush()
+                result.seconds += time.perf_counter() - batch_start
+
+                # envelopes get their nonces in the order the pipeline is mined, which is queue order
+                for (envelope_nonce, sender, destination_chain_id, adapters), receipt in zip(calls, receipts):
+                    result.add(envelope_nonce, destination_chain_id, adapters, receipt.gasUsed)
+                    if f is not None:
+                        writer.writerow(
+                            [
+                                envelope_nonce,
+                                sender.address,
+                                destination_chain_id,
+                                adapters,
+                                message_size,
+                                receipt.gasUsed,
+                                receipt.blockNumber,
+                                batch,
+                            ]
+                        )
+        finally:
+            if f is not None:
+                f.close()
+        return result
@@ -0,0 +1,266 @@
+"""
+Zero-copy decoding of `TransactionForwardingAttempted` logs
+
+Purposes:
+- Decodes forwarding logs straight from the raw log data: every field, including the
+  envelope nested in `encodedTransaction` and its message, is read through `memoryview`
+  slices, nothing is copied or ABI-decoded generically
+- Archives raw logs in a compact binary file and iterates over it through a memory map,
+  so archives of hundreds of thousands of events are processed with bounded memory
+
+    event TransactionForwardingAttempted(
+        bytes32 transactionId, bytes32 indexed envelopeId, bytes encodedTransaction,
+        uint256 destinationChainId, address indexed bridgeAdapter, address destinationBridgeAdapter,
+        bool indexed adapterSuccessful, bytes returnData
+    )
+
+Views returned by this module point into the log data (or the archive memory map):
+they are only valid as long as it is, and an archive can't be closed while views into
+it are still referenced. Use `bytes(view)` / `ForwardedTransaction.envelope()` to keep
+something around.
+
+Archive layout (big endian):
+    header:  magic (8 bytes) | version (uint16)
+    records: block number (uint64) | log index (uint32) | topic count (uint8) | data length (uint32)
+             | topics (32 bytes each) | data
+
+Example:
+with LogArchive.create("build/forwarding.logs") as archive:
+    for log in iter_logs(cross_chain_controller.address, 0, chain.height):
+        archive.append(log)
+for block_number, log_index, topics, data in iter_archive("build/forwarding.logs"):
+    forwarded = decode(topics, data)
+    forwarded.transaction_nonce, forwarded.envelope_nonce, bytes(forwarded.message)
+
+"""
+
+import mmap
+import os
+import struct
+
+from eth_hash.auto import keccak
+
+from encoding_utils import to_bytes
+
+WORD = 32
+
+TRANSACTION_FORWARDING_ATTEMPTED = keccak(
+    b"TransactionForwardingAttempted(bytes32,bytes32,bytes,uint256,address,address,bool,bytes)"
+)
+
+MAGIC = b"AAVELOGS"
+VERSION = 1
+HEADER = struct.Struct(">8sH")
+RECORD_HEADER = struct.Struct(">QIBI")
+
+
+##################
+##### Decode #####
+##################
+
+
+def _uint(view, offset):
+    if offset + WORD > len(view):
+        raise ValueError("log data is too short")
+    return int.from_bytes(view[offset : offset + WORD], "big")
+
+
+def _address(view, offset):
+    """20 byte view of the address word at `offset`."""
+    if _uint(view, offset) >> 160:
+        raise ValueError(f"invalid address word at {offset:#x}")
+    return view[offset + 12 : offset + WORD]
+
+
+def _bytes(view, offset):
+    """View of the `bytes` whose length word is at `offset`."""
+    length = _uint(view, offset)
+    if offset + WORD + length > len(view):
+        raise ValueError("bytes member runs past the end of the log data")
+    return view[offset + WORD : offset + WORD + length]
+
+
+class ForwardedTransaction:
+    """
+    Fields of a `TransactionForwardingAttempted` log and of the transaction / envelope it carries.
+    bytes32, address and bytes fields are memoryviews, numbers are ints.
+    """
+
+    __slots__ = (
+        "transaction_id",
+        "envelope_id",
+        "destination_chain_id",
+        "bridge_adapter",
+        "destination_bridge_adapter",
+        "adapter_successful",
+        "return_data",
+        "encoded_transaction",
+        "transaction_nonce",
+        "encoded_envelope",
+        "envelope_nonce",
+        "origin",
+        "destination",
+        "origin_chain_id",
+        "envelope_destination_chain_id",
+        "message",
+    )
+
+    def envelope(self):
+        """`encoding_utils.Envelope` copy of the forwarded envelope."""
+        from encoding_utils import Envelope
+
+        return Envelope(
+            self.envelope_nonce,
+            bytes(self.origin),
+            bytes(self.destination),
+            self.origin_chain_id,
+            self.envelope_destination_chain_id,
+            bytes(self.message),
+        )
+
+    def __repr__(self):
+        return (
+            f"ForwardedTransaction(transactionId=0x{self.transaction_id.hex()}, nonce={self.transaction_nonce}, "
+            f"envelopeNonce={self.envelope_nonce}, destinationChainId={self.destination_chain_id}, "
+            f"adapterSuccessful={self.adapter_successful}, message={len(self.message)} bytes)"
+        )
+
+
+def decode(topics, data):
+    """
+    Decode one `TransactionForwardingAttempted` log from its topics and data (bytes-like).
+    Raises ValueError if it is not one or if the encoding is invalid.
+    """
+    if len(topics) != 4 or bytes(topics[0]) != TRANSACTION_FORWARDING_ATTEMPTED:
+        raise ValueError("not a TransactionForwardingAttempted log")
+    view = data if isinstance(data, memoryview) else memoryview(data)
+
+    forwarded = ForwardedTransaction()
+    forwarded.envelope_id = memoryview(topics[1])
+    forwarded.bridge_adapter = memoryview(topics[2])[12:]
+    forwarded.adapter_successful = bytes(topics[3]) != bytes(WORD)
+
+    # transactionId | encodedTransaction offset | destinationChainId | destinationBridgeAdapter | returnData offset
+    forwarded.transaction_id = view[0:WORD]
+    forwarded.encoded_transaction = _bytes(view, _uint(view, WORD))
+    forwarded.destination_chain_id = _uint(view, 2 * WORD)
+    forwarded.destination_bridge_adapter = _address(view, 3 * WORD)
+    forwarded.return_data = _bytes(view, _uint(view, 4 * WORD))
+
+    # abi.encode(Transaction): tuple offset | nonce | encodedEnvelope offset | encodedEnvelope
+    transaction = forwarded.encoded_transaction
+    base = _uint(transaction, 0)
+    forwarded.transaction_nonce = _uint(transaction, base)
+    forwarded.encoded_envelope = _bytes(transaction, base + _uint(transaction, base + WORD))
+
+    # abi.encode(Envelope): tuple offset | nonce | origin | destination | originChainId
+    #                       | destinationChainId | message offset | message
+    envelope = forwarded.encoded_envelope
+    base = _uint(envelope, 0)
+    forwarded.envelope_nonce = _uint(envelope, base)
+    forwarded.origin = _address(envelope, base + WORD)
+    forwarded.destination = _address(envelope, base + 2 * WORD)
+    forwarded.origin_chain_id = _uint(envelope, base + 3 * WORD)
+    forwarded.envelope_destination_chain_id = _uint(envelope, base + 4 * WORD)
+    forwarded.message = _bytes(envelope, base + _uint(envelope, base + 5 * WORD))
+    return forwarded
+
+
+def decode_rpc_log(log):
+    """Decode a log as returned by `eth_getLogs` / in `tx.logs` (hex data, hex or HexBytes topics)."""
+    data = log["data"]
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:])
+    return decode([to_bytes(t) for t in log["topics"]], data)
+
+
+####################
+##### Sources ######
+####################
+
+
+def iter_logs(address, from_block, to_block, step=2000):
+    """
+    Raw `TransactionForwardingAttempted` logs of `address`, fetched `step` blocks at a time
+    so a long range never has to be held in memory at once.
+    """
+    from brownie import web3
+
+    for start in range(from_block, to_block + 1, step):
+        yield from web3.eth.get_logs(
+            {
+                "address": address,
+                "fromBlock": start,
+                "toBlock": min(start + step - 1, to_block),
+                "topics": ["0x" + TRANSACTION_FORWARDING_ATTEMPTED.hex()],
+            }
+        )
+
+
+class LogArchive:
+    """Append-only writer for raw log archives."""
+
+    def __init__(self, f):
+        self._f = f
+
+    @classmethod
+    def create(cls, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        f = open(path, "wb")
+        f.write(HEADER.pack(MAGIC, VERSION))
+        return cls(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def append(self, log):
+        """Append a log as returned by `eth_getLogs` / in `tx.logs` (hex or bytes-like fields)."""
+        data = to_bytes(log["data"])
+        topics = [to_bytes(t) for t in log["topics"]]
+        self._f.write(RECORD_HEADER.pack(log["blockNumber"], log["logIndex"], len(topics), len(data)))
+        self._f.write(b"".join(topics))
+        self._f.write(data)
+
+
+def iter_archive(path):
+    """
+    Yield (block number, log index, topics, data) for every archived log.
+    Topics and data are views into the memory-mapped archive.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= HEADER.size:
+            return
+        archive = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(archive)
+    try:
+        magic, version = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a log archive (version {VERSION})")
+        offset = HEADER.size
+        while offset < len(view):
+            block_number, log_index, topic_count, data_length = RECORD_HEADER.unpack_from(view, offset)
+            offset += RECORD_HEADER.size
+            topics = [view[offset + i * WORD : offset + (i + 1) * WORD] for i in range(topic_count)]
+            offset += topic_count * WORD
+            yield block_number, log_index, topics, view[offset : offset + data_length]
+            offset += data_length
+    finally:
+        view.release()
+        try:
+            archive.close()
+        except BufferError:
+            # the caller still holds views into the archive, the map is closed once they are gone
+            pass
+
+
+def iter_forwarded(path):
+    """Decoded `ForwardedTransaction`s of an archive, other events are skipped."""
+    for _, _, topics, data in iter_archive(path):
+        if len(topics) == 4 and topics[0] == TRANSACTION_FORWARDING_ATTEMPTED:
+            yield decode(topics, data)
@@ -0,0 +1,292 @@
+"""
+Batch envelope / transaction id generation
+
+Purposes:
+- Computes envelope and transaction ids for large numbers of envelopes ahead of time,
+  e.g. to plan replay and load scenarios
+- Takes columnar inputs (one sequence or iterable per Envelope member, or a single value
+  used for every row) and spreads the encoding + keccak work over a process pool in chunks
+- Returns the ids as contiguous bytes32 arrays, or streams them to a binary file that
+  can be memory-mapped for later lookups
+
+The encoding rules are the ones of `encoding_utils` (mirror of `libs/EncodingUtils.sol`).
+Unless given, the transaction nonce of a row is its envelope nonce, which is what
+`forwardMessage()` produces on a fresh CrossChainController.
+
+File layout (big endian):
+    header:           magic (8 bytes) | version (uint16) | count (uint64)
+    envelope ids:     `count` x 32 bytes
+    transaction ids:  `count` x 32 bytes
+
+Example:
+batch = generate(nonces=range(1_000_000), origins=carol.address, destinations=destination.address,
+                 origin_chain_ids=1, destination_chain_ids=137, messages=b"test message")
+batch.envelope_id(42)
+write("build/ids.bin", ...same arguments...)
+IdFile("build/ids.bin").index_of_envelope(batch.envelope_id(42))  # 42
+
+"""
+
+import mmap
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_hash.auto import keccak
+
+from encoding_utils import envelope_bytes, transaction_bytes
+
+ID_SIZE = 32
+
+MAGIC = b"AAVEIDS\x00"
+VERSION = 1
+HEADER = struct.Struct(">8sHQ")
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+COLUMNS = ("nonces", "origins", "destinations", "origin_chain_ids", "destination_chain_ids", "messages")
+
+
+###################
+##### Columns #####
+###################
+
+
+def _is_column(value):
+    # bytes / str values are a single message / address, not a column; generators are columns too
+    return not isinstance(value, (bytes, bytearray, str, int)) and hasattr(value, "__iter__")
+
+
+def _row_count(columns):
+    lengths = {len(value) for value in columns.values() if _is_column(value)}
+    if len(lengths) > 1:
+        raise ValueError(f"columns have different lengths: {sorted(lengths)}")
+    if not lengths:
+        raise ValueError("at least one column must be a sequence")
+    return lengths.pop()
+
+
+def _slice(value, start, stop):
+    """Rows [start, stop) of a column, a single value stays as it is."""
+    if _is_column(value):
+        return value[start:stop]
+    return value
+
+
+def _chunks(columns, count, chunk_size):
+    for start in range(0, count, chunk_size):
+        stop = min(start + chunk_size, count)
+        yield stop - start, {name: _slice(value, start, stop) for name, value in columns.items()}
+
+
+def _hash_chunk(task):
+    """Worker: ids of one chunk, as (envelope ids, transaction ids) contiguous bytes."""
+    rows, columns = task
+    values = []
+    for name in COLUMNS + ("transaction_nonces",):
+        value = columns[name]
+        if value is None:
+            value = columns["nonces"]
+        values.append(value if _is_column(value) else [value] * rows)
+
+    envelope_ids = bytearray(rows * ID_SIZE)
+    transaction_ids = bytearray(rows * ID_SIZE)
+    for i, (nonce, origin, destination, origin_chain_id, destination_chain_id, message, tx_nonce) in enumerate(
+        zip(*values)
+    ):
+        encoded_envelope = envelope_bytes(
+            nonce, origin, destination, origin_chain_id, destination_chain_id, message
+        )
+        offset = i * ID_SIZE
+        envelope_ids[offset : offset + ID_SIZE] = keccak(encoded_envelope)
+        transaction_ids[offset : offset + ID_SIZE] = keccak(transaction_bytes(tx_nonce, encoded_envelope))
+    return bytes(envelope_ids), bytes(transaction_ids)
+
+
+def _map_chunks(columns, chunk_size, workers):
+    """Yield (envelope ids, transaction ids) per chunk, in row order."""
+    count = _row_count(columns)
+    tasks = _chunks(columns, count, chunk_size)
+    if workers == 1:
+        yield from map(_hash_chunk, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Executor.map() would submit every chunk up front, keep a bounded window instead
+        # so memory stays proportional to the chunk size
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.submit(_hash_chunk, task))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def _address(value):
+    return str(getattr(value, "address", value))
+
+
+def _columns(nonces, origins, destinations, origin_chain_ids, destination_chain_ids, messages, transaction_nonces):
+    columns = dict(zip(COLUMNS, (nonces, origins, destinations, origin_chain_ids, destination_chain_ids, messages)))
+    # ranges / generators are sent to the workers as lists
+    for name, value in columns.items():
+        if _is_column(value) and not isinstance(value, (list, tuple)):
+            columns[name] = list(value)
+    # accounts and contracts don't pickle, the workers only get addresses
+    for name in ("origins", "destinations"):
+        value = columns[name]
+        if _is_column(value):
+            columns[name] = [_address(v) for v in value]
+        else:
+            columns[name] = _address(value)
+    if transaction_nonces is not None and not isinstance(transaction_nonces, (list, tuple, int)):
+        transaction_nonces = list(transaction_nonces)
+    columns["transaction_nonces"] = transaction_nonces
+    return columns
+
+
+#################
+##### Batch #####
+#################
+
+
+class IdBatch:
+    """Envelope and transaction ids of a batch, as two contiguous bytes32 arrays."""
+
+    def __init__(self, envelope_ids, transaction_ids):
+        self.envelope_ids = envelope_ids
+        self.transaction_ids = transaction_ids
+
+    def __len__(self):
+        return len(self.envelope_ids) // ID_SIZE
+
+    def envelope_id(self, index):
+        return self.envelope_ids[index * ID_SIZE : (index + 1) * ID_SIZE]
+
+    def transaction_id(self, index):
+        return self.transaction_ids[index * ID_SIZE : (index + 1) * ID_SIZE]
+
+
+def generate(
+    nonces,
+    origins,
+    destinations,
+    origin_chain_ids,
+    destination_chain_ids,
+    messages,
+    transaction_nonces=None,
+    workers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Ids of every row of the columns, a column given as a single value is used for every row.
+    `workers` is the size of the process pool (default: one per CPU, 1 runs in this process).
+    """
+    columns = _columns(
+        nonces, origins, destinations, origin_chain_ids, destination_chain_ids, messages, transaction_nonces
+    )
+    envelope_ids = bytearray()
+    transaction_ids = bytearray()
+    for chunk_envelope_ids, chunk_transaction_ids in _map_chunks(columns, chunk_size, workers or os.cpu_count()):
+        envelope_ids += chunk_envelope_ids
+        transaction_ids += chunk_transaction_ids
+    return IdBatch(bytes(envelope_ids), bytes(transaction_ids))
+
+
+def write(
+    path,
+    nonces,
+    origins,
+    destinations,
+    origin_chain_ids,
+    destination_chain_ids,
+    messages,
+    transaction_nonces=None,
+    workers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Same as `generate()` but every chunk is written to `path` as soon as it is hashed,
+    so memory use is bounded by the chunk size. Returns the number of records written.
+    """
+    columns = _columns(
+        nonces, origins, destinations, origin_chain_ids, destination_chain_ids, messages, transaction_nonces
+    )
+    count = _row_count(columns)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count))
+        f.truncate(HEADER.size + 2 * count * ID_SIZE)
+        envelope_offset = HEADER.size
+        transaction_offset = HEADER.size + count * ID_SIZE
+        for chunk_envelope_ids, chunk_transaction_ids in _map_chunks(columns, chunk_size, workers or os.cpu_count()):
+            f.seek(envelope_offset)
+            f.write(chunk_envelope_ids)
+            f.seek(transaction_offset)
+            f.write(chunk_transaction_ids)
+            envelope_offset += len(chunk_envelope_ids)
+            transaction_offset += len(chunk_transaction_ids)
+    # Only expose complete files to other (possibly parallel) runs
+    os.replace(tmp_path, path)
+    return count
+
+
+################
+##### File #####
+################
+
+
+class IdFile:
+    """Read-only, memory-mapped view over a file written by `write()`."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an id file (version {VERSION})")
+        if len(self._map) != HEADER.size + 2 * count * ID_SIZE:
+            raise ValueError(f"{path} is truncated")
+        self.count = count
+        self._transactions = HEADER.size + count * ID_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def _offset(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(f"id index {index} out of range (count {self.count})")
+        return index * ID_SIZE
+
+    def envelope_id(self, index):
+        offset = HEADER.size + self._offset(index)
+        return self._map[offset : offset + ID_SIZE]
+
+    def transaction_id(self, index):
+        offset = self._transactions + self._offset(index)
+        return self._map[offset : offset + ID_SIZE]
+
+    def _index_of(self, id, start):
+        id = bytes(id)
+        end = start + self.count * ID_SIZE
+        position = self._map.find(id, start, end)
+        while position != -1:
+            # ids are only matched on 32 byte boundaries
+            if (position - start) % ID_SIZE == 0:
+                return (position - start) // ID_SIZE
+            position = self._map.find(id, position + 1, end)
+        return None
+
+    def index_of_envelope(self, envelope_id):
+        """Row of `envelope_id`, or None. Scans the file (no index is kept)."""
+        return self._index_of(envelope_id, HEADER.size)
+
+    def index_of_transaction(self, transaction_id):
+        """Row of `transaction_id`, or None. Scans the file (no index is kept)."""
+        return self._index_of(transaction_id, self._transactions)
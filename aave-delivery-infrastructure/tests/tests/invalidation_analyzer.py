@@ -0,0 +1,231 @@
+"""
+Validity timestamp invalidation analyzer
+
+Purposes:
+- `updateMessagesValidityTimestamp()` (and `solveEmergency()`) silently stops the transactions first
+  bridged at or before the new validity timestamp of their origin chain from accruing confirmations:
+  a partially confirmed transaction is stranded, and its envelope too unless another transaction
+  of it (a retry) was first bridged after the timestamp
+- Extends `envelope_index.EnvelopeIndex` with the first receipt time (`firstBridgedAt`, the block
+  timestamp of the first `TransactionReceived`) of every transaction, kept in an SQLite index sorted
+  by (destination chain, origin chain, firstBridgedAt), and with the current validity timestamps
+  (`NewInvalidation`)
+- Given a proposed validity timestamp per origin chain, lists exactly the in-flight transactions
+  (quorum not reached) and the envelopes it would strand. Each proposal is one range scan of the
+  sorted index, (current validity timestamp, proposed], not a rescan of the receipt history
+
+Stranded:
+    transaction:  current validity < firstBridgedAt <= proposed, envelope still RECEIVING
+    envelope:     all of its transactions received on the chain are stranded (or were before)
+
+Example:
+index = InvalidationIndex("build/envelopes.sqlite")
+index.add_source(137, polygon.web3, polygon_controller.address)
+index.sync()
+invalidations = index.analyze(137, {1: 1690000000, 43114: 1690000000})
+for invalidation in invalidations.values():
+    print(invalidation)  # Invalidation(origin 1 on 137, 1689000000 -> 1690000000: 3 transactions, 2 envelopes stranded)
+write_csv("reports/invalidation.csv", invalidations.values())
+
+"""
+
+import csv
+import os
+
+from eth_hash.auto import keccak
+
+from encoding_utils import to_bytes, word_at
+from envelope_index import RECEIVING, SCHEMA, TOPICS, TRANSACTION_RECEIVED, EnvelopeIndex
+
+NEW_INVALIDATION = keccak(b"NewInvalidation(uint256,uint256)")
+FIELDS = ("chain_id", "origin_chain_id", "current", "proposed", "transaction_id", "envelope_id", "first_bridged_at", "confirmations", "envelope_stranded")
+
+INVALIDATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS first_bridged (
+    chain_id INTEGER NOT NULL,
+    transaction_id BLOB NOT NULL,
+    envelope_id BLOB NOT NULL,
+    origin_chain_id INTEGER NOT NULL,
+    first_bridged_at INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, transaction_id)
+);
+CREATE INDEX IF NOT EXISTS first_bridged_by_time ON first_bridged (chain_id, origin_chain_id, first_bridged_at);
+CREATE INDEX IF NOT EXISTS first_bridged_by_envelope ON first_bridged (envelope_id, chain_id, first_bridged_at);
+CREATE TABLE IF NOT EXISTS validity_timestamps (
+    chain_id INTEGER NOT NULL,
+    origin_chain_id INTEGER NOT NULL,
+    validity_timestamp INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, origin_chain_id)
+);
+"""
+
+STRANDED_QUERY = """
+    SELECT first_bridged.transaction_id, first_bridged.envelope_id, first_bridged.first_bridged_at,
+           transactions.confirmations
+    FROM first_bridged
+    JOIN envelopes ON envelopes.envelope_id = first_bridged.envelope_id
+    LEFT JOIN transactions ON transactions.transaction_id = first_bridged.transaction_id
+    WHERE first_bridged.chain_id = ? AND first_bridged.origin_chain_id = ?
+      AND first_bridged.first_bridged_at > ? AND first_bridged.first_bridged_at <= ?
+      AND envelopes.state = ?
+    ORDER BY first_bridged.first_bridged_at
+"""
+
+SURVIVOR_QUERY = """
+    SELECT 1 FROM first_bridged WHERE envelope_id = ? AND chain_id = ? AND first_bridged_at > ? LIMIT 1
+"""
+
+
+class StrandedTransaction:
+    __slots__ = ("transaction_id", "envelope_id", "first_bridged_at", "confirmations")
+
+    def __init__(self, transaction_id, envelope_id, first_bridged_at, confirmations):
+        self.transaction_id = transaction_id
+        self.envelope_id = envelope_id
+        self.first_bridged_at = first_bridged_at
+        self.confirmations = confirmations
+
+    def __repr__(self):
+        return (
+            f"StrandedTransaction(0x{self.transaction_id.hex()}, envelope 0x{self.envelope_id.hex()}, "
+            f"first bridged at {self.first_bridged_at}, {self.confirmations} confirmations)"
+        )
+
+
+class Invalidation:
+    def __init__(self, chain_id, origin_chain_id, current, proposed):
+        self.chain_id = chain_id
+        self.origin_chain_id = origin_chain_id
+        self.current = current
+        self.proposed = proposed
+        self.transactions = []  # StrandedTransaction, by firstBridgedAt
+        self.envelopes = []  # ids of the envelopes left without a transaction able to reach the quorum
+
+    def rows(self):
+        stranded = set(self.envelopes)
+        return [
+            [
+                self.chain_id,
+                self.origin_chain_id,
+                self.current,
+                self.proposed,
+                "0x" + transaction.transaction_id.hex(),
+                "0x" + transaction.envelope_id.hex(),
+                transaction.first_bridged_at,
+                transaction.confirmations,
+                int(transaction.envelope_id in stranded),
+            ]
+            for transaction in self.transactions
+        ]
+
+    def __repr__(self):
+        return (
+            f"Invalidation(origin {self.origin_chain_id} on {self.chain_id}, {self.current} -> {self.proposed}: "
+            f"{len(self.transactions)} transactions, {len(self.envelopes)} envelopes stranded)"
+        )
+
+
+class InvalidationIndex(EnvelopeIndex):
+    topics = TOPICS + [NEW_INVALIDATION]
+    schema = SCHEMA + INVALIDATION_SCHEMA
+
+    def __init__(self, path=":memory:"):
+        super().__init__(path)
+        self._block_timestamp = (None, None, None)  # (chain id, block, timestamp) of the last lookup
+
+    def _timestamp(self, chain_id, log):
+        """Block timestamp of a log: from the log when the node includes it, else from its block (one call per block)."""
+        if "blockTimestamp" in log:
+            timestamp = log["blockTimestamp"]
+            return int(timestamp, 16) if isinstance(timestamp, str) else timestamp
+        block = log["blockNumber"]
+        cached_chain_id, cached_block, timestamp = self._block_timestamp
+        if (cached_chain_id, cached_block) != (chain_id, block):
+            source = next(source for source in self.sources if source.chain_id == chain_id)
+            timestamp = source.web3.eth.get_block(block)["timestamp"]
+            self._block_timestamp = (chain_id, block, timestamp)
+        return timestamp
+
+    def apply(self, chain_id, log):
+        super().apply(chain_id, log)
+        topics = [to_bytes(topic) for topic in log["topics"]]
+        if topics[0] == TRANSACTION_RECEIVED:
+            # logs are applied in order: the first receipt seen is the one that set firstBridgedAt
+            self.db.execute(
+                "INSERT OR IGNORE INTO first_bridged (chain_id, transaction_id, envelope_id, origin_chain_id, "
+                "first_bridged_at, block) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    chain_id,
+                    bytes(to_bytes(log["data"])[:32]),
+                    topics[1],
+                    int.from_bytes(topics[2], "big"),
+                    self._timestamp(chain_id, log),
+                    log["blockNumber"],
+                ),
+            )
+        elif topics[0] == NEW_INVALIDATION:
+            self.db.execute(
+                """
+                INSERT INTO validity_timestamps (chain_id, origin_chain_id, validity_timestamp, block) VALUES (?, ?, ?, ?)
+                ON CONFLICT (chain_id, origin_chain_id) DO UPDATE SET
+                    validity_timestamp = excluded.validity_timestamp, block = excluded.block
+                """,
+                (chain_id, int.from_bytes(topics[1], "big"), word_at(to_bytes(log["data"]), 0), log["blockNumber"]),
+            )
+
+    #####  Queries  #####
+
+    def validity_timestamp(self, chain_id, origin_chain_id):
+        """Current validity timestamp of messages from `origin_chain_id` on `chain_id` (0 if never set)."""
+        row = self.db.execute(
+            "SELECT validity_timestamp FROM validity_timestamps WHERE chain_id = ? AND origin_chain_id = ?",
+            (chain_id, origin_chain_id),
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def first_bridged_at(self, chain_id, transaction_id):
+        row = self.db.execute(
+            "SELECT first_bridged_at FROM first_bridged WHERE chain_id = ? AND transaction_id = ?",
+            (chain_id, bytes(transaction_id)),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def query_plan(self):
+        """SQLite plan of the stranded transactions lookup, to check it is a search of the sorted index."""
+        return [
+            row["detail"] for row in self.db.execute("EXPLAIN QUERY PLAN " + STRANDED_QUERY, (0, 0, 0, 0, RECEIVING))
+        ]
+
+    def stranded(self, chain_id, origin_chain_id, proposed):
+        """`Invalidation` that a validity timestamp of `proposed` for `origin_chain_id` would cause on `chain_id`."""
+        current = self.validity_timestamp(chain_id, origin_chain_id)
+        if proposed <= current:
+            # same check as `_updateMessagesValidityTimestamp()`: INVALID_VALIDITY_TIMESTAMP
+            raise ValueError(f"validity timestamp {proposed} of chain {origin_chain_id} is not after {current}")
+        invalidation = Invalidation(chain_id, origin_chain_id, current, proposed)
+        rows = self.db.execute(STRANDED_QUERY, (chain_id, origin_chain_id, current, proposed, RECEIVING))
+        invalidation.transactions = [
+            StrandedTransaction(bytes(row[0]), bytes(row[1]), row[2], row[3] or 0) for row in rows
+        ]
+        for envelope_id in dict.fromkeys(transaction.envelope_id for transaction in invalidation.transactions):
+            if self.db.execute(SURVIVOR_QUERY, (envelope_id, chain_id, proposed)).fetchone() is None:
+                invalidation.envelopes.append(envelope_id)
+        return invalidation
+
+    def analyze(self, chain_id, proposals):
+        """{origin chain id: Invalidation} of `proposals` ({origin chain id: validity timestamp}) on `chain_id`."""
+        return {
+            origin_chain_id: self.stranded(chain_id, origin_chain_id, proposed)
+            for origin_chain_id, proposed in sorted(proposals.items())
+        }
+
+
+def write_csv(path, invalidations):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for invalidation in invalidations:
+            writer.writerows(invalidation.rows())
@@ -0,0 +1,368 @@
+"""
+Message size scaling of the forward / receive pipeline
+
+Purposes:
+- Sweeps the message size from 0 to 128 KiB and, at every step, forwards one message through
+  each route and receives one through it, recording:
+    gas             of `forwardMessage()` / of the stand-in's delivery call
+    execution gas   the gas minus the intrinsic gas of the transaction (base cost and calldata)
+    calldata size   of the transaction
+    log size        bytes logged by the transaction (data and topics, every contract)
+- Routes are the adapters of `endpoint_load`, measured both ways, plus two baselines without any
+  bridge, each measured in its own direction only:
+    forwarder       forward: `forwardMessage()` with one `Empty` adapter, the controller alone
+    direct          receive: `receiveCrossChainMessage()` called by an allowed account, the controller alone
+- Locates the super-linear regions: the intervals whose gas per byte exceeds the lowest one of
+  the series by more than a tolerance (memory expansion is quadratic past a few tens of KiB, and
+  the message is copied several times: envelope, transaction, adapter payload, logs)
+- Derives the practical maximum payload per adapter: the largest size forwarded and received,
+  the size at which the fitted gas reaches a block gas budget, and the payload limit of the
+  bridge protocol
+
+The message travels as `abi.encode(Transaction)` of `abi.encode(Envelope)`, so the payload of the
+bridges is the message plus `TRANSACTION_OVERHEAD` bytes (rounded up to a word).
+
+Example:
+scaling = MessageScaling(load, Empty)  # load = endpoint_load.EndpointLoad.setup(...)
+results = scaling.run(message_sizes=DEFAULT_SIZES)
+write_csv("reports/message_scaling.csv", results)
+superlinear_regions(results)  # {("layer_zero", "forward"): [(65536, 98304, 21.4)], ...}
+for route, limits in max_payloads(results).items():
+    print(route, limits)  # PayloadLimit(layer_zero: measured 131072, gas budget 150000, protocol 9600 -> 9600 bytes)
+
+"""
+
+import csv
+import os
+
+from brownie import accounts
+from brownie.exceptions import VirtualMachineError
+
+from adapter_scaling import BLOCK_GAS_LIMITS, crossing, fit_quadratic
+from endpoint_load import ETHEREUM
+
+KIB = 1024
+DEFAULT_SIZES = (0, 1 * KIB, 2 * KIB, 4 * KIB, 8 * KIB, 16 * KIB, 32 * KIB, 48 * KIB, 64 * KIB, 96 * KIB, 128 * KIB)
+FORWARDER = "forwarder"
+DIRECT = "direct"
+FORWARDER_CHAIN_ID = 70_000
+DIRECTIONS = ("forward", "receive")
+# the baselines have no bridge to go through the other way
+BASELINE_DIRECTIONS = {FORWARDER: ("forward",), DIRECT: ("receive",)}
+RECEIVE_GAS_LIMIT = 10_000_000
+INTRINSIC_GAS = 21_000
+# abi.encode(Transaction) of abi.encode(Envelope) around the message (padded to 32 bytes)
+TRANSACTION_OVERHEAD = 384
+# payload limits of the bridges, at the time of writing (None: no protocol limit)
+PROTOCOL_LIMITS = {
+    "layer_zero": 10_000,  # UltraLightNodeV2 default payload size limit
+    "ccip": 30_000,  # maxDataBytes of the OnRamp
+    "hyperlane": None,
+}
+FIELDS = (
+    "route",
+    "direction",
+    "message_size",
+    "payload_size",
+    "successful",
+    "gas",
+    "execution_gas",
+    "calldata_size",
+    "log_size",
+    "error",
+)
+
+
+def payload_size(message_size):
+    """Size of the encoded transaction carrying a message of `message_size` bytes."""
+    return TRANSACTION_OVERHEAD + -(-message_size // 32) * 32
+
+
+def max_message_size(payload_limit):
+    """Largest message whose encoded transaction fits in `payload_limit` bytes."""
+    return max(0, (payload_limit - TRANSACTION_OVERHEAD) // 32 * 32)
+
+
+def calldata_gas(data):
+    return sum(16 if byte else 4 for byte in data)
+
+
+def _bytes(value):
+    return bytes.fromhex(value[2:]) if isinstance(value, str) else bytes(value)
+
+
+def log_size(receipt):
+    """Bytes logged by a transaction: data and 32 bytes per topic, over every log."""
+    return sum(len(_bytes(log["data"])) + 32 * len(log["topics"]) for log in receipt.logs)
+
+
+###################
+##### Results #####
+###################
+
+
+class SizeMeasurement:
+    __slots__ = (
+        "route",
+        "direction",
+        "message_size",
+        "successful",
+        "gas",
+        "execution_gas",
+        "calldata_size",
+        "log_size",
+        "error",
+    )
+
+    def __init__(self, route, direction, message_size, successful=False, gas=None, execution_gas=None, calldata_size=None, log_size=None, error=None):
+        self.route = route
+        self.direction = direction
+        self.message_size = message_size
+        self.successful = successful
+        self.gas = gas
+        self.execution_gas = execution_gas
+        self.calldata_size = calldata_size
+        self.log_size = log_size
+        self.error = error
+
+    @classmethod
+    def from_receipt(cls, route, direction, message_size, receipt, successful):
+        calldata = _bytes(receipt.input)
+        return cls(
+            route,
+            direction,
+            message_size,
+            successful,
+            receipt.gas_used,
+            receipt.gas_used - INTRINSIC_GAS - calldata_gas(calldata),
+            len(calldata),
+            log_size(receipt),
+        )
+
+    @property
+    def key(self):
+        return (self.route, self.direction)
+
+    @property
+    def payload_size(self):
+        return payload_size(self.message_size)
+
+    def row(self):
+        return [
+            self.route,
+            self.direction,
+            self.message_size,
+            self.payload_size,
+            int(self.successful),
+            "" if self.gas is None else self.gas,
+            "" if self.execution_gas is None else self.execution_gas,
+            "" if self.calldata_size is None else self.calldata_size,
+            "" if self.log_size is None else self.log_size,
+            self.error or "",
+        ]
+
+    def __repr__(self):
+        if self.gas is None:
+            return f"SizeMeasurement({self.route} {self.direction}, {self.message_size} bytes: {self.error})"
+        return (
+            f"SizeMeasurement({self.route} {self.direction}, {self.message_size} bytes: gas {self.gas:,} "
+            f"(execution {self.execution_gas:,}), calldata {self.calldata_size:,} bytes, logs {self.log_size:,} bytes"
+            f"{'' if self.successful else ', failed'})"
+        )
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for measurement in results:
+            writer.writerow(measurement.row())
+
+
+#################
+##### Sweep #####
+#################
+
+
+class MessageScaling:
+    def __init__(self, load, empty_container, receive_gas_limit=RECEIVE_GAS_LIMIT):
+        """`load`: an `endpoint_load.EndpointLoad`, its routes are measured along the two baselines."""
+        self.load = load
+        self.empty_container = empty_container
+        self.receive_gas_limit = receive_gas_limit
+        self.forwarder_adapter = None
+        self.direct_adapter = None
+
+    @property
+    def owner(self):
+        return {"from": self.load.relayer}
+
+    def setup(self):
+        """Enable an `Empty` forwarder adapter and allow a receiver account, for the baselines."""
+        controller = self.load.cross_chain_controller
+        self.forwarder_adapter = self.empty_container.deploy(self.owner)
+        controller.enableBridgeAdapters(
+            [(self.forwarder_adapter, self.load.destination_adapter, FORWARDER_CHAIN_ID)], self.owner
+        )
+        self.direct_adapter = accounts.add()
+        self.load.relayer.transfer(self.direct_adapter, "10 ether")
+        controller.allowReceiverBridgeAdapters([(self.direct_adapter, [ETHEREUM])], self.owner)
+        return self
+
+    @property
+    def routes(self):
+        return [FORWARDER, DIRECT] + list(self.load.routes)
+
+    @staticmethod
+    def directions(route):
+        return BASELINE_DIRECTIONS.get(route, DIRECTIONS)
+
+    def forward(self, route, message_size):
+        controller = self.load.cross_chain_controller
+        if route == FORWARDER:
+            destination_chain_id = FORWARDER_CHAIN_ID
+            # the gas limit is only passed to the bridges
+            gas_limit = 0
+        else:
+            destination_chain_id = self.load.routes[route].destination_chain_id
+            gas_limit = self.receive_gas_limit
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        receipt = controller.forwardMessage(
+            destination_chain_id, self.load.portal, gas_limit, message, {"from": self.load.sender}
+        )
+        attempts = receipt.events["TransactionForwardingAttempted"]
+        successful = all(attempt["adapterSuccessful"] for attempt in attempts)
+        return SizeMeasurement.from_receipt(route, "forward", message_size, receipt, successful)
+
+    def receive(self, route, message_size):
+        transactions = self.load.inbound(route, 1, message_size)
+        if route == DIRECT:
+            receipt = self.load.cross_chain_controller.receiveCrossChainMessage(
+                transactions[0], ETHEREUM, {"from": self.direct_adapter}
+            )
+            events = receipt.events
+            successful = "EnvelopeDeliveryAttempted" in events and events["EnvelopeDeliveryAttempted"]["isDelivered"]
+        else:
+            receipt, delivered = self.load.deliver(route, transactions, self.receive_gas_limit)
+            successful = delivered == 1
+        return SizeMeasurement.from_receipt(route, "receive", message_size, receipt, successful)
+
+    def measure(self, route, direction, message_size):
+        """One measurement, a reverted or rejected transaction (e.g. over the block gas limit) recorded as failed."""
+        try:
+            if direction == "forward":
+                return self.forward(route, message_size)
+            return self.receive(route, message_size)
+        except (VirtualMachineError, ValueError) as error:
+            return SizeMeasurement(route, direction, message_size, error=str(error).splitlines()[0])
+
+    def run(self, message_sizes=DEFAULT_SIZES, routes=None):
+        """
+        Sweep every route, in each of its `directions()`. The first call of a direction writes nonces from zero, so one
+        call is made before the measured ones. A direction stops at its first failed size.
+        """
+        if self.forwarder_adapter is None:
+            self.setup()
+        results = []
+        for route in routes or self.routes:
+            for direction in self.directions(route):
+                self.measure(route, direction, 0)
+                for message_size in sorted(message_sizes):
+                    measurement = self.measure(route, direction, message_size)
+                    results.append(measurement)
+                    if not measurement.successful:
+                        break
+        return results
+
+
+####################
+##### Analysis #####
+####################
+
+
+def series(results, value="gas"):
+    """{(route, direction): [(message size, value)]} of the successful measurements."""
+    points = {}
+    for measurement in results:
+        if measurement.successful:
+            points.setdefault(measurement.key, []).append((measurement.message_size, getattr(measurement, value)))
+    return {key: sorted(values) for key, values in points.items()}
+
+
+def marginal_costs(points):
+    """[(size from, size to, gas per byte)] between consecutive sizes."""
+    return [
+        (size, next_size, (next_gas - gas) / (next_size - size))
+        for (size, gas), (next_size, next_gas) in zip(points, points[1:])
+        if next_size > size
+    ]
+
+
+def superlinear_regions(results, tolerance=0.1, value="execution_gas"):
+    """
+    {(route, direction): [(size from, size to, gas per byte)]} of the intervals costing more per byte
+    than the cheapest interval of the series by more than `tolerance`.
+    """
+    regions = {}
+    for key, points in series(results, value).items():
+        marginals = marginal_costs(points)
+        if not marginals:
+            continue
+        cheapest = min(max(gas_per_byte, 0.0) for _, _, gas_per_byte in marginals)
+        regions[key] = [
+            (size, next_size, gas_per_byte)
+            for size, next_size, gas_per_byte in marginals
+            if gas_per_byte > cheapest * (1 + tolerance)
+        ]
+    return regions
+
+
+def quadratic_crossover(coefficients):
+    """Message size from which the quadratic term of a + b*size + c*size^2 outweighs the linear one."""
+    _, b, c = coefficients
+    return b / c if c > 0 and b > 0 else None
+
+
+class PayloadLimit:
+    __slots__ = ("route", "measured", "gas_budget", "protocol")
+
+    def __init__(self, route, measured, gas_budget, protocol):
+        self.route = route
+        self.measured = measured  # largest size forwarded and received
+        self.gas_budget = gas_budget  # largest size whose fitted gas fits the budget, both ways
+        self.protocol = protocol  # largest message within the bridge's payload limit
+
+    @property
+    def practical(self):
+        limits = [limit for limit in (self.measured, self.gas_budget, self.protocol) if limit is not None]
+        return min(limits) if limits else None
+
+    def __repr__(self):
+        return (
+            f"PayloadLimit({self.route}: measured {self.measured}, gas budget {self.gas_budget}, "
+            f"protocol {self.protocol} -> {self.practical} bytes)"
+        )
+
+
+def max_payloads(results, gas_budget=min(BLOCK_GAS_LIMITS.values()), protocol_limits=PROTOCOL_LIMITS):
+    """{route: PayloadLimit} of every route measured in all of its directions (one for the baselines)."""
+    points = series(results)
+    limits = {}
+    for route in dict.fromkeys(measurement.route for measurement in results):
+        directions = [points.get((route, direction), []) for direction in MessageScaling.directions(route)]
+        if not all(directions):
+            limits[route] = PayloadLimit(route, None, None, None)
+            continue
+        measured = min(direction[-1][0] for direction in directions)
+        budget = []
+        for direction in directions:
+            if len({size for size, _ in direction}) < 2:
+                continue
+            size = crossing(fit_quadratic(direction, quantity="message sizes"), gas_budget)
+            if size is not None:
+                budget.append(size - 1)
+        protocol_limit = protocol_limits.get(route)
+        protocol = max_message_size(protocol_limit) if protocol_limit is not None else None
+        limits[route] = PayloadLimit(route, measured, min(budget) if budget else None, protocol)
+    return limits
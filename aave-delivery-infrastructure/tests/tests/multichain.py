@@ -0,0 +1,499 @@
+"""
+Local multi-chain simulator for CrossChainController
+
+Purposes:
+- Starts several local ganache chains, each with its own chain id, and deploys a
+  `CrossChainController` (or `CrossChainControllerWithEmergencyMode`) on every one of them
+- Wires every ordered pair of chains: `Empty` forwarder adapters on the origin, and
+  unlocked accounts standing in for the receiver adapters on the destination
+- A relayer picks up `TransactionForwardingAttempted` logs on the origins and calls
+  `receiveCrossChainMessage()` on the destinations from the matching adapter accounts
+- Reports end-to-end delivery latency (from `forwardMessage()` being sent to the
+  delivering confirmation being mined) and envelopes delivered per second
+
+Every chain runs its own `ganache` process (as in the Dockerfile, needs `npm install -g ganache`),
+or `LocalChain.attach()` can be used for nodes started elsewhere. Contracts are deployed from
+brownie's build folder, so `brownie compile` has to have run (the test suite does it).
+
+Topology, for every ordered pair of chains (origin, destination) and adapter k < adapters_per_route:
+    origin:       forwarder adapter `Empty[k]` -> destination bridge adapter `adapter account[k]`
+    destination:  `adapter account[k]` is an allowed receiver bridge adapter for the origin chain id,
+                  `required_confirmations` of them confirm an envelope
+Envelopes are sent to a `ReceiverPortalMock` on the destination chain.
+
+Example:
+with Simulator([1, 137, 43114], adapters_per_route=2, required_confirmations=2) as simulator:
+    report = simulator.run(envelopes=300, message_size=128)
+    print(report)  # DeliveryReport(300/300 delivered, ... envelopes/s, latency p50 ...)
+
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from eth_hash.auto import keccak
+from web3 import HTTPProvider, Web3
+
+import forwarding_logs
+from encoding_utils import Envelope, to_bytes
+
+BUILD_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../build/contracts")
+
+# same launch settings as brownie's development network (brownie-config.yaml)
+DEFAULT_HARDFORK = "istanbul"
+GANACHE_SETTINGS = [
+    "--miner.blockGasLimit", "30000000",
+    "--wallet.defaultBalance", "1000000",
+    "--chain.vmErrorsOnRPCResponse", "true",
+    "--logging.quiet",
+]
+DEFAULT_PORT = 8600
+GAS = 10_000_000
+
+ENVELOPE_DELIVERY_ATTEMPTED = keccak(
+    b"EnvelopeDeliveryAttempted(bytes32,(uint256,address,address,uint256,uint256,bytes),bool)"
+)
+
+# roles of the unlocked accounts of every chain
+OWNER = 0
+GUARDIAN = 1
+SENDERS = 2
+ADAPTERS = 10
+
+
+def load_artifact(name):
+    """ABI and bytecode of a contract from brownie's build folder."""
+    path = os.path.join(BUILD_PATH, f"{name}.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, run `brownie compile` first")
+    with open(path) as f:
+        data = json.load(f)
+    bytecode = data["bytecode"]
+    return data["abi"], bytecode if bytecode.startswith("0x") else "0x" + bytecode
+
+
+#################
+##### Chain #####
+#################
+
+
+class SimulationError(Exception):
+    pass
+
+
+class LocalChain:
+    """One local chain: a web3 connection, its unlocked accounts and (if started here) its node process."""
+
+    def __init__(self, web3, process=None, gas_price=0):
+        self.web3 = web3
+        self.process = process
+        # 0 unless blocks have a base fee (london)
+        self.gas_price = gas_price
+        self.chain_id = web3.eth.chain_id
+        self.accounts = web3.eth.accounts
+        self.contracts = {}
+
+    @classmethod
+    def start(cls, chain_id, port, accounts=20, hardfork=DEFAULT_HARDFORK, timeout=30):
+        """Start a ganache node with `chain_id` on `port`."""
+        executable = shutil.which("ganache")
+        if executable is None:
+            raise SimulationError("ganache not found, install it with `npm install -g ganache`")
+        process = subprocess.Popen(
+            [
+                executable,
+                "--server.port", str(port),
+                "--chain.chainId", str(chain_id),
+                "--chain.networkId", str(chain_id),
+                "--wallet.totalAccounts", str(accounts),
+                "--hardfork", hardfork,
+            ]
+            + GANACHE_SETTINGS,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        web3 = Web3(HTTPProvider(f"http://127.0.0.1:{port}", request_kwargs={"timeout": 60}))
+        deadline = time.monotonic() + timeout
+        while not web3.isConnected():
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise SimulationError(f"ganache for chain {chain_id} did not start on port {port}")
+            time.sleep(0.1)
+        return cls(web3, process, gas_price=0 if hardfork in ("istanbul", "berlin") else web3.eth.gas_price)
+
+    @classmethod
+    def attach(cls, url):
+        """Use an already running node, priced like `start` would: 0 unless its blocks have a base fee."""
+        web3 = Web3(HTTPProvider(url, request_kwargs={"timeout": 60}))
+        london = web3.eth.get_block("latest").get("baseFeePerGas") is not None
+        return cls(web3, gas_price=web3.eth.gas_price if london else 0)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def send(self, sender, to, data, gas=GAS):
+        """Submit a transaction without waiting for it to be mined, returns its hash."""
+        tx = {"from": sender, "data": data, "gas": gas, "gasPrice": self.gas_price}
+        if to is not None:
+            tx["to"] = to
+        return self.web3.eth.send_transaction(tx)
+
+    def wait(self, tx_hash, timeout=120):
+        receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        if receipt["status"] != 1:
+            raise SimulationError(f"transaction {tx_hash.hex()} reverted on chain {self.chain_id}")
+        return receipt
+
+    def deploy(self, name, *args, sender=None):
+        """Deploy a contract from brownie's build folder and wait for it."""
+        abi, bytecode = load_artifact(name)
+        factory = self.web3.eth.contract(abi=abi, bytecode=bytecode)
+        data = factory.constructor(*args).data_in_transaction
+        receipt = self.wait(self.send(sender or self.accounts[OWNER], None, data))
+        return self.web3.eth.contract(address=receipt["contractAddress"], abi=abi)
+
+    def call(self, contract, fn_name, *args, sender=None, wait=True):
+        """Send a contract call, by default waiting for its receipt."""
+        data = contract.encodeABI(fn_name=fn_name, args=args)
+        tx_hash = self.send(sender or self.accounts[OWNER], contract.address, data)
+        return self.wait(tx_hash) if wait else tx_hash
+
+    def impersonate(self, address, balance=10**21):
+        """Unlock an address nobody has the key of (e.g. an aliased L1 sender), funded for gas."""
+        self.web3.manager.request_blocking("evm_addAccount", [address, ""])
+        self.web3.manager.request_blocking("personal_unlockAccount", [address, "", 0])
+        self.web3.manager.request_blocking("evm_setAccountBalance", [address, hex(balance)])
+
+    def __repr__(self):
+        return f"LocalChain(chainId={self.chain_id}, {self.web3.provider.endpoint_uri})"
+
+
+###################
+##### Reports #####
+###################
+
+
+class DeliveryReport:
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.failed = 0
+        self.relayed = 0
+        self.seconds = 0.0
+        self.latencies = []
+
+    @property
+    def envelopes_per_second(self):
+        return self.delivered / self.seconds if self.seconds else 0.0
+
+    def latency(self, percentile):
+        """Delivery latency in seconds at `percentile` (0-100)."""
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def __repr__(self):
+        return (
+            f"DeliveryReport({self.delivered}/{self.sent} delivered, {self.failed} failed, "
+            f"{self.relayed} confirmations relayed, {self.seconds:.1f}s, {self.envelopes_per_second:,.1f} envelopes/s, "
+            f"latency p50 {self.latency(50) * 1000:.0f}ms p95 {self.latency(95) * 1000:.0f}ms "
+            f"max {self.latency(100) * 1000:.0f}ms)"
+        )
+
+
+###################
+##### Relayer #####
+###################
+
+
+def delivery_attempts(receipt, address):
+    """
+    (envelope id, isDelivered) of every `EnvelopeDeliveryAttempted` log of `address` in a receipt,
+    from web3 or straight from the JSON-RPC response.
+    """
+    attempts = []
+    for log in receipt["logs"]:
+        if log["address"].lower() != address.lower() or to_bytes(log["topics"][0]) != ENVELOPE_DELIVERY_ATTEMPTED:
+            continue
+        data = to_bytes(log["data"])
+        # envelopeId | envelope offset | isDelivered | envelope
+        attempts.append((bytes(data[0:32]), data[64:96] != bytes(32)))
+    return attempts
+
+
+class Relayer:
+    """
+    Follows `TransactionForwardingAttempted` logs on every chain of a simulator and relays each
+    forwarded transaction to its destination, from the account of the destination bridge adapter.
+    Confirmations are submitted back-to-back, receipts are collected once per `step()`.
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.from_block = {chain_id: chain.web3.eth.block_number + 1 for chain_id, chain in simulator.chains.items()}
+        self.in_flight = []
+
+    def poll(self):
+        """Relay the transactions forwarded since the last poll, returns how many were relayed."""
+        relayed = 0
+        for chain_id, chain in self.simulator.chains.items():
+            latest = chain.web3.eth.block_number
+            if latest < self.from_block[chain_id]:
+                continue
+            logs = chain.web3.eth.get_logs(
+                {
+                    "address": chain.contracts["cross_chain_controller"].address,
+                    "fromBlock": self.from_block[chain_id],
+                    "toBlock": latest,
+                    "topics": ["0x" + forwarding_logs.TRANSACTION_FORWARDING_ATTEMPTED.hex()],
+                }
+            )
+            self.from_block[chain_id] = latest + 1
+            for log in logs:
+                forwarded = forwarding_logs.decode_rpc_log(log)
+                if forwarded.adapter_successful:
+                    self.relay(chain_id, forwarded)
+                    relayed += 1
+        return relayed
+
+    def relay(self, origin_chain_id, forwarded):
+        destination = self.simulator.chains.get(forwarded.destination_chain_id)
+        if destination is None:
+            raise SimulationError(f"no chain with id {forwarded.destination_chain_id} to relay to")
+        controller = destination.contracts["cross_chain_controller"]
+        data = controller.encodeABI(
+            fn_name="receiveCrossChainMessage",
+            args=(bytes(forwarded.encoded_transaction), origin_chain_id),
+        )
+        adapter = Web3.toChecksumAddress(bytes(forwarded.destination_bridge_adapter))
+        self.in_flight.append((destination, destination.send(adapter, controller.address, data)))
+
+    def collect(self):
+        """Wait for the relayed confirmations, hand the delivery attempts to the simulator."""
+        in_flight, self.in_flight = self.in_flight, []
+        for destination, tx_hash in in_flight:
+            receipt = destination.wait(tx_hash)
+            now = time.perf_counter()
+            self.simulator.report.relayed += 1
+            address = destination.contracts["cross_chain_controller"].address
+            for envelope_id, delivered in delivery_attempts(receipt, address):
+                self.simulator.on_delivery_attempt(envelope_id, delivered, now)
+
+    def step(self):
+        relayed = self.poll()
+        self.collect()
+        return relayed
+
+
+#####################
+##### Simulator #####
+#####################
+
+
+class Simulator:
+    def __init__(
+        self,
+        chain_ids=(1, 137),
+        adapters_per_route=1,
+        required_confirmations=1,
+        emergency_mode=False,
+        senders=1,
+        base_port=DEFAULT_PORT,
+        chains=None,
+    ):
+        """
+        Start one chain per id (ports from `base_port`), or use already started `chains` (LocalChain).
+        """
+        if not 1 <= required_confirmations <= adapters_per_route:
+            raise ValueError("required_confirmations must be between 1 and adapters_per_route")
+        if not 1 <= senders <= ADAPTERS - SENDERS:
+            raise ValueError(f"senders must be between 1 and {ADAPTERS - SENDERS}")
+        if chains is None:
+            chains = []
+            try:
+                for i, chain_id in enumerate(chain_ids):
+                    chains.append(LocalChain.start(chain_id, base_port + i, accounts=ADAPTERS + adapters_per_route))
+            except Exception:
+                for chain in chains:
+                    chain.stop()
+                raise
+        self.chains = {chain.chain_id: chain for chain in chains}
+        if len(self.chains) < 2:
+            raise ValueError("at least two chains with different ids are needed")
+        self.adapters_per_route = adapters_per_route
+        self.required_confirmations = required_confirmations
+        self.emergency_mode = emergency_mode
+        self.senders = senders
+        self.envelope_nonces = {}
+        self.pending = {}
+        self.report = DeliveryReport()
+        try:
+            for chain in self.chains.values():
+                self._deploy(chain)
+        except Exception:
+            self.stop()
+            raise
+        self.relayer = Relayer(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        for chain in self.chains.values():
+            chain.stop()
+
+    def adapter_accounts(self, chain):
+        return chain.accounts[ADAPTERS : ADAPTERS + self.adapters_per_route]
+
+    def sender_accounts(self, chain):
+        return chain.accounts[SENDERS : SENDERS + self.senders]
+
+    def _deploy(self, chain):
+        others = [chain_id for chain_id in self.chains if chain_id != chain.chain_id]
+        owner = chain.accounts[OWNER]
+        contracts = chain.contracts
+        contracts["receiver_portal"] = chain.deploy("ReceiverPortalMock")
+        contracts["forwarder_adapters"] = [chain.deploy("Empty") for _ in range(self.adapters_per_route)]
+
+        confirmations = [(chain_id, self.required_confirmations) for chain_id in others]
+        receiver_adapters = [(adapter, others) for adapter in self.adapter_accounts(chain)]
+        forwarder_adapters = [
+            (forwarder.address, adapter, chain_id)
+            for chain_id in others
+            for forwarder, adapter in zip(contracts["forwarder_adapters"], self.adapter_accounts(self.chains[chain_id]))
+        ]
+        senders = self.sender_accounts(chain)
+        guardian = chain.accounts[GUARDIAN]
+
+        # initialized directly, the logic contracts don't lock their initializer
+        if self.emergency_mode:
+            contracts["cl_emergency_oracle"] = chain.deploy("CLEmergencyOracleMock")
+            oracle = contracts["cl_emergency_oracle"].address
+            controller = chain.deploy("CrossChainControllerWithEmergencyMode", oracle)
+            chain.call(
+                controller, "initialize",
+                owner, guardian, oracle, confirmations, receiver_adapters, forwarder_adapters, senders,
+            )
+        else:
+            controller = chain.deploy("CrossChainController")
+            chain.call(
+                controller, "initialize",
+                owner, guardian, confirmations, receiver_adapters, forwarder_adapters, senders,
+            )
+        contracts["cross_chain_controller"] = controller
+        self.envelope_nonces[chain.chain_id] = controller.functions.getCurrentEnvelopeNonce().call()
+
+    def send(self, origin_chain_id, destination_chain_id, message, sender_index=0):
+        """
+        Forward `message` from one chain to the `ReceiverPortalMock` of another, without waiting.
+        Returns the envelope id, computed locally from the nonce the envelope will get.
+        """
+        origin = self.chains[origin_chain_id]
+        sender = self.sender_accounts(origin)[sender_index]
+        destination = self.chains[destination_chain_id].contracts["receiver_portal"].address
+        controller = origin.contracts["cross_chain_controller"]
+        data = controller.encodeABI(
+            fn_name="forwardMessage", args=(destination_chain_id, destination, GAS // 10, message)
+        )
+
+        # transactions of the chain are mined in the order they are sent, so are the envelope nonces
+        nonce = self.envelope_nonces[origin_chain_id]
+        envelope_id = Envelope(nonce, sender, destination, origin_chain_id, destination_chain_id, message).get_id()
+        # registered before sending, a relayer running concurrently may deliver it right away
+        self.pending[envelope_id] = time.perf_counter()
+        try:
+            origin.send(sender, controller.address, data)
+        except Exception:
+            del self.pending[envelope_id]
+            raise
+        self.envelope_nonces[origin_chain_id] = nonce + 1
+        self.report.sent += 1
+        return envelope_id
+
+    def on_delivery_attempt(self, envelope_id, delivered, timestamp):
+        start = self.pending.pop(envelope_id, None)
+        if start is None:
+            return
+        if delivered:
+            self.report.delivered += 1
+            self.report.latencies.append(timestamp - start)
+        else:
+            self.report.failed += 1
+
+    def routes(self):
+        return [(origin, destination) for origin in self.chains for destination in self.chains if origin != destination]
+
+    def messages(self, envelopes, message_size=128, batch_size=50):
+        """Batches of (origin, destination, message, sender index), round robin over every route and sender."""
+        routes = self.routes()
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        for start in range(0, envelopes, batch_size):
+            yield [
+                (*routes[i % len(routes)], message, i // len(routes) % self.senders)
+                for i in range(start, min(start + batch_size, envelopes))
+            ]
+
+    def send_load(self, envelopes, message_size=128, batch_size=50):
+        """Send `envelopes` envelopes without relaying them (for relayers running next to the simulator)."""
+        for batch in self.messages(envelopes, message_size, batch_size):
+            for origin, destination, message, sender_index in batch:
+                self.send(origin, destination, message, sender_index)
+
+    def run(self, envelopes, message_size=128, batch_size=50, timeout=600):
+        """
+        Send `envelopes` envelopes round robin over every route (and sender), `batch_size` at a time,
+        relaying while sending. Returns the report once all of them are delivered (or failed).
+        """
+        deadline = time.monotonic() + timeout
+        start = time.perf_counter()
+        batches = self.messages(envelopes, message_size, batch_size)
+        sending = True
+        while sending or self.pending:
+            batch = next(batches, None)
+            sending = batch is not None
+            for origin, destination, message, sender_index in batch or ():
+                self.send(origin, destination, message, sender_index)
+            if not self.relayer.step() and not sending:
+                time.sleep(0.05)
+            if time.monotonic() > deadline:
+                raise SimulationError(f"{len(self.pending)} envelopes not delivered after {timeout}s")
+        self.report.seconds = time.perf_counter() - start
+        return self.report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--chains", default="1,137", help="comma separated chain ids")
+    parser.add_argument("--envelopes", type=int, default=200)
+    parser.add_argument("--message-size", type=int, default=128)
+    parser.add_argument("--adapters", type=int, default=1, help="adapters per route")
+    parser.add_argument("--confirmations", type=int, default=1)
+    parser.add_argument("--senders", type=int, default=1)
+    parser.add_argument("--emergency-mode", action="store_true")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    with Simulator(
+        [int(chain_id) for chain_id in args.chains.split(",")],
+        adapters_per_route=args.adapters,
+        required_confirmations=args.confirmations,
+        emergency_mode=args.emergency_mode,
+        senders=args.senders,
+        base_port=args.port,
+    ) as simulator:
+        print(simulator.run(args.envelopes, message_size=args.message_size))
@@ -0,0 +1,370 @@
+"""
+Local stand-ins for the native L2 bridges, to exercise the native bridge adapters
+
+Purposes:
+- Starts an Ethereum chain (chain id 1) and one chain per L2 route, with the chain id the
+  adapter expects (Arbitrum, Optimism, Base, Metis, Polygon)
+- Deploys on Ethereum the stand-in bridge entry points (`ArbInboxMock`, `CrossDomainMessengerMock`,
+  `FxRootMock`) and the origin side adapters, enabled as forwarder adapters of a CrossChainController,
+  and on every L2 a CrossChainController, the destination side adapter (trusting the Ethereum
+  controller), the L2 stand-in (`CrossDomainMessengerMock`, `FxChildMock`) and a `ReceiverPortalMock`
+- `BridgeRelayer` reads the outbound messages the stand-ins recorded on Ethereum and replays them
+  into the receive path of the paired adapter:
+    arbitrum             RetryableTicketCreated -> ArbAdapter.arbReceive(), from the aliased controller
+    optimism/base/metis  SentMessage            -> CrossDomainMessengerMock.relayMessage() -> ovmReceive()
+    polygon              StateSynced            -> FxChildMock.onStateReceive() -> processMessageFromRoot()
+- Benchmarks `forwardMessage()` gas and delivery throughput of every route, next to `SameChainAdapter`
+  on Ethereum (which delivers within `forwardMessage()`)
+
+Chains run with the london hardfork: `ArbAdapter` prices retryable tickets with `block.basefee`,
+and pays them from the controller's balance, which is funded at deployment. The adapters only
+support the Ethereum -> L2 direction.
+
+Example:
+with NativeBridges(["arbitrum", "optimism", "polygon"]) as bridges:
+    results = bridges.run(envelopes=100, message_size=256)
+    write_csv("reports/native_bridges.csv", results)
+    for result in results:
+        print(result)  # BridgeResult(arbitrum, 100/100 delivered, forwardMessage ... gas, ... envelopes/s)
+
+"""
+
+import csv
+import os
+import time
+
+from web3 import Web3
+
+import forwarding_logs
+from multichain import ADAPTERS, GAS, GUARDIAN, OWNER, SENDERS, LocalChain, SimulationError, delivery_attempts
+
+ETHEREUM = 1
+SAME_CHAIN = "same_chain"
+# route => (L2 chain id, adapter contract)
+ROUTES = {
+    "arbitrum": (42161, "ArbAdapter"),
+    "optimism": (10, "OpAdapter"),
+    "base": (8453, "CBaseAdapter"),
+    "metis": (1088, "MetisAdapter"),
+    "polygon": (137, "PolygonAdapter"),
+}
+# AddressAliasHelper.OFFSET
+L1_TO_L2_ALIAS_OFFSET = 0x1111000000000000000000000000000000001111
+CONTROLLER_FUNDS = 100 * 10**18
+DEFAULT_PORT = 8700
+FIELDS = (
+    "route",
+    "chain_id",
+    "adapter",
+    "envelopes",
+    "message_size",
+    "delivered",
+    "mean_forward_gas",
+    "mean_relay_gas",
+    "seconds",
+    "envelopes_per_second",
+)
+
+
+def l1_to_l2_alias(address):
+    """`AddressAliasHelper.applyL1ToL2Alias()`"""
+    aliased = (int(address, 16) + L1_TO_L2_ALIAS_OFFSET) % 2**160
+    return Web3.toChecksumAddress(aliased.to_bytes(20, "big"))
+
+
+class BridgeResult:
+    def __init__(self, route, chain_id, adapter, envelopes, message_size):
+        self.route = route
+        self.chain_id = chain_id
+        self.adapter = adapter
+        self.envelopes = envelopes
+        self.message_size = message_size
+        self.delivered = 0
+        self.forward_gas = []
+        # gas of the replays on the L2, empty for the same chain adapter
+        self.relay_gas = []
+        self.seconds = 0.0
+
+    @staticmethod
+    def _mean(values):
+        return sum(values) / len(values) if values else 0.0
+
+    @property
+    def mean_forward_gas(self):
+        return self._mean(self.forward_gas)
+
+    @property
+    def mean_relay_gas(self):
+        return self._mean(self.relay_gas)
+
+    @property
+    def envelopes_per_second(self):
+        return self.delivered / self.seconds if self.seconds else 0.0
+
+    def row(self):
+        return [
+            self.route,
+            self.chain_id,
+            self.adapter,
+            self.envelopes,
+            self.message_size,
+            self.delivered,
+            f"{self.mean_forward_gas:.1f}",
+            f"{self.mean_relay_gas:.1f}",
+            f"{self.seconds:.3f}",
+            f"{self.envelopes_per_second:.1f}",
+        ]
+
+    def __repr__(self):
+        return (
+            f"BridgeResult({self.route}, {self.delivered}/{self.envelopes} delivered, "
+            f"forwardMessage {self.mean_forward_gas:,.0f} gas, relay {self.mean_relay_gas:,.0f} gas, "
+            f"{self.envelopes_per_second:,.1f} envelopes/s)"
+        )
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for result in results:
+            writer.writerow(result.row())
+
+
+###################
+##### Relayer #####
+###################
+
+
+class BridgeRelayer:
+    """Replays the messages recorded by the stand-ins on Ethereum into the L2 adapters, once each."""
+
+    def __init__(self, bridges):
+        self.bridges = bridges
+        self.from_block = {route: 0 for route in bridges.routes}
+
+    def _messages(self, route):
+        """(sender, to, data, gas) of the L2 transactions replaying the new outbound messages of `route`."""
+        l1 = self.bridges.l1
+        l2 = self.bridges.chains[route]
+        contracts = self.bridges.contracts[route]
+        relayer = l2.accounts[ADAPTERS]
+        start, end = self.from_block[route], l1.web3.eth.block_number
+        if start > end:
+            return []
+        self.from_block[route] = end + 1
+
+        bridge = contracts["l1_bridge"]
+        if route == "arbitrum":
+            events = bridge.events.RetryableTicketCreated.getLogs(fromBlock=start, toBlock=end)
+            return [
+                # the ticket's gas limit is the destination gas limit of `forwardMessage()`
+                (l1_to_l2_alias(event.args["from"]), event.args.to, "0x" + bytes(event.args.data).hex(), event.args.gasLimit)
+                for event in events
+            ]
+        if route == "polygon":
+            events = bridge.events.StateSynced.getLogs(fromBlock=start, toBlock=end)
+            fx_child = contracts["l2_bridge"]
+            return [
+                (relayer, fx_child.address, fx_child.encodeABI(fn_name="onStateReceive", args=(event.args.id, event.args.data)), GAS)
+                for event in events
+                if event.args.contractAddress == fx_child.address
+            ]
+        events = bridge.events.SentMessage.getLogs(fromBlock=start, toBlock=end)
+        messenger = contracts["l2_bridge"]
+        return [
+            (
+                relayer,
+                messenger.address,
+                messenger.encodeABI(
+                    fn_name="relayMessage",
+                    args=(event.args.target, event.args.sender, event.args.message, event.args.messageNonce),
+                ),
+                # the messenger's own overhead on top of the message's gas limit
+                event.args.gasLimit + 100_000,
+            )
+            for event in events
+        ]
+
+    def relay(self, route):
+        """Replay the new messages of `route`, returns the receipts of the replays."""
+        l2 = self.bridges.chains[route]
+        tx_hashes = [l2.send(sender, to, data, gas) for sender, to, data, gas in self._messages(route)]
+        return [l2.web3.eth.wait_for_transaction_receipt(tx_hash, timeout=120) for tx_hash in tx_hashes]
+
+
+#################
+##### Setup #####
+#################
+
+
+class NativeBridges:
+    def __init__(self, routes=tuple(ROUTES), base_port=DEFAULT_PORT, destination_gas_limit=1_000_000, chains=None):
+        """
+        Start Ethereum on `base_port` and the L2 chains on the next ports, or use already started
+        `chains` (LocalChain, Ethereum first then one per route, in `routes` order).
+        """
+        unknown = set(routes) - set(ROUTES)
+        if unknown:
+            raise ValueError(f"unknown routes {sorted(unknown)}, known: {sorted(ROUTES)}")
+        self.routes = list(routes)
+        self.destination_gas_limit = destination_gas_limit
+        if chains is None:
+            chains = []
+            try:
+                for i, chain_id in enumerate([ETHEREUM] + [ROUTES[route][0] for route in self.routes]):
+                    chains.append(LocalChain.start(chain_id, base_port + i, accounts=ADAPTERS + 1, hardfork="london"))
+            except Exception:
+                for chain in chains:
+                    chain.stop()
+                raise
+        self.l1 = chains[0]
+        self.chains = dict(zip(self.routes, chains[1:]))
+        for route, chain in self.chains.items():
+            if chain.chain_id != ROUTES[route][0]:
+                raise SimulationError(f"{route} needs chain id {ROUTES[route][0]}, not {chain.chain_id}")
+        self.contracts = {}
+        try:
+            self._deploy()
+        except Exception:
+            self.stop()
+            raise
+        self.relayer = BridgeRelayer(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        for chain in [self.l1, *self.chains.values()]:
+            chain.stop()
+
+    def _controller(self, chain, confirmations, senders):
+        owner, guardian = chain.accounts[OWNER], chain.accounts[GUARDIAN]
+        controller = chain.deploy("CrossChainController")
+        # initialized directly, the logic contract doesn't lock its initializer
+        chain.call(controller, "initialize", owner, guardian, confirmations, [], [], senders)
+        return controller
+
+    def _deploy(self):
+        l1 = self.l1
+        self.controller = self._controller(l1, [], [l1.accounts[SENDERS]])
+        l1.wait(
+            l1.web3.eth.send_transaction(
+                {
+                    "from": l1.accounts[OWNER],
+                    "to": self.controller.address,
+                    "value": CONTROLLER_FUNDS,
+                    "gas": 100_000,
+                    "gasPrice": l1.gas_price,
+                }
+            )
+        )
+        self.portal = l1.deploy("ReceiverPortalMock")
+        same_chain_adapter = l1.deploy("SameChainAdapter")
+        self.contracts[SAME_CHAIN] = {"l1_adapter": same_chain_adapter, "portal": self.portal}
+        forwarder_adapters = [(same_chain_adapter.address, same_chain_adapter.address, ETHEREUM)]
+
+        for route in self.routes:
+            l2 = self.chains[route]
+            chain_id, adapter_name = ROUTES[route]
+            controller = self._controller(l2, [(ETHEREUM, 1)], [])
+            trusted_remotes = [(self.controller.address, ETHEREUM)]
+            if route == "arbitrum":
+                l1_bridge = l1.deploy("ArbInboxMock")
+                l2_bridge = None
+                l2_adapter = l2.deploy(adapter_name, controller.address, l1_bridge.address, controller.address, trusted_remotes)
+                l1_adapter = l1.deploy(adapter_name, self.controller.address, l1_bridge.address, controller.address, [])
+                # retryable tickets are executed on L2 from the aliased address of the L1 sender
+                l2.impersonate(l1_to_l2_alias(self.controller.address))
+            elif route == "polygon":
+                l2_bridge = l2.deploy("FxChildMock")
+                l1_bridge = l1.deploy("FxRootMock", l2_bridge.address)
+                l2_adapter = l2.deploy(
+                    adapter_name, controller.address, l1_bridge.address, l2_bridge.address, trusted_remotes
+                )
+                l1_adapter = l1.deploy(adapter_name, self.controller.address, l1_bridge.address, l2_bridge.address, [])
+            else:
+                l1_bridge = l1.deploy("CrossDomainMessengerMock")
+                l2_bridge = l2.deploy("CrossDomainMessengerMock")
+                l2_adapter = l2.deploy(adapter_name, controller.address, l2_bridge.address, trusted_remotes)
+                l1_adapter = l1.deploy(adapter_name, self.controller.address, l1_bridge.address, [])
+            l2.call(controller, "allowReceiverBridgeAdapters", [(l2_adapter.address, [ETHEREUM])])
+            forwarder_adapters.append((l1_adapter.address, l2_adapter.address, chain_id))
+            self.contracts[route] = {
+                "l1_adapter": l1_adapter,
+                "l1_bridge": l1_bridge,
+                "l2_adapter": l2_adapter,
+                "l2_bridge": l2_bridge,
+                "controller": controller,
+                "portal": l2.deploy("ReceiverPortalMock"),
+            }
+        l1.call(self.controller, "enableBridgeAdapters", forwarder_adapters)
+
+    #####  Benchmark  #####
+
+    def forward(self, route, envelopes, message):
+        """Send `envelopes` `forwardMessage()` to the portal of `route` back-to-back, returns their receipts."""
+        l1 = self.l1
+        chain_id = ETHEREUM if route == SAME_CHAIN else ROUTES[route][0]
+        data = self.controller.encodeABI(
+            fn_name="forwardMessage",
+            args=(chain_id, self.contracts[route]["portal"].address, self.destination_gas_limit, message),
+        )
+        tx_hashes = [l1.send(l1.accounts[SENDERS], self.controller.address, data) for _ in range(envelopes)]
+        receipts = [l1.wait(tx_hash) for tx_hash in tx_hashes]
+        adapter = self.contracts[route]["l1_adapter"].address.lower()
+        for receipt in receipts:
+            for log in receipt["logs"]:
+                if bytes(log["topics"][0]) != forwarding_logs.TRANSACTION_FORWARDING_ATTEMPTED:
+                    continue
+                forwarded = forwarding_logs.decode_rpc_log(log)
+                if "0x" + bytes(forwarded.bridge_adapter).hex() == adapter and not forwarded.adapter_successful:
+                    raise SimulationError(f"{route} adapter failed to forward in {receipt['transactionHash'].hex()}")
+        return receipts
+
+    def measure(self, route, envelopes, message_size=128):
+        message = bytes(range(256)) * (message_size // 256) + bytes(range(message_size % 256))
+        chain_id, adapter = (ETHEREUM, "SameChainAdapter") if route == SAME_CHAIN else ROUTES[route]
+        result = BridgeResult(route, chain_id, adapter, envelopes, message_size)
+        portal = self.contracts[route]["portal"]
+        received = portal.functions.messagesReceived().call()
+
+        start = time.perf_counter()
+        receipts = self.forward(route, envelopes, message)
+        if route != SAME_CHAIN:
+            controller = self.contracts[route]["controller"].address
+            for receipt in self.relayer.relay(route):
+                result.relay_gas.append(receipt["gasUsed"])
+                result.delivered += sum(delivered for _, delivered in delivery_attempts(receipt, controller))
+        else:
+            result.delivered = portal.functions.messagesReceived().call() - received
+        result.seconds = time.perf_counter() - start
+        result.forward_gas = [receipt["gasUsed"] for receipt in receipts]
+        return result
+
+    def run(self, envelopes=50, message_size=128):
+        """`measure()` every route, and the same chain adapter first."""
+        return [self.measure(route, envelopes, message_size) for route in [SAME_CHAIN] + self.routes]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma separated routes")
+    parser.add_argument("--envelopes", type=int, default=50)
+    parser.add_argument("--message-size", type=int, default=128)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--csv", default=None, help="write the results to this CSV file")
+    args = parser.parse_args()
+
+    with NativeBridges(args.routes.split(","), base_port=args.port) as bridges:
+        results = bridges.run(args.envelopes, args.message_size)
+        for result in results:
+            print(result)
+        if args.csv:
+            write_csv(args.csv, results)
@@ -0,0 +1,177 @@
+"""
+Confirmation-quorum scaling benchmark for `receiveCrossChainMessage()`
+
+Purposes:
+- For every (K, R) of a grid, allows K receiver bridge adapters for a fresh origin chain id
+  (`allowReceiverBridgeAdapters()`) and requires R confirmations (`updateConfirmations()`)
+- Delivers the same transaction from each of the K adapters, in order, and splits the gas
+  of the K calls into:
+    confirmation:  the R - 1 calls before the quorum is reached
+    delivering:    call R, which reaches the quorum and calls the receiver portal
+    early return:  the K - R calls after the envelope is `Delivered`
+- Writes one CSV row per grid cell
+
+Adapters are fresh local accounts (no funds needed with a gas price of 0), every cell uses
+its own origin chain id so cells don't share any receiver state.
+
+Example:
+benchmark = QuorumBenchmark(cross_chain_controller, owner, ReceiverPortalMock.deploy({"from": owner}))
+results = benchmark.run(adapter_counts=[1, 2, 4, 8, 16], confirmations=[1, 2, 4, 8, 16])
+write_csv("reports/quorum.csv", results)
+
+"""
+
+import csv
+import os
+
+from brownie import accounts, chain
+
+from encoding_utils import Envelope, Transaction
+from tx_pipeline import TxPipeline
+
+FIRST_ORIGIN_CHAIN_ID = 30_000
+FIELDS = (
+    "adapters",
+    "required_confirmations",
+    "samples",
+    "confirmation_gas",
+    "delivering_gas",
+    "early_return_gas",
+    "gas_to_delivery",
+    "total_gas",
+)
+
+
+class QuorumResult:
+    """Gas of one (K, R) cell, averaged over its samples."""
+
+    def __init__(self, adapters, required_confirmations):
+        self.adapters = adapters
+        self.required_confirmations = required_confirmations
+        self.samples = 0
+        # gas of every call, per sample, in adapter order
+        self.calls = []
+
+    def _mean(self, start, stop):
+        values = [gas for calls in self.calls for gas in calls[start:stop]]
+        return sum(values) / len(values) if values else None
+
+    @property
+    def confirmation_gas(self):
+        """Mean gas of a confirmation that doesn't reach the quorum (None with R = 1)."""
+        return self._mean(0, self.required_confirmations - 1)
+
+    @property
+    def delivering_gas(self):
+        return self._mean(self.required_confirmations - 1, self.required_confirmations)
+
+    @property
+    def early_return_gas(self):
+        """Mean gas of a confirmation received once the envelope is delivered (None with K = R)."""
+        return self._mean(self.required_confirmations, self.adapters)
+
+    @property
+    def gas_to_delivery(self):
+        return sum(sum(calls[: self.required_confirmations]) for calls in self.calls) / self.samples
+
+    @property
+    def total_gas(self):
+        return sum(sum(calls) for calls in self.calls) / self.samples
+
+    def row(self):
+        def fmt(value):
+            return "" if value is None else f"{value:.1f}"
+
+        return [
+            self.adapters,
+            self.required_confirmations,
+            self.samples,
+            fmt(self.confirmation_gas),
+            fmt(self.delivering_gas),
+            fmt(self.early_return_gas),
+            fmt(self.gas_to_delivery),
+            fmt(self.total_gas),
+        ]
+
+    def __repr__(self):
+        return f"QuorumResult(K={self.adapters}, R={self.required_confirmations}, {dict(zip(FIELDS[3:], self.row()[3:]))})"
+
+
+class QuorumBenchmark:
+    def __init__(self, cross_chain_controller, owner, destination, message=b"quorum benchmark"):
+        """`destination`: receiver portal the envelopes are delivered to (delivery must succeed)."""
+        self.cross_chain_controller = cross_chain_controller
+        self.owner = owner
+        self.destination = destination
+        self.message = message
+        self.origin_sender = accounts.add()
+        self._origin_chain_id = FIRST_ORIGIN_CHAIN_ID
+        self._adapters = []
+
+    def adapters(self, count):
+        """The first `count` adapter accounts, adapters are shared by the cells."""
+        while len(self._adapters) < count:
+            self._adapters.append(accounts.add())
+        return self._adapters[:count]
+
+    def configure(self, adapter_count, required_confirmations):
+        """Allow `adapter_count` adapters for a new origin chain id and require `required_confirmations`."""
+        origin_chain_id = self._origin_chain_id
+        self._origin_chain_id += 1
+        adapters = self.adapters(adapter_count)
+        pipeline = TxPipeline()
+        pipeline.transact(
+            self.cross_chain_controller,
+            "allowReceiverBridgeAdapters",
+            [(adapter.address, [origin_chain_id]) for adapter in adapters],
+            sender=self.owner,
+        )
+        pipeline.transact(
+            self.cross_chain_controller,
+            "updateConfirmations",
+            [(origin_chain_id, required_confirmations)],
+            sender=self.owner,
+        )
+        pipeline.flush()
+        return origin_chain_id, adapters
+
+    def measure(self, adapter_count, required_confirmations, samples=1):
+        if not 1 <= required_confirmations <= adapter_count:
+            raise ValueError(f"required confirmations {required_confirmations} not in [1, {adapter_count}]")
+        origin_chain_id, adapters = self.configure(adapter_count, required_confirmations)
+        result = QuorumResult(adapter_count, required_confirmations)
+        for nonce in range(samples):
+            envelope = Envelope(
+                nonce, self.origin_sender, self.destination, origin_chain_id, chain.id, self.message
+            )
+            encoded_transaction = Transaction(nonce, envelope.to_bytes()).to_bytes()
+            pipeline = TxPipeline()
+            for adapter in adapters:
+                pipeline.transact(
+                    self.cross_chain_controller,
+                    "receiveCrossChainMessage",
+                    encoded_transaction,
+                    origin_chain_id,
+                    sender=adapter,
+                )
+            result.calls.append([receipt.gasUsed for receipt in pipeline.flush()])
+            result.samples += 1
+        return result
+
+    def run(self, adapter_counts, confirmations, samples=1):
+        """Every (K, R) of the grid with R <= K."""
+        return [
+            self.measure(adapter_count, required_confirmations, samples)
+            for adapter_count in adapter_counts
+            for required_confirmations in confirmations
+            if required_confirmations <= adapter_count
+        ]
+
+
+def write_csv(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for result in results:
+            writer.writerow(result.row())
@@ -0,0 +1,605 @@
+"""
+Streaming invariant monitor for CrossChainController events
+
+Purposes:
+- Consumes the events of one or more controllers as a stream (log by log, in block order on
+  every chain) and checks protocol invariants incrementally: each log costs a few dict / set
+  lookups of in-memory state, O(1) per event, and the history is never queried again
+- Keeps the state compact: per chain the last nonces, the required confirmations per origin and
+  the ids registered and forwarded under the last `window` nonces (older ones are dropped as the
+  nonces move on), and on destinations the confirming adapters of the transactions
+  of envelopes still collecting confirmations only (released once the envelope is confirmed or
+  delivered), plus the final state of the other envelopes
+- Runs inside a test, as the `invariant_monitor` fixture (polling from a background thread
+  while a load runs, checked at teardown), or as a standalone process following nodes over
+  JSON-RPC
+
+Invariants:
+    envelope_nonce         EnvelopeRegistered nonces strictly increase on a chain
+    transaction_nonce      a new transaction is forwarded with a nonce above every earlier one
+    retry_forwarded        a transaction forwarded again (`retryTransaction()`) was forwarded before
+    forwarded_registered   the envelope of a forwarded transaction was registered on that chain
+    adapter_once           no adapter is counted twice for one transaction
+    confirmation_count     the confirmations of a receipt are the previous count plus one
+    receipt_after_final    no receipt is counted once the envelope is confirmed or delivered
+    delivery_quorum        a delivery attempted on receipt has confirmations >= the count required
+                           for the origin chain at that time (ConfirmationsUpdated)
+    delivery_confirmed     `deliverEnvelope()` only delivers envelopes whose delivery had failed
+    delivered_once         an envelope is delivered at most once
+    received_forwarded     a transaction received from a watched origin chain was forwarded there
+                           (matched at `close()`: the chains are polled one after the other)
+
+A controller is watched from its state at the start (nonces and required confirmations are read
+from it), unless watched from block 0. What happened before the start is not checked: retries of
+older transactions, or receipts of older ones, are counted as unchecked instead of flagged. The same
+goes for the envelopes and transactions more than `window` nonces behind the last one of their chain.
+
+Example:
+monitor = InvariantMonitor()
+monitor.watch(1, ethereum.web3, ethereum_controller.address)
+monitor.watch(137, polygon.web3, polygon_controller.address)
+monitor.start(interval=0.5)  # or monitor.poll() now and then, or monitor.observe(chain_id, log)
+...
+monitor.close()
+print(monitor.report())  # InvariantMonitor(2 chains, 12000 events, 0 violations, 3.1 us/event, ...)
+
+python tests/stream_invariants.py http://127.0.0.1:8600=0x... http://127.0.0.1:8601=0x... --interval 1
+
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from eth_abi import decode_abi
+from eth_hash.auto import keccak
+
+import forwarding_logs
+from encoding_utils import WORD, address_at, to_bytes, word_at
+from envelope_index import (
+    ENVELOPE_DELIVERY_ATTEMPTED,
+    ENVELOPE_REGISTERED,
+    TRANSACTION_FORWARDING_ATTEMPTED,
+    TRANSACTION_RECEIVED,
+)
+
+CONFIRMATIONS_UPDATED = keccak(b"ConfirmationsUpdated(uint8,uint256)")
+TOPICS = [
+    ENVELOPE_REGISTERED,
+    TRANSACTION_FORWARDING_ATTEMPTED,
+    TRANSACTION_RECEIVED,
+    ENVELOPE_DELIVERY_ATTEMPTED,
+    CONFIRMATIONS_UPDATED,
+]
+
+ENVELOPE_NONCE = "envelope_nonce"
+TRANSACTION_NONCE = "transaction_nonce"
+RETRY_FORWARDED = "retry_forwarded"
+FORWARDED_REGISTERED = "forwarded_registered"
+ADAPTER_ONCE = "adapter_once"
+CONFIRMATION_COUNT = "confirmation_count"
+RECEIPT_AFTER_FINAL = "receipt_after_final"
+DELIVERY_QUORUM = "delivery_quorum"
+DELIVERY_CONFIRMED = "delivery_confirmed"
+DELIVERED_ONCE = "delivered_once"
+RECEIVED_FORWARDED = "received_forwarded"
+INVARIANTS = (
+    ENVELOPE_NONCE,
+    TRANSACTION_NONCE,
+    RETRY_FORWARDED,
+    FORWARDED_REGISTERED,
+    ADAPTER_ONCE,
+    CONFIRMATION_COUNT,
+    RECEIPT_AFTER_FINAL,
+    DELIVERY_QUORUM,
+    DELIVERY_CONFIRMED,
+    DELIVERED_ONCE,
+    RECEIVED_FORWARDED,
+)
+
+# nonces per chain whose envelope and transaction ids are kept for the origin side checks
+WINDOW = 100_000
+
+# envelope states on a destination, as `EnvelopeState` plus the one before the quorum
+RECEIVING = 0
+CONFIRMED = 1
+DELIVERED = 2
+
+SELECTORS = {
+    name: keccak(name.encode())[:4]
+    for name in (
+        "getCurrentEnvelopeNonce()",
+        "getCurrentTransactionNonce()",
+        "getSupportedChains()",
+        "getConfigurationByChain(uint256)",
+    )
+}
+
+
+class Violation:
+    __slots__ = ("invariant", "chain_id", "block", "transaction_hash", "detail")
+
+    def __init__(self, invariant, chain_id, block, transaction_hash, detail):
+        self.invariant = invariant
+        self.chain_id = chain_id
+        self.block = block
+        self.transaction_hash = transaction_hash
+        self.detail = detail
+
+    def __repr__(self):
+        return f"Violation({self.invariant} on {self.chain_id} at block {self.block}: {self.detail})"
+
+
+##################
+##### Chains #####
+##################
+
+
+class ChainState:
+    """Everything the monitor keeps about one watched controller."""
+
+    __slots__ = (
+        "chain_id",
+        "window",
+        "web3",
+        "address",
+        "next_block",
+        "complete",
+        "start_envelope_nonce",
+        "start_transaction_nonce",
+        "last_envelope_nonce",
+        "last_transaction_nonce",
+        "registered",
+        "forwarded",
+        "last_registered",
+        "last_forwarding",
+        "required",
+        "envelopes",
+        "receiving",
+        "transactions",
+        "last_receipt",
+    )
+
+    def __init__(self, chain_id, web3=None, address=None, from_block=0, window=WINDOW):
+        self.chain_id = chain_id
+        self.window = window
+        self.web3 = web3
+        self.address = address
+        self.next_block = from_block
+        self.complete = from_block == 0  # every event of the controller is seen
+        self.start_envelope_nonce = 0
+        self.start_transaction_nonce = 0
+        self.last_envelope_nonce = -1
+        self.last_transaction_nonce = -1
+        # origin side
+        self.registered = OrderedDict()  # {envelope nonce: envelope id}, the last `window` nonces
+        self.forwarded = OrderedDict()  # {transaction nonce: transaction id}, the last `window` nonces
+        self.last_registered = None  # (transaction hash, envelope id)
+        self.last_forwarding = None  # (transaction hash, transaction id)
+        # destination side
+        self.required = {}  # {origin chain id: required confirmations}
+        self.envelopes = {}  # {envelope id: RECEIVING / CONFIRMED / DELIVERED}
+        self.receiving = {}  # {envelope id: [transaction ids]}, RECEIVING envelopes only
+        self.transactions = {}  # {transaction id: [confirmations, set of adapters]}, of RECEIVING envelopes only
+        self.last_receipt = None  # (transaction hash, envelope id, origin chain id, confirmations)
+
+    def _call(self, signature, arguments=b"", block="latest"):
+        data = SELECTORS[signature] + arguments
+        return bytes(self.web3.eth.call({"to": self.address, "data": "0x" + data.hex()}, block))
+
+    def seed(self, block):
+        """Nonces and required confirmations of the controller at `block`, the last one before the stream."""
+        self.start_envelope_nonce = word_at(self._call("getCurrentEnvelopeNonce()", block=block), 0)
+        self.start_transaction_nonce = word_at(self._call("getCurrentTransactionNonce()", block=block), 0)
+        self.last_envelope_nonce = self.start_envelope_nonce - 1
+        self.last_transaction_nonce = self.start_transaction_nonce - 1
+        (chain_ids,) = decode_abi(["uint256[]"], self._call("getSupportedChains()", block=block))
+        for origin_chain_id in chain_ids:
+            configuration = self._call("getConfigurationByChain(uint256)", origin_chain_id.to_bytes(WORD, "big"), block)
+            self.required[origin_chain_id] = word_at(configuration, 0)
+
+    def envelope_floor(self):
+        """Lowest envelope nonce whose registration is still known."""
+        return max(self.start_envelope_nonce, self.last_envelope_nonce - self.window + 1)
+
+    def transaction_floor(self):
+        """Lowest transaction nonce whose forwarding is still known."""
+        return max(self.start_transaction_nonce, self.last_transaction_nonce - self.window + 1)
+
+    def remember(self, ids, nonce, id_):
+        """Keep `id_` under `nonce` (above every kept one), dropping the nonces `window` behind."""
+        ids[nonce] = id_
+        while ids and next(iter(ids)) <= nonce - self.window:
+            ids.popitem(last=False)
+
+    def release(self, envelope_id, state):
+        """Final state of an envelope: its transactions can't be confirmed any more, forget them."""
+        self.envelopes[envelope_id] = state
+        for transaction_id in self.receiving.pop(envelope_id, ()):
+            self.transactions.pop(transaction_id, None)
+
+
+###################
+##### Monitor #####
+###################
+
+
+class InvariantMonitor:
+    def __init__(self, skip=(), on_violation=None, step=2000, window=WINDOW):
+        self.chains = {}  # {chain id: ChainState}
+        self.window = window  # nonces per chain whose envelope / transaction ids are kept
+        self.skip = set(skip)  # invariants not checked
+        self.on_violation = on_violation  # called with every Violation as it is found
+        self.step = step
+        self.violations = []
+        self.checks = dict.fromkeys(INVARIANTS, 0)
+        self.unchecked = dict.fromkeys(INVARIANTS, 0)
+        self.unmatched = {}  # {(origin chain id, transaction id): Violation}, for RECEIVED_FORWARDED
+        self.events = 0
+        self.seconds = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._error = None
+        self._closed = False
+
+    def watch(self, chain_id, web3, address, from_block=None):
+        """
+        Follow the controller at `address` of chain `chain_id` from `from_block` (default: the next
+        block), its state just before it read as the start of the stream.
+        """
+        if from_block is None:
+            from_block = web3.eth.block_number + 1
+        state = ChainState(chain_id, web3, str(address), from_block, self.window)
+        if from_block > 0:
+            state.seed(from_block - 1)
+        self.chains[chain_id] = state
+        return state
+
+    def watch_simulator(self, simulator, from_block=None):
+        """Watch the controllers of every chain of a `multichain.Simulator`."""
+        for chain_id, chain in simulator.chains.items():
+            self.watch(chain_id, chain.web3, chain.contracts["cross_chain_controller"].address, from_block)
+
+    #####  Stream  #####
+
+    def poll(self):
+        """Check the logs of every watched chain up to its latest block. Returns the number of logs."""
+        observed = 0
+        for state in self.chains.values():
+            if state.web3 is None:
+                # only fed through `observe()`
+                continue
+            latest = state.web3.eth.block_number
+            while state.next_block <= latest:
+                end = min(state.next_block + self.step - 1, latest)
+                logs = state.web3.eth.get_logs(
+                    {
+                        "address": state.address,
+                        "fromBlock": state.next_block,
+                        "toBlock": end,
+                        "topics": [["0x" + topic.hex() for topic in TOPICS]],
+                    }
+                )
+                for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+                    self.observe(state.chain_id, log)
+                observed += len(logs)
+                state.next_block = end + 1
+        return observed
+
+    def run(self, interval=1.0):
+        """Poll until `stop()`."""
+        while not self._stop.is_set():
+            if not self.poll():
+                self._stop.wait(interval)
+
+    def _run(self, interval):
+        try:
+            self.run(interval)
+        except Exception as error:
+            self._error = error
+
+    def start(self, interval=0.5):
+        """Poll from a background thread, while the test sends its load."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        """Stop polling, check the last logs and the deferred invariants. Returns the violations."""
+        if not self._closed:
+            self.stop()
+            self.poll()
+            for violation in self.unmatched.values():
+                self._violation(violation)
+            self.unmatched.clear()
+            self._closed = True
+        return self.violations
+
+    #####  Checks  #####
+
+    def _check(self, invariant, ok, state, log, detail):
+        if invariant in self.skip:
+            return
+        self.checks[invariant] += 1
+        if not ok:
+            transaction_hash = "0x" + to_bytes(log["transactionHash"]).hex()
+            self._violation(Violation(invariant, state.chain_id, log["blockNumber"], transaction_hash, detail))
+
+    def _violation(self, violation):
+        self.violations.append(violation)
+        if self.on_violation is not None:
+            self.on_violation(violation)
+
+    def observe(self, chain_id, log):
+        """Check one log (as returned by `eth_getLogs`) of the controller watched on `chain_id`."""
+        start = time.perf_counter()
+        state = self.chains.get(chain_id)
+        if state is None:
+            state = self.chains[chain_id] = ChainState(chain_id, window=self.window)
+        topics = log["topics"]
+        topic = to_bytes(topics[0])
+        if topic == ENVELOPE_REGISTERED:
+            self._registered(state, log)
+        elif topic == TRANSACTION_FORWARDING_ATTEMPTED:
+            self._forwarded(state, log)
+        elif topic == TRANSACTION_RECEIVED:
+            self._received(state, log)
+        elif topic == ENVELOPE_DELIVERY_ATTEMPTED:
+            self._delivery_attempted(state, log)
+        elif topic == CONFIRMATIONS_UPDATED:
+            state.required[int.from_bytes(to_bytes(topics[1]), "big")] = word_at(to_bytes(log["data"]), 0)
+        self.events += 1
+        self.seconds += time.perf_counter() - start
+
+    def _registered(self, state, log):
+        data = to_bytes(log["data"])
+        # data: envelope offset | envelope (nonce first)
+        nonce = word_at(data, word_at(data, 0))
+        self._check(
+            ENVELOPE_NONCE,
+            nonce > state.last_envelope_nonce,
+            state,
+            log,
+            f"envelope nonce {nonce} after {state.last_envelope_nonce}",
+        )
+        envelope_id = to_bytes(log["topics"][1])
+        if nonce > state.last_envelope_nonce:
+            state.last_envelope_nonce = nonce
+            state.remember(state.registered, nonce, envelope_id)
+        state.last_registered = (to_bytes(log["transactionHash"]), envelope_id)
+
+    def _forwarded(self, state, log):
+        forwarded = forwarding_logs.decode([to_bytes(topic) for topic in log["topics"]], to_bytes(log["data"]))
+        transaction_hash = to_bytes(log["transactionHash"])
+        transaction_id = bytes(forwarded.transaction_id)
+        envelope_id = bytes(forwarded.envelope_id)
+        nonce = forwarded.transaction_nonce
+        if state.forwarded.get(nonce) != transaction_id:
+            if nonce > state.last_transaction_nonce:
+                self._check(TRANSACTION_NONCE, True, state, log, "")
+                state.last_transaction_nonce = nonce
+                state.remember(state.forwarded, nonce, transaction_id)
+            elif nonce < state.transaction_floor():
+                # retry of a transaction forwarded before the stream started, or `window` nonces ago
+                self.unchecked[RETRY_FORWARDED] += 1
+            elif state.last_registered == (transaction_hash, envelope_id):
+                # `forwardMessage()`, the envelope registered just before
+                self._check(
+                    TRANSACTION_NONCE,
+                    False,
+                    state,
+                    log,
+                    f"transaction nonce {nonce} after {state.last_transaction_nonce}",
+                )
+            else:
+                self._check(
+                    RETRY_FORWARDED,
+                    False,
+                    state,
+                    log,
+                    f"transaction 0x{transaction_id.hex()} (nonce {nonce}, last {state.last_transaction_nonce}) "
+                    f"forwarded again but never forwarded",
+                )
+            self.unmatched.pop((state.chain_id, transaction_id), None)
+        elif state.last_forwarding != (transaction_hash, transaction_id):
+            # not the next adapter of the same call: `retryTransaction()`
+            self._check(RETRY_FORWARDED, True, state, log, "")
+        state.last_forwarding = (transaction_hash, transaction_id)
+
+        if forwarded.envelope_nonce >= state.envelope_floor():
+            self._check(
+                FORWARDED_REGISTERED,
+                state.registered.get(forwarded.envelope_nonce) == envelope_id,
+                state,
+                log,
+                f"transaction 0x{transaction_id.hex()} forwards envelope 0x{envelope_id.hex()} never registered",
+            )
+        else:
+            self.unchecked[FORWARDED_REGISTERED] += 1
+
+    def _received(self, state, log):
+        topics = log["topics"]
+        data = to_bytes(log["data"])
+        # topics: envelopeId | originChainId | bridgeAdapter
+        # data:   transactionId | transaction offset | confirmations | (nonce, encodedEnvelope)
+        envelope_id = to_bytes(topics[1])
+        origin_chain_id = int.from_bytes(to_bytes(topics[2]), "big")
+        adapter = address_at(to_bytes(topics[3]))
+        transaction_id = bytes(data[:WORD])
+        confirmations = word_at(data, 2 * WORD)
+        state.last_receipt = (to_bytes(log["transactionHash"]), envelope_id, origin_chain_id, confirmations)
+
+        final = state.envelopes.get(envelope_id, RECEIVING)
+        self._check(
+            RECEIPT_AFTER_FINAL,
+            final == RECEIVING,
+            state,
+            log,
+            f"receipt of envelope 0x{envelope_id.hex()} after it was {'delivered' if final == DELIVERED else 'confirmed'}",
+        )
+        if final != RECEIVING:
+            return
+
+        record = state.transactions.get(transaction_id)
+        if record is None:
+            origin = self.chains.get(origin_chain_id)
+            nonce = word_at(data, word_at(data, WORD))
+            if origin is not None and nonce >= origin.transaction_floor():
+                if origin.forwarded.get(nonce) != transaction_id and RECEIVED_FORWARDED not in self.skip:
+                    # the origin may not be polled up to the forwarding yet, decided at `close()`
+                    self.unmatched[(origin_chain_id, transaction_id)] = Violation(
+                        RECEIVED_FORWARDED,
+                        state.chain_id,
+                        log["blockNumber"],
+                        "0x" + to_bytes(log["transactionHash"]).hex(),
+                        f"transaction 0x{transaction_id.hex()} received from {origin_chain_id} never forwarded there",
+                    )
+                self.checks[RECEIVED_FORWARDED] += 1
+            else:
+                self.unchecked[RECEIVED_FORWARDED] += 1
+            record = state.transactions[transaction_id] = [0, set()]
+            state.envelopes[envelope_id] = RECEIVING
+            state.receiving.setdefault(envelope_id, []).append(transaction_id)
+            if confirmations != 1 and not state.complete:
+                # the first receipts of this transaction were before the stream started
+                self.unchecked[CONFIRMATION_COUNT] += 1
+                record[0] = confirmations - 1
+        count, adapters = record
+        self._check(
+            ADAPTER_ONCE,
+            adapter not in adapters,
+            state,
+            log,
+            f"adapter {adapter} counted twice for transaction 0x{transaction_id.hex()}",
+        )
+        self._check(
+            CONFIRMATION_COUNT,
+            confirmations == count + 1,
+            state,
+            log,
+            f"{confirmations} confirmations of transaction 0x{transaction_id.hex()} after {count}",
+        )
+        record[0] = confirmations
+        adapters.add(adapter)
+
+    def _delivery_attempted(self, state, log):
+        data = to_bytes(log["data"])
+        # data: envelopeId | envelope offset | isDelivered | envelope
+        envelope_id = bytes(data[:WORD])
+        delivered = word_at(data, 2 * WORD) != 0
+        transaction_hash = to_bytes(log["transactionHash"])
+        previous = state.envelopes.get(envelope_id)
+        self._check(
+            DELIVERED_ONCE,
+            previous != DELIVERED,
+            state,
+            log,
+            f"envelope 0x{envelope_id.hex()} delivered again",
+        )
+
+        receipt = state.last_receipt
+        if receipt is not None and receipt[0] == transaction_hash and receipt[1] == envelope_id:
+            # attempted by `receiveCrossChainMessage()`, right after the receipt reaching the quorum
+            _, _, origin_chain_id, confirmations = receipt
+            required = state.required.get(origin_chain_id)
+            if required is None:
+                self.unchecked[DELIVERY_QUORUM] += 1
+            else:
+                self._check(
+                    DELIVERY_QUORUM,
+                    confirmations >= required,
+                    state,
+                    log,
+                    f"envelope 0x{envelope_id.hex()} delivery attempted with {confirmations} of {required} "
+                    f"confirmations required for {origin_chain_id}",
+                )
+            state.last_receipt = None
+        elif previous is None and not state.complete:
+            # `deliverEnvelope()` of an envelope confirmed before the stream started
+            self.unchecked[DELIVERY_CONFIRMED] += 1
+        else:
+            self._check(
+                DELIVERY_CONFIRMED,
+                previous == CONFIRMED and delivered,
+                state,
+                log,
+                f"envelope 0x{envelope_id.hex()} delivered without a quorum or a failed delivery before",
+            )
+        state.release(envelope_id, DELIVERED if delivered else CONFIRMED)
+
+    #####  Report  #####
+
+    @property
+    def microseconds_per_event(self):
+        return 1e6 * self.seconds / self.events if self.events else 0.0
+
+    def in_flight(self):
+        """Transactions of envelopes still collecting confirmations, over every chain."""
+        return sum(len(state.transactions) for state in self.chains.values())
+
+    def state_size(self):
+        """Entries held in memory, per kind."""
+        states = self.chains.values()
+        return {
+            "registered": sum(len(state.registered) for state in states),
+            "forwarded": sum(len(state.forwarded) for state in states),
+            "envelopes": sum(len(state.envelopes) for state in states),
+            "in_flight": self.in_flight(),
+            "unmatched": len(self.unmatched),
+        }
+
+    def report(self):
+        lines = [repr(self)]
+        lines += [
+            f"    {invariant:22} {self.checks[invariant]:>9} checked {self.unchecked[invariant]:>7} unchecked"
+            for invariant in INVARIANTS
+        ]
+        lines += [f"    {violation}" for violation in self.violations]
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return (
+            f"InvariantMonitor({len(self.chains)} chains, {self.events} events, {len(self.violations)} violations, "
+            f"{self.microseconds_per_event:.1f} us/event, {self.in_flight()} transactions in flight)"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from web3 import HTTPProvider, Web3
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("controllers", nargs="+", metavar="URL=ADDRESS", help="node and controller to watch")
+    parser.add_argument("--from-block", type=int, default=None, help="default: the next block of every chain")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls when idle")
+    parser.add_argument("--once", action="store_true", help="check from --from-block up to the latest blocks and exit")
+    parser.add_argument("--skip", action="append", default=[], choices=INVARIANTS)
+    parser.add_argument("--window", type=int, default=WINDOW, help="nonces per chain whose ids are kept")
+    args = parser.parse_args()
+
+    monitor = InvariantMonitor(
+        skip=args.skip, on_violation=lambda violation: print(violation, flush=True), window=args.window
+    )
+    for controller in args.controllers:
+        url, address = controller.rsplit("=", 1)
+        web3 = Web3(HTTPProvider(url))
+        monitor.watch(web3.eth.chain_id, web3, Web3.toChecksumAddress(address), args.from_block)
+    if not args.once:
+        try:
+            monitor.run(args.interval)
+        except KeyboardInterrupt:
+            pass
+    monitor.close()
+    print(monitor.report())
+    sys.exit(1 if monitor.violations else 0)
@@ -1,3 +1,5 @@
+import asyncio
+
 import brownie
 import pytest
 
@@ -12,6 +14,7 @@ from brownie import (
 )
 
 from eth_abi import encode_abi, encode_single
+import chain_id_tables
 
 def test_constructor(setup_protocol):
     """
@@ -114,5 +117,52 @@ def test_register_received_message_delegatecall(setup_protocol, owner, MainnetCh
         sigp_delegatecall.delegateRegisterReceivedMessage(encode_transaction, origin_chain_id, {"from": carol})
 
 
-
-
+def test_chain_id_translation_tables(setup_protocol, owner, MainnetChainIds, tmp_path):
+    """
+    Every adapter's chain id mappings round-trip over `ChainIds.sol`, and are emitted as lookup tables
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    adapters = chain_id_tables.deploy_adapters(project, owner, cross_chain_controller)
+    chain_ids = chain_id_tables.read_chain_ids()
+    tables = asyncio.run(chain_id_tables.generate(web3.provider.endpoint_uri, adapters, chain_ids))
+
+    assert chain_ids["ETHEREUM"] == 1 and chain_ids["HARMONY"] == 1666600000 and chain_ids["LOCAL"] == chain.id
+    for table in tables.values():
+        assert table.ok
+        assert all(gas is not None and gas > 0 for *_, gas in table.gas)
+    # the native bridges and Hyperlane use the infra ids
+    for name in ["ArbAdapter", "OpAdapter", "CBaseAdapter", "MetisAdapter", "PolygonAdapter", "HyperLaneAdapter"]:
+        assert tables[name].infra_to_native == {chain_id: chain_id for chain_id in chain_ids.values()}
+        assert tables[name].aliases == {}
+    assert tables["SameChainAdapter"].infra_to_native == {chain.id: chain.id}
+
+    layer_zero = tables["LayerZeroAdapter"]
+    assert layer_zero.infra_to_native[MainnetChainIds.ETHEREUM] == 101
+    assert layer_zero.infra_to_native[MainnetChainIds.ARBITRUM] == 110
+    assert sorted(layer_zero.unsupported) == sorted([chain_ids["BASE"], chain.id])
+    assert layer_zero.native_to_infra[116] == chain_ids["HARMONY"]
+
+    # CCIP passes unknown ids through: the infra ids of the chains with a selector read as themselves
+    ccip = tables["CCIPAdapter"]
+    assert ccip.infra_to_native[MainnetChainIds.ETHEREUM] == 5009297550715157269
+    assert ccip.infra_to_native[MainnetChainIds.ARBITRUM] == MainnetChainIds.ARBITRUM
+    assert ccip.aliases == {
+        chain_id: chain_id for chain_id in [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON, MainnetChainIds.AVALANCHE]
+    }
+
+    # the later branches of the LayerZero if/else chain cost more, and identity mappings are the cheapest
+    gas = {(function, argument): gas for function, argument, _, gas in layer_zero.gas}
+    assert gas["infraToNativeChainId", MainnetChainIds.ETHEREUM] < gas["infraToNativeChainId", chain_ids["BNB"]]
+    ranking = chain_id_tables.gas_ranking(tables)
+    assert ranking[0][0] == "LayerZeroAdapter"
+    assert tables["ArbAdapter"].max_gas < layer_zero.max_gas
+
+    #Validation
+    chain_id_tables.write_json(str(tmp_path / "tables.json"), tables)
+    chain_id_tables.write_python(str(tmp_path / "tables.py"), tables)
+    chain_id_tables.write_gas_csv(str(tmp_path / "gas.csv"), tables)
+    constants = {}
+    exec((tmp_path / "tables.py").read_text(), constants)
+    assert constants["INFRA_TO_NATIVE"]["LayerZeroAdapter"] == layer_zero.infra_to_native
+    assert constants["NATIVE_TO_INFRA"]["CCIPAdapter"][4051577828743386545] == MainnetChainIds.POLYGON
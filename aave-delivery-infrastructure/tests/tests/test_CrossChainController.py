@@ -1,3 +1,5 @@
+import asyncio
+
 import brownie
 import pytest
 
@@ -12,6 +14,18 @@ from brownie import (
 )
 
 from eth_abi import encode_abi, encode_single
+from encoding_utils import Envelope, Transaction, to_bytes
+import forwarding_logs
+from forward_load import DRIFT_TOLERANCE, ForwardLoad
+from quorum_benchmark import QuorumBenchmark, write_csv
+import adapter_scaling
+import envelope_index
+import envelope_sweeper
+import invalidation_analyzer
+import endpoint_load
+import forward_costs
+import message_scaling
+import stream_invariants
 
 def test_basic(setup_protocol):
     """
@@ -104,6 +118,118 @@ def test_forward_message(setup_protocol, carol, MainnetChainIds):
     assert tx.events["TransactionForwardingAttempted"]["returnData"] == '0x00'
 
 
+def test_forward_message_raw_log_decoding(setup_protocol, carol, MainnetChainIds, tmp_path):
+    """
+    Zero-copy decoding of `TransactionForwardingAttempted`, from the receipt and from an archive
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    current_chain_bridge_adapter = setup_protocol["current_chain_bridge_adapter"]
+    destination = setup_protocol["destination_chain_bridge_adapter"]
+    message = b"test message" * 100
+    tx = cross_chain_controller.forwardMessage(
+        MainnetChainIds.POLYGON, destination, 2000, message, {"from": carol}
+    )
+    event = tx.events["TransactionForwardingAttempted"]
+    logs = [
+        log for log in tx.logs if bytes(log["topics"][0]) == forwarding_logs.TRANSACTION_FORWARDING_ATTEMPTED
+    ]
+    assert len(logs) == 1
+
+    # the same log as a JSON-RPC response: hex string topics and data
+    rpc_log = dict(
+        logs[0],
+        topics=["0x" + bytes(topic).hex() for topic in logs[0]["topics"]],
+        data="0x" + to_bytes(logs[0]["data"]).hex(),
+    )
+
+    path = str(tmp_path / "forwarding.logs")
+    with forwarding_logs.LogArchive.create(path) as archive:
+        archive.append(logs[0])
+        archive.append(rpc_log)
+    archived = list(forwarding_logs.iter_forwarded(path))
+    assert len(archived) == 2
+
+    for forwarded in [forwarding_logs.decode_rpc_log(logs[0]), forwarding_logs.decode_rpc_log(rpc_log)] + archived:
+        assert "0x" + forwarded.transaction_id.hex() == event["transactionId"]
+        assert "0x" + forwarded.envelope_id.hex() == event["envelopeId"]
+        assert forwarded.destination_chain_id == MainnetChainIds.POLYGON
+        assert web3.toChecksumAddress(bytes(forwarded.bridge_adapter)) == current_chain_bridge_adapter
+        assert web3.toChecksumAddress(bytes(forwarded.destination_bridge_adapter)) == destination
+        assert forwarded.adapter_successful is True
+        assert bytes(forwarded.encoded_transaction) == bytes(event["encodedTransaction"])
+        assert forwarded.transaction_nonce == 0
+        assert forwarded.envelope_nonce == 0
+        assert web3.toChecksumAddress(bytes(forwarded.origin)) == carol
+        assert web3.toChecksumAddress(bytes(forwarded.destination)) == destination
+        assert forwarded.origin_chain_id == chain.id
+        assert forwarded.envelope_destination_chain_id == MainnetChainIds.POLYGON
+        assert forwarded.message == message
+        assert isinstance(forwarded.message, memoryview)
+
+
+def test_forward_message_load(setup_protocol, owner, Empty, account_pool, tmp_path):
+    """
+    Load generator: many senders and destinations, one CSV row per call, no gas drift per configuration
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    load = ForwardLoad.setup(
+        cross_chain_controller,
+        owner,
+        Empty,
+        account_pool,
+        senders=5,
+        destination_chain_ids=range(20_000, 20_003),
+        adapters_per_destination=[1, 2],
+    )
+    assert load.destinations == [(20_000, 1), (20_001, 2), (20_002, 1)]
+    assert [sender.address for sender in load.senders] == account_pool.addresses(5)
+    for sender in load.senders:
+        assert cross_chain_controller.isSenderApproved(sender)
+    assert len(cross_chain_controller.getForwarderBridgeAdaptersByChain(20_001)) == 2
+
+    # the first envelope initializes the nonces, leave it out of the measured run
+    load.run(envelopes=3, batch_size=3)
+    nonce = cross_chain_controller.getCurrentEnvelopeNonce()
+    path = str(tmp_path / "forward_load.csv")
+    result = load.run(envelopes=30, batch_size=7, window=5, path=path)
+    result.write_summary(str(tmp_path / "forward_load_summary.csv"))
+
+    assert result.calls == 30
+    assert cross_chain_controller.getCurrentEnvelopeNonce() == nonce + 30
+    with open(path) as f:
+        rows = f.read().splitlines()
+    assert len(rows) == 31
+    assert rows[1].startswith(f"{nonce},{load.senders[0].address},20000,1,128,")
+    assert set(result.configurations) == {(20_000, 1), (20_001, 2), (20_002, 1)}
+    for stats in result.configurations.values():
+        assert stats.calls == 10
+        assert abs(stats.drift) <= DRIFT_TOLERANCE * stats.mean
+    # every adapter delegatecall and log costs extra
+    assert result.configurations[(20_001, 2)].mean > result.configurations[(20_000, 1)].mean
+
+
+@pytest.mark.slow
+def test_forward_message_load_large(setup_protocol, owner, Empty, account_pool, tmp_path):
+    """
+    Production-scale forwarding volume: 50 senders, 12 destinations with 1 / 2 / 4 adapters
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    load = ForwardLoad.setup(
+        cross_chain_controller,
+        owner,
+        Empty,
+        account_pool,
+        senders=50,
+        destination_chain_ids=range(20_000, 20_012),
+        adapters_per_destination=[1, 2, 4],
+    )
+    load.run(envelopes=12, batch_size=12)
+    result = load.run(envelopes=20_000, batch_size=200, path=str(tmp_path / "forward_load.csv"))
+    result.write_summary(str(tmp_path / "forward_load_summary.csv"))
+    assert result.calls == 20_000
+    for stats in result.configurations.values():
+        assert abs(stats.drift) <= DRIFT_TOLERANCE * stats.mean
+
 
 def test_forward_message_same_chain_adapter(setup_protocol, carol, MainnetChainIds, owner):
     """
@@ -416,6 +542,44 @@ def test_retry_transaction_use_the_same_bridge_twice(setup_protocol, carol, Main
          cross_chain_controller.retryTransaction(transaction_data, gas_limit, [current_chain_bridge_adapter, current_chain_bridge_adapter], {"from": owner})
 
 
+def test_bridge_adapter_count_scaling(setup_protocol, owner, carol, Empty):
+    """
+    Forwarder gas grows with the number of adapters of a destination, and the block limit crossings are extrapolated
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    scaling = adapter_scaling.AdapterScaling(cross_chain_controller, owner, carol, Empty)
+    results = scaling.run(adapter_counts=[1, 2, 4, 8])
+
+    gas = {(m.key, m.adapters): m.gas for m in results}
+    for key in ["enableBridgeAdapters", "forwardMessage", "retryTransaction[all]", "disableBridgeAdapters"]:
+        assert gas[(key, 1)] < gas[(key, 2)] < gas[(key, 4)] < gas[(key, 8)]
+    assert gas[("retryTransaction[1]", 8)] < gas[("retryTransaction[half]", 8)] < gas[("retryTransaction[all]", 8)]
+    # every adapter is disabled again
+    assert cross_chain_controller.getForwarderBridgeAdaptersByChain(adapter_scaling.FIRST_DESTINATION_CHAIN_ID + 3) == []
+
+    crossings = adapter_scaling.block_limit_crossings(results)
+    for key in ["enableBridgeAdapters", "forwardMessage", "retryTransaction[all]"]:
+        assert crossings[key]["ethereum"] > 8
+        assert crossings[key]["avalanche"] <= crossings[key]["ethereum"]
+
+
+@pytest.mark.slow
+def test_bridge_adapter_count_scaling_large(setup_protocol, owner, carol, Empty, tmp_path):
+    """
+    1 to 64 adapters per destination chain
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    scaling = adapter_scaling.AdapterScaling(cross_chain_controller, owner, carol, Empty)
+    counts = [1, 2, 4, 8, 16, 32, 64]
+    results = scaling.run(adapter_counts=counts)
+    adapter_scaling.write_csv(str(tmp_path / "adapter_scaling.csv"), results)
+    gas = {(m.key, m.adapters): m.gas for m in results}
+    for key in ["enableBridgeAdapters", "forwardMessage", "retryTransaction[all]", "disableBridgeAdapters"]:
+        assert [gas[(key, count)] for count in counts] == sorted(gas[(key, count)] for count in counts), key
+    crossings = adapter_scaling.block_limit_crossings(results)
+    assert crossings["forwardMessage"]["avalanche"] <= crossings["forwardMessage"]["ethereum"]
+
+
 def test_approve_senders(setup_protocol, owner, alice, bob):
     """
     Testing `approveSenders()`
@@ -759,6 +923,482 @@ def test_receive_cross_chain_message_case_3(setup_protocol, bridge_adapter, alic
     assert "EnvelopeDeliveryAttempted" not in tx.events
 
 
+def test_receive_cross_chain_message_quorum_grid(setup_protocol, owner, ReceiverPortalMock, constants, tmp_path):
+    """
+    Gas per confirmation / delivering confirmation / early return, for K adapters and R required confirmations
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    portal = ReceiverPortalMock.deploy({"from": owner})
+    benchmark = QuorumBenchmark(cross_chain_controller, owner, portal)
+    results = benchmark.run(adapter_counts=[1, 2, 3], confirmations=[1, 2, 3], samples=2)
+    write_csv(str(tmp_path / "quorum.csv"), results)
+
+    assert [(r.adapters, r.required_confirmations) for r in results] == [(1, 1), (2, 1), (2, 2), (3, 1), (3, 2), (3, 3)]
+    # every envelope is delivered exactly once
+    assert portal.messagesReceived() == 2 * len(results)
+    for result in results:
+        assert all(len(calls) == result.adapters for calls in result.calls)
+        assert (result.confirmation_gas is None) == (result.required_confirmations == 1)
+        assert (result.early_return_gas is None) == (result.required_confirmations == result.adapters)
+        if result.early_return_gas is not None:
+            assert result.early_return_gas < result.delivering_gas
+    # returning early doesn't depend on the quorum
+    assert len({r.early_return_gas for r in results if r.early_return_gas is not None}) == 1
+
+    envelope_state = cross_chain_controller.getEnvelopeState['bytes32'](
+        Envelope(1, benchmark.origin_sender, portal, 30_005, chain.id, benchmark.message).get_id()
+    )
+    assert envelope_state == constants.EnvelopeState["Delivered"]
+
+
+@pytest.mark.slow
+def test_receive_cross_chain_message_quorum_grid_large(setup_protocol, owner, ReceiverPortalMock, tmp_path):
+    """
+    Quorum grid up to 32 adapters
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    portal = ReceiverPortalMock.deploy({"from": owner})
+    benchmark = QuorumBenchmark(cross_chain_controller, owner, portal)
+    results = benchmark.run(adapter_counts=[1, 2, 4, 8, 16, 32], confirmations=[1, 2, 4, 8, 16, 32], samples=3)
+    write_csv(str(tmp_path / "quorum.csv"), results)
+    assert portal.messagesReceived() == 3 * len(results)
+
+
+def test_envelope_index(setup_protocol, owner, bridge_adapter, alice, carol, ReceiverPortalMock, MainnetChainIds, constants, tmp_path):
+    """
+    The SQLite envelope index follows the envelope states from the events, incrementally
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    destination = setup_protocol["destination_chain_bridge_adapter"]
+    portal = ReceiverPortalMock.deploy({"from": owner})
+    reverting_portal = ReceiverPortalMock.deploy({"from": owner})
+    reverting_portal.setToRevert(True, {"from": owner})
+    # 2 confirmations required: bridge_adapter and alice
+    cross_chain_controller.allowReceiverBridgeAdapters([[alice, [chain.id]]], {"from": owner})
+    cross_chain_controller.updateConfirmations([[chain.id, 2]], {"from": owner})
+
+    index = envelope_index.EnvelopeIndex(str(tmp_path / "envelopes.sqlite"))
+    index.add_source(chain.id, web3, cross_chain_controller.address, from_block=chain.height + 1)
+
+    def receive(nonce, target, adapters):
+        envelope = Envelope(nonce, carol, target, chain.id, chain.id, b"test message")
+        transaction = Transaction(nonce, envelope.to_bytes())
+        for adapter in adapters:
+            cross_chain_controller.receiveCrossChainMessage(transaction.to_bytes(), chain.id, {"from": adapter})
+        return envelope.get_id(), transaction.get_id()
+
+    # forwarded to polygon, never received
+    tx = cross_chain_controller.forwardMessage(MainnetChainIds.POLYGON, destination, 2000, b"test message", {"from": carol})
+    forwarded = bytes.fromhex(tx.events["EnvelopeRegistered"]["envelopeId"][2:])
+    forwarded_transaction = bytes.fromhex(tx.events["TransactionForwardingAttempted"]["transactionId"][2:])
+    receiving, _ = receive(100, portal, [bridge_adapter])
+
+    # EnvelopeRegistered, TransactionForwardingAttempted, TransactionReceived
+    assert index.sync() == 3
+    assert index.checkpoint(chain.id, cross_chain_controller.address) == chain.height
+    assert index.counts() == {"REGISTERED": 1, "RECEIVING": 1, "CONFIRMED": 0, "DELIVERED": 0}
+
+    delivered, delivered_transaction = receive(101, portal, [bridge_adapter, alice])
+    confirmed, _ = receive(102, reverting_portal, [bridge_adapter, alice])
+    # the second sync only reads the new blocks
+    assert index.sync(step=1) == 2 + 1 + 2 + 1
+    assert index.checkpoint(chain.id, cross_chain_controller.address) == chain.height
+
+    #Validation
+    assert index.state(forwarded) == envelope_index.REGISTERED
+    assert index.state(receiving) == envelope_index.RECEIVING
+    assert index.state(confirmed) == envelope_index.CONFIRMED
+    assert index.state(delivered) == envelope_index.DELIVERED
+    assert index.counts() == {"REGISTERED": 1, "RECEIVING": 1, "CONFIRMED": 1, "DELIVERED": 1}
+    assert {bytes(row["envelope_id"]) for row in index.stuck()} == {forwarded, receiving, confirmed}
+    # the forwarded envelope is too recent, the ones never registered here have no age and are always reported
+    assert {bytes(row["envelope_id"]) for row in index.stuck(min_age_blocks=chain.height)} == {receiving, confirmed}
+    assert [bytes(row["envelope_id"]) for row in index.confirmed_undelivered()] == [confirmed]
+
+    row = index.envelope(delivered)
+    assert row["nonce"] == "101"
+    assert row["origin"] == carol.address.lower()
+    assert row["destination"] == portal.address.lower()
+    assert row["confirmations"] == 2
+    assert row["delivery_attempts"] == 1
+    assert index.receipts(delivered_transaction) == {bridge_adapter.address.lower(): 1, alice.address.lower(): 2}
+
+    forwardings = index.forwardings(forwarded_transaction)
+    assert len(forwardings) == 1
+    assert forwardings[0]["destination_chain_id"] == MainnetChainIds.POLYGON
+    assert forwardings[0]["bridge_adapter"] == setup_protocol["current_chain_bridge_adapter"].address.lower()
+    assert forwardings[0]["successful"] == 1
+
+    # the index agrees with the controller
+    for envelope_id, state in [(receiving, "None"), (confirmed, "Confirmed"), (delivered, "Delivered")]:
+        assert cross_chain_controller.getEnvelopeState['bytes32'](envelope_id) == constants.EnvelopeState[state]
+
+    # resuming from the checkpoint, with a new connection
+    index.close()
+    index = envelope_index.EnvelopeIndex(str(tmp_path / "envelopes.sqlite"))
+    index.add_source(chain.id, web3, cross_chain_controller.address)
+    assert index.sync() == 0
+    assert index.counts()["DELIVERED"] == 1
+
+
+def test_sweep_confirmed_envelopes(setup_protocol, owner, bridge_adapter, alice, carol, ReceiverPortalMock, constants):
+    """
+    The sweeper finds the `Confirmed` envelopes and delivers the ones whose destination accepts them now
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    portal = ReceiverPortalMock.deploy({"from": owner})
+    broken_portal = ReceiverPortalMock.deploy({"from": owner})
+    portal.setToRevert(True, {"from": owner})
+    broken_portal.setToRevert(True, {"from": owner})
+    from_block = chain.height + 1
+
+    envelopes = []
+    for nonce in range(12):
+        # 1 confirmation is required, every delivery reverts
+        envelope = Envelope(nonce, carol, portal if nonce < 9 else broken_portal, chain.id, chain.id, b"sweep %d" % nonce)
+        envelopes.append(envelope)
+        encoded_transaction = Transaction(nonce, envelope.to_bytes()).to_bytes()
+        cross_chain_controller.receiveCrossChainMessage(encoded_transaction, chain.id, {"from": bridge_adapter})
+    portal.setToRevert(False, {"from": owner})
+    # delivered by hand, no longer `Confirmed`
+    cross_chain_controller.deliverEnvelope(envelopes[0], {"from": alice})
+
+    confirmed = envelope_sweeper.confirmed_envelopes(web3, cross_chain_controller.address, from_block)
+    assert list(confirmed) == [envelope.get_id() for envelope in envelopes[1:]]
+    assert list(confirmed.values()) == envelopes[1:]
+    index = envelope_index.EnvelopeIndex()
+    index.add_source(chain.id, web3, cross_chain_controller.address, from_block=from_block)
+    index.sync()
+    assert envelope_sweeper.from_index(index) == confirmed
+
+    sweeper = envelope_sweeper.Sweeper(
+        web3.provider.endpoint_uri, cross_chain_controller.address, alice.address, batch_size=3, max_in_flight=6
+    )
+    report = asyncio.run(sweeper.sweep(confirmed))
+
+    #Validation
+    assert report.found == 11
+    assert report.deliverable == report.submitted == report.delivered == 8
+    assert report.failed == 0
+    assert report.still_stuck == 3
+    assert set(report.stuck) == {envelope.get_id() for envelope in envelopes[9:]}
+    assert portal.messagesReceived() == 9
+    assert broken_portal.messagesReceived() == 0
+    for envelope in envelopes:
+        state = "Delivered" if envelope.destination == portal.address else "Confirmed"
+        assert cross_chain_controller.getEnvelopeState['bytes32'](envelope.get_id()) == constants.EnvelopeState[state]
+    assert list(envelope_sweeper.confirmed_envelopes(web3, cross_chain_controller.address, from_block)) == list(
+        report.stuck
+    )
+
+
+def test_invalidation_analyzer(setup_protocol, owner, bridge_adapter, alice, carol, ReceiverPortalMock):
+    """
+    The analyzer lists the in-flight transactions a new validity timestamp strands, and the controller agrees
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    portal = ReceiverPortalMock.deploy({"from": owner})
+    # 2 confirmations required: bridge_adapter and alice
+    cross_chain_controller.allowReceiverBridgeAdapters([[alice, [chain.id]]], {"from": owner})
+    cross_chain_controller.updateConfirmations([[chain.id, 2]], {"from": owner})
+    index = invalidation_analyzer.InvalidationIndex()
+    index.add_source(chain.id, web3, cross_chain_controller.address, from_block=chain.height + 1)
+
+    def receive(nonce, adapters):
+        envelope = Envelope(nonce, carol, portal, chain.id, chain.id, b"invalidation %d" % nonce)
+        transaction = Transaction(nonce, envelope.to_bytes())
+        for adapter in adapters:
+            tx = cross_chain_controller.receiveCrossChainMessage(transaction.to_bytes(), chain.id, {"from": adapter})
+        chain.sleep(10)
+        return envelope.get_id(), transaction, tx.timestamp
+
+    delivered, _, _ = receive(0, [bridge_adapter, alice])
+    first, first_transaction, _ = receive(1, [bridge_adapter])
+    second, second_transaction, proposed = receive(2, [bridge_adapter])
+    third, third_transaction, _ = receive(3, [bridge_adapter])
+    index.sync()
+
+    #Validation
+    for transaction in [first_transaction, second_transaction, third_transaction]:
+        state = cross_chain_controller.getTransactionState['bytes32'](transaction.get_id())
+        assert index.first_bridged_at(chain.id, transaction.get_id()) == state[1]  # firstBridgedAt
+    assert any("first_bridged_by_time" in step for step in index.query_plan())
+    invalidation = index.analyze(chain.id, {chain.id: proposed})[chain.id]
+    assert invalidation.current == 0
+    assert [t.transaction_id for t in invalidation.transactions] == [
+        first_transaction.get_id(),
+        second_transaction.get_id(),
+    ]
+    assert invalidation.envelopes == [first, second]
+
+    # the second adapter only confirms the transaction that was not stranded
+    cross_chain_controller.updateMessagesValidityTimestamp([[chain.id, proposed]], {"from": owner})
+    for transaction in [first_transaction, second_transaction, third_transaction]:
+        tx = cross_chain_controller.receiveCrossChainMessage(transaction.to_bytes(), chain.id, {"from": alice})
+        assert ("TransactionReceived" in tx.events) == (transaction == third_transaction)
+    assert portal.messagesReceived() == 2
+    index.sync()
+    assert index.validity_timestamp(chain.id, chain.id) == proposed
+    assert index.state(third) == envelope_index.DELIVERED
+    # already stranded transactions are not counted again
+    assert index.analyze(chain.id, {chain.id: chain[-1].timestamp})[chain.id].transactions == []
+    with pytest.raises(ValueError):
+        index.stranded(chain.id, chain.id, proposed)
+
+
+def test_endpoint_stand_ins(setup_protocol, owner, alice, carol, constants, tmp_path):
+    """
+    LayerZero, CCIP and Hyperlane adapters forward and receive through the local endpoint stand-ins
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    load = endpoint_load.EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+    results = []
+    for name, route in load.routes.items():
+        small = load.forward(name, 2, message_size=32)
+        large = load.forward(name, 2, message_size=1024, gas_limit=300_000)
+        received = load.receive(name, 5, batch_size=2)
+        results += [small, large, received]
+
+        # every message id is the one computed offline, and the fees are the quoted ones
+        for result, gas_limit in [(small, endpoint_load.DEFAULT_GAS_LIMIT), (large, 300_000)]:
+            assert result.successful == 2
+            assert result.id_mismatches == 0
+            envelope = Envelope(0, carol, load.portal, chain.id, route.destination_chain_id, bytes(result.message_size))
+            payload_size = len(Transaction(0, envelope.to_bytes()).to_bytes())
+            assert result.fees == [endpoint_load.quote(route.fees, payload_size, gas_limit)] * 2
+        assert route.fee_collector.feesCollected() == small.total_fees + large.total_fees
+        assert received.successful == 5
+        assert len(received.gas) == 3
+    endpoint_load.write_csv(str(tmp_path / "endpoint_load.csv"), results)
+
+    # CCIP fees are paid in LINK, the other ones in native
+    ccip = load.routes["ccip"]
+    assert load.link.balanceOf(ccip.fee_collector) == ccip.fee_collector.feesCollected()
+    assert cross_chain_controller.balance() == endpoint_load.CONTROLLER_FUNDS - sum(
+        r.total_fees for r in results if r.route != "ccip"
+    )
+
+    #Validation
+    assert load.portal.messagesReceived() == 3 * 5
+    envelope = Envelope(0, load.remote, load.portal, endpoint_load.ETHEREUM, chain.id, bytes(range(128)))
+    assert cross_chain_controller.getEnvelopeState['bytes32'](envelope.get_id()) == constants.EnvelopeState["Delivered"]
+
+    # an untrusted remote is rejected by every adapter, without failing the batch
+    for name in load.routes:
+        rejected = load.receive(name, 2, batch_size=2, remote=alice.address)
+        assert rejected.successful == 0
+    assert load.portal.messagesReceived() == 3 * 5
+
+
+@pytest.mark.slow
+def test_endpoint_stand_ins_load(setup_protocol, owner, carol, tmp_path):
+    """
+    200 messages per adapter, message sizes of 128 bytes and 4 KiB, batches of 1, 10 and 50
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    load = endpoint_load.EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+    results = load.run(200, message_sizes=[128, 4096], batch_sizes=[1, 10, 50])
+    endpoint_load.write_csv(str(tmp_path / "endpoint_load.csv"), results)
+    assert all(result.successful == result.messages for result in results)
+    assert all(result.id_mismatches == 0 for result in results)
+
+
+def test_forward_cost_model(setup_protocol, owner, carol, Empty, tmp_path):
+    """
+    The per-adapter cost model predicts the gas and fees of a fan-out to all the adapters
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    load = endpoint_load.EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+    avalanche = 43114
+    destinations = {name: (avalanche,) for name in load.routes}
+    costs = forward_costs.ForwardCosts(load, Empty, destinations=destinations)
+    measurements = costs.run(message_sizes=[0, 512, 2048], gas_limits=[200_000, 400_000])
+    models = forward_costs.fit(measurements)
+    forward_costs.write_csv(str(tmp_path / "costs.csv"), measurements)
+    forward_costs.write_models(str(tmp_path / "models.csv"), models)
+    table = forward_costs.fee_table(models, message_sizes=[0, 1024, 4096])
+    forward_costs.write_table(str(tmp_path / "table.csv"), table)
+
+    assert len(measurements) == 4 * 3 * 2
+    assert set(models) == {
+        (adapter, avalanche, gas_limit) for adapter in ["forwarder", *load.routes] for gas_limit in [200_000, 400_000]
+    }
+    assert len(table) == 3 * 2 * 3
+    # every adapter costs something on top of the forwarder, and larger messages cost more
+    for adapter, _, gas_limit, message_size, gas, marginal_gas, fee, fee_token in table:
+        assert marginal_gas > 0
+        assert fee > 0
+        assert fee_token == load.routes[adapter].fee_token
+    for measurement in measurements:
+        if measurement.adapter != "forwarder":
+            route = load.routes[measurement.adapter]
+            envelope = Envelope(0, carol, load.portal, chain.id, avalanche, bytes(measurement.message_size))
+            payload_size = len(Transaction(0, envelope.to_bytes()).to_bytes())
+            quote = endpoint_load.quote(route.fees, payload_size, measurement.gas_limit)
+            assert measurement.fee == pytest.approx(quote, rel=1e-12)
+
+    # the real fan-out, every adapter enabled for avalanche
+    cross_chain_controller.enableBridgeAdapters(
+        [(route.adapter, load.destination_adapter, avalanche) for route in load.routes.values()], {"from": owner}
+    )
+    message = bytes(range(256)) * 4
+    cross_chain_controller.forwardMessage(avalanche, load.portal, 200_000, message, {"from": carol})
+    native = cross_chain_controller.balance()
+    link = load.link.balanceOf(cross_chain_controller)
+    tx = cross_chain_controller.forwardMessage(avalanche, load.portal, 200_000, message, {"from": carol})
+    assert len(tx.events["TransactionForwardingAttempted"]) == 3
+
+    #Validation
+    gas, fees = forward_costs.predict_fanout(models, list(load.routes), avalanche, len(message), 200_000)
+    assert abs(gas - tx.gas_used) / tx.gas_used < 0.03
+    assert fees["native"] == pytest.approx(native - cross_chain_controller.balance(), rel=1e-9)
+    assert fees["LINK"] == pytest.approx(link - load.link.balanceOf(cross_chain_controller), rel=1e-9)
+
+
+@pytest.mark.slow
+def test_forward_cost_model_grid(setup_protocol, owner, carol, Empty, tmp_path):
+    """
+    Cost model of every adapter and destination, messages up to 16 KiB, two destination gas limits
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    load = endpoint_load.EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+    costs = forward_costs.ForwardCosts(load, Empty)
+    measurements = costs.run(message_sizes=[0, 256, 1024, 4096, 16384], gas_limits=[200_000, 500_000])
+    models = forward_costs.fit(measurements)
+    forward_costs.write_csv(str(tmp_path / "forward_costs.csv"), measurements)
+    forward_costs.write_models(str(tmp_path / "forward_cost_models.csv"), models)
+    table = forward_costs.fee_table(models, message_sizes=range(0, 16385, 1024))
+    forward_costs.write_table(str(tmp_path / "forward_fee_table.csv"), table)
+    for adapter, _, gas_limit, message_size, gas, marginal_gas, fee, fee_token in table:
+        assert marginal_gas > 0
+        assert fee > 0
+
+
+def test_message_size_scaling(setup_protocol, owner, carol, Empty):
+    """
+    Gas, calldata and log sizes of the forward / receive pipeline grow with the message size
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    load = endpoint_load.EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+    scaling = message_scaling.MessageScaling(load, Empty)
+    sizes = [0, 1024, 4096]
+    results = scaling.run(message_sizes=sizes)
+
+    #Validation
+    # the bridge routes both ways, the forwarder and direct baselines one way each
+    assert len(results) == (len(load.routes) * 2 + 2) * len(sizes)
+    baselines = {(m.route, m.direction) for m in results if m.route not in load.routes}
+    assert baselines == {(message_scaling.FORWARDER, "forward"), (message_scaling.DIRECT, "receive")}
+    assert all(measurement.successful for measurement in results), [m for m in results if not m.successful]
+    for key, points in message_scaling.series(results, "calldata_size").items():
+        # the message is in the calldata, once at least
+        assert points[-1][1] - points[0][1] >= sizes[-1], key
+    for (route, direction), points in message_scaling.series(results, "log_size").items():
+        if direction == "forward":
+            # the encoded transaction is logged by the controller
+            assert points[-1][1] - points[0][1] >= sizes[-1], route
+    for key, points in message_scaling.series(results).items():
+        assert [gas for _, gas in points] == sorted(gas for _, gas in points), key
+    limits = message_scaling.max_payloads(results)
+    layer_zero = limits["layer_zero"]
+    # 10,000 bytes of payload, less the 384 bytes of encoding, rounded down to a word
+    assert layer_zero.protocol == 9600
+    # 4 KiB messages are far below the block gas budget and the protocol limit: the sweep is the bound
+    assert layer_zero.gas_budget > sizes[-1]
+    assert layer_zero.practical == 4096
+    assert limits[message_scaling.FORWARDER].measured == 4096
+    assert limits[message_scaling.DIRECT].measured == 4096
+
+
+@pytest.mark.slow
+def test_message_size_scaling_sweep(setup_protocol, owner, carol, Empty, tmp_path):
+    """
+    Message sizes from 0 to 128 KiB, every route, both directions
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    project = brownie.project.get_loaded_projects()[0]
+    load = endpoint_load.EndpointLoad.setup(cross_chain_controller, owner, carol, project)
+    scaling = message_scaling.MessageScaling(load, Empty)
+    results = scaling.run(message_sizes=message_scaling.DEFAULT_SIZES)
+    message_scaling.write_csv(str(tmp_path / "message_scaling.csv"), results)
+    assert len(results) == (len(load.routes) * 2 + 2) * len(message_scaling.DEFAULT_SIZES)
+    # the protocol limit of LayerZero is well inside the sweep
+    layer_zero = message_scaling.max_payloads(results)["layer_zero"]
+    assert layer_zero.protocol == 9600
+    assert layer_zero.practical <= 9600
+
+
+def test_invariant_monitor(setup_protocol, owner, bridge_adapter, alice, carol, ReceiverPortalMock, invariant_monitor):
+    """
+    The streaming invariant monitor checks forwards, retries, receipts and deliveries as they happen,
+    and flags replayed events
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    current_chain_bridge_adapter = setup_protocol["current_chain_bridge_adapter"]
+    portal = ReceiverPortalMock.deploy({"from": owner})
+    reverting_portal = ReceiverPortalMock.deploy({"from": owner})
+    reverting_portal.setToRevert(True, {"from": owner})
+    # loopback: the transactions forwarded to this chain are received here, by bridge_adapter and alice
+    cross_chain_controller.enableBridgeAdapters([[current_chain_bridge_adapter, bridge_adapter, chain.id]], {"from": owner})
+    cross_chain_controller.allowReceiverBridgeAdapters([[alice, [chain.id]]], {"from": owner})
+    from_block = chain.height + 1
+    invariant_monitor.watch(chain.id, web3, cross_chain_controller.address)
+    # after the start: the monitor follows the change from the stream
+    cross_chain_controller.updateConfirmations([[chain.id, 2]], {"from": owner})
+
+    encoded_transactions = []
+    for target in [portal, portal, reverting_portal]:
+        tx = cross_chain_controller.forwardMessage(chain.id, target, 2000, b"test message", {"from": carol})
+        encoded_transactions.append(tx.events["TransactionForwardingAttempted"]["encodedTransaction"])
+    invariant_monitor.start(interval=0.1)
+    for encoded_transaction in encoded_transactions:
+        for adapter in [bridge_adapter, alice]:
+            cross_chain_controller.receiveCrossChainMessage(encoded_transaction, chain.id, {"from": adapter})
+    cross_chain_controller.retryTransaction(encoded_transactions[0], 2000, [current_chain_bridge_adapter], {"from": owner})
+    reverting_portal.setToRevert(False, {"from": owner})
+    envelope = Transaction.decode(bytes(encoded_transactions[2])).get_envelope()
+    cross_chain_controller.deliverEnvelope(envelope, {"from": alice})
+
+    #Validation
+    assert invariant_monitor.close() == []
+    assert invariant_monitor.checks[stream_invariants.TRANSACTION_NONCE] == 3
+    assert invariant_monitor.checks[stream_invariants.RETRY_FORWARDED] == 1
+    assert invariant_monitor.checks[stream_invariants.ADAPTER_ONCE] == 6
+    assert invariant_monitor.checks[stream_invariants.DELIVERY_QUORUM] == 3
+    assert invariant_monitor.checks[stream_invariants.DELIVERY_CONFIRMED] == 1
+    assert invariant_monitor.checks[stream_invariants.RECEIVED_FORWARDED] == 3
+    # nothing is kept of the transactions of delivered envelopes
+    assert invariant_monitor.in_flight() == 0
+
+    # the same stream with the first receipt and delivery replayed at the end
+    replay = stream_invariants.InvariantMonitor()
+    replay.watch(chain.id, web3, cross_chain_controller.address, from_block=from_block)
+    replay.poll()
+    logs = web3.eth.get_logs({"address": cross_chain_controller.address, "fromBlock": from_block, "toBlock": chain.height})
+    for topic in [stream_invariants.TRANSACTION_RECEIVED, stream_invariants.ENVELOPE_DELIVERY_ATTEMPTED]:
+        replay.observe(chain.id, next(log for log in logs if bytes(log["topics"][0]) == topic))
+    assert {violation.invariant for violation in replay.close()} == {
+        stream_invariants.RECEIPT_AFTER_FINAL,
+        stream_invariants.DELIVERED_ONCE,
+        stream_invariants.DELIVERY_CONFIRMED,
+    }
+
+    # the same stream keeping the ids of the last nonce only: older ones are unchecked, not flagged
+    pruned = stream_invariants.InvariantMonitor(window=1)
+    pruned.watch(chain.id, web3, cross_chain_controller.address, from_block=from_block)
+    assert pruned.close() == []
+    assert pruned.state_size()["registered"] == 1
+    assert pruned.state_size()["forwarded"] == 1
+    assert pruned.unchecked[stream_invariants.RETRY_FORWARDED] == 1
+    assert pruned.checks[stream_invariants.RECEIVED_FORWARDED] == 1
+    assert pruned.unchecked[stream_invariants.RECEIVED_FORWARDED] == 2
+
+
 def test_deliver_envelope(setup_protocol, bridge_adapter, carol, MainnetChainIds, constants, alice):
     """
     Testing `deliverEnvelope()`
@@ -0,0 +1,240 @@
+import asyncio
+import shutil
+
+import brownie
+import pytest
+
+from brownie import (
+    # Brownie helpers
+    accounts,
+    web3,
+    reverts,
+    Wei,
+    chain,
+    Contract,
+)
+
+from multichain import Simulator
+from async_relayer import relay_load
+from native_bridges import NativeBridges, SAME_CHAIN, write_csv
+import fanout
+import stream_invariants
+
+# the simulated chains are separate ganache nodes, next to the one brownie runs the other tests on
+pytestmark = pytest.mark.skipif(shutil.which("ganache") is None, reason="needs the ganache executable")
+
+
+def test_deliver_between_two_chains(MainnetChainIds):
+    """
+    Envelopes forwarded in both directions are relayed and delivered to the receiver portal
+    """
+    with Simulator([MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON], base_port=8600) as simulator:
+        report = simulator.run(envelopes=10, message_size=64, batch_size=4)
+
+        assert report.sent == report.delivered == 10
+        assert report.failed == 0
+        assert len(report.latencies) == 10
+        for chain_id, simulated_chain in simulator.chains.items():
+            portal = simulated_chain.contracts["receiver_portal"]
+            assert portal.functions.messagesReceived().call() == 5
+
+
+def test_deliver_with_quorum_emergency_mode(MainnetChainIds):
+    """
+    With 2 of 3 adapters required, on CrossChainControllerWithEmergencyMode, between three chains
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON, MainnetChainIds.AVALANCHE],
+        adapters_per_route=3,
+        required_confirmations=2,
+        emergency_mode=True,
+        senders=2,
+        base_port=8610,
+    ) as simulator:
+        report = simulator.run(envelopes=12, message_size=300)
+
+        assert report.delivered == 12
+        # every adapter relays, the third confirmation of each envelope returns early
+        assert report.relayed == 3 * 12
+        for simulated_chain in simulator.chains.values():
+            assert simulated_chain.contracts["receiver_portal"].functions.messagesReceived().call() == 4
+
+
+def test_async_relayer(MainnetChainIds):
+    """
+    The asyncio relayer delivers envelopes sent while it runs, with small queues and batches
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON],
+        adapters_per_route=2,
+        required_confirmations=2,
+        base_port=8630,
+    ) as simulator:
+        report, metrics = asyncio.run(
+            relay_load(simulator, envelopes=40, send_batch_size=10, queue_size=8, batch_size=4, max_in_flight=8)
+        )
+
+        assert report.delivered == 40
+        assert metrics.observed == metrics.confirmed == 2 * 40
+        assert metrics.delivered == 40
+        assert metrics.failed == 0
+        assert max(metrics.max_queue_depth.values()) <= 8
+
+
+def test_async_relayer_batch_over_in_flight_limit(MainnetChainIds):
+    """
+    Batches larger than the in-flight limit are capped to it instead of waiting for slots forever
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON],
+        adapters_per_route=2,
+        required_confirmations=2,
+        base_port=8690,
+    ) as simulator:
+        report, metrics = asyncio.run(
+            relay_load(simulator, envelopes=20, send_batch_size=10, batch_size=16, max_in_flight=4, timeout=120)
+        )
+
+        assert report.delivered == 20
+        assert metrics.observed == metrics.confirmed == 2 * 20
+        assert metrics.failed == 0
+        # 40 confirmations in batches of 4 at most
+        assert metrics.batches >= 2 * 20 // 4
+
+
+def test_native_bridge_adapters():
+    """
+    Messages sent through the native bridge adapters are recorded by the bridge stand-ins on Ethereum
+    and delivered once replayed into the paired adapters on the L2 chains
+    """
+    with NativeBridges(base_port=8650) as bridges:
+        results = bridges.run(envelopes=5, message_size=64)
+
+        assert [result.route for result in results] == [SAME_CHAIN] + bridges.routes
+        for result in results:
+            assert result.delivered == 5
+            assert len(result.forward_gas) == 5
+            assert len(result.relay_gas) == (0 if result.route == SAME_CHAIN else 5)
+        for route in bridges.routes:
+            assert bridges.contracts[route]["portal"].functions.messagesReceived().call() == 5
+            # every message is replayed once
+            assert bridges.relayer.relay(route) == []
+        assert bridges.contracts["arbitrum"]["l1_bridge"].functions.ticketsCount().call() == 5
+
+
+@pytest.mark.slow
+def test_native_bridge_adapters_benchmark(tmp_path):
+    """
+    `forwardMessage()` gas and delivery throughput of every native bridge adapter, next to SameChainAdapter
+    """
+    with NativeBridges(base_port=8660, destination_gas_limit=3_000_000) as bridges:
+        results = [result for size in [0, 1024, 16384] for result in bridges.run(envelopes=200, message_size=size)]
+        write_csv(str(tmp_path / "native_bridges.csv"), results)
+        for result in results:
+            assert result.delivered == 200
+
+
+def test_fan_out(MainnetChainIds):
+    """
+    One message to each of D destinations through A adapters, every configuration of the grid delivered
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON, MainnetChainIds.AVALANCHE],
+        adapters_per_route=2,
+        base_port=8670,
+    ) as simulator:
+        fan_out = fanout.FanOut(simulator, MainnetChainIds.ETHEREUM)
+        results = fan_out.run_grid(destination_counts=[1, 2], adapter_counts=[1, 2])
+
+        assert [(result.destinations, result.adapters) for result in results] == [(1, 1), (2, 1), (1, 2), (2, 2)]
+        for result in results:
+            assert result.delivered == result.destinations
+            assert len(result.delivery_seconds) == result.destinations
+            # one EnvelopeRegistered and one TransactionForwardingAttempted per adapter, per destination
+            assert result.origin.transactions == result.destinations
+            assert result.origin.logs == result.destinations * (1 + result.adapters)
+            assert result.enable_gas > 0
+        # the initial forwarders of the simulator are disabled once, then the previous configuration
+        assert results[0].disable_gas > 0
+        assert fan_out.enabled == {adapter: fan_out.destination_chain_ids[:2] for adapter in fan_out.adapters[:2]}
+
+        limits = fanout.scaling_limits(results)
+        assert set(limits) == {1, 2}
+        assert limits[2]["forward_gas_per_destination"] > limits[1]["forward_gas_per_destination"]
+
+
+def test_invariant_monitor_under_load(MainnetChainIds, invariant_monitor):
+    """
+    The streaming invariant monitor follows three chains from a background thread while envelopes
+    are delivered with 2 of 3 adapters required
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON, MainnetChainIds.AVALANCHE],
+        adapters_per_route=3,
+        required_confirmations=2,
+        base_port=8700,
+    ) as simulator:
+        invariant_monitor.watch_simulator(simulator)
+        invariant_monitor.start(interval=0.1)
+        report = simulator.run(envelopes=60, message_size=128, batch_size=10)
+        violations = invariant_monitor.close()
+
+        assert report.delivered == 60
+        assert violations == []
+        # per envelope: EnvelopeRegistered, 3 forwardings, 2 receipts (the third returns early), 1 delivery attempt
+        assert invariant_monitor.events == 60 * 7
+        assert invariant_monitor.checks[stream_invariants.DELIVERY_QUORUM] == 60
+        assert invariant_monitor.checks[stream_invariants.RECEIVED_FORWARDED] == 60
+        assert invariant_monitor.in_flight() == 0
+
+
+@pytest.mark.slow
+def test_fan_out_scaling(MainnetChainIds, tmp_path):
+    """
+    Gas, event volume and delivery time of a fan-out to up to 12 destinations with up to 4 adapters each
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM] + fanout.DESTINATION_CHAIN_IDS,
+        adapters_per_route=4,
+        base_port=8680,
+    ) as simulator:
+        fan_out = fanout.FanOut(simulator, MainnetChainIds.ETHEREUM)
+        results = fan_out.run_grid(destination_counts=[1, 2, 4, 8, 12], adapter_counts=[1, 2, 4])
+        fanout.write_csv(str(tmp_path / "fanout.csv"), results)
+        for result in results:
+            assert result.delivered == result.destinations
+        limits = fanout.scaling_limits(results)
+        assert set(limits) == {1, 2, 4}
+        assert limits[4]["forward_gas_per_destination"] > limits[1]["forward_gas_per_destination"]
+
+
+@pytest.mark.slow
+def test_delivery_throughput(MainnetChainIds):
+    """
+    End-to-end latency and envelopes per second between four chains
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON, MainnetChainIds.AVALANCHE, MainnetChainIds.ARBITRUM],
+        adapters_per_route=2,
+        required_confirmations=2,
+        senders=4,
+        base_port=8620,
+    ) as simulator:
+        report = simulator.run(envelopes=1200, message_size=128, batch_size=100)
+        assert report.delivered == 1200
+
+
+@pytest.mark.slow
+def test_async_relayer_throughput(MainnetChainIds):
+    """
+    Sustained load through the asyncio relayer between four chains
+    """
+    with Simulator(
+        [MainnetChainIds.ETHEREUM, MainnetChainIds.POLYGON, MainnetChainIds.AVALANCHE, MainnetChainIds.ARBITRUM],
+        adapters_per_route=2,
+        required_confirmations=2,
+        senders=4,
+        base_port=8640,
+    ) as simulator:
+        report, metrics = asyncio.run(relay_load(simulator, envelopes=5000, batch_size=100))
+        assert report.delivered == 5000
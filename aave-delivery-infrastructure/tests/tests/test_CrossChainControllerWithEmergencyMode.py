@@ -12,6 +12,7 @@ from brownie import (
 )
 
 from eth_abi import encode_abi, encode_single
+import emergency_stress
 
 def test_basic(setup_protocol):
     """
@@ -247,6 +248,58 @@ def test_solve_emergency_not_in_emergency(setup_protocol, guardian, alice, carol
         )
 
 
+def test_emergency_stress(setup_protocol, owner, guardian, Empty):
+    """
+    Testing repeated emergencies solved with batches of every category, service restored after each one
+    """
+    cross_chain_controller_emergency_mode = setup_protocol["cross_chain_controller_emergency_mode"]
+    cl_emergency_oracle = setup_protocol["cl_emergency_oracle"]
+    stress = emergency_stress.EmergencyStress(
+        cross_chain_controller_emergency_mode, cl_emergency_oracle, guardian, owner, Empty
+    )
+    stress.setup(max_batch_size=4)
+    results = stress.run(batch_sizes=[1, 4], rounds=2)
+
+    # Validation
+    assert len(results) == len(emergency_stress.CATEGORIES) * 2 * 2
+    assert all(measurement.solved for measurement in results), [m for m in results if not m.solved]
+    assert cross_chain_controller_emergency_mode.getEmergencyCount() == len(results)
+    for chain_id in stress.chain_ids:
+        configuration = cross_chain_controller_emergency_mode.getConfigurationByChain(chain_id)
+        assert configuration[0] == stress.confirmations[chain_id]  # requiredConfirmation
+        assert configuration[1] == stress.validity[chain_id]  # validityTimestamp
+        adapters = cross_chain_controller_emergency_mode.getReceiverBridgeAdaptersByChain(chain_id)
+        assert set(adapters) == {stress.anchor.address, str(stress.receivers[chain_id])}
+        forwarders = cross_chain_controller_emergency_mode.getForwarderBridgeAdaptersByChain(chain_id)
+        assert stress.forwarders[chain_id].address in [config[1] for config in forwarders]
+    for sender in stress.senders:
+        assert cross_chain_controller_emergency_mode.isSenderApproved(sender) is True
+    models = emergency_stress.fit(results)
+    for category in emergency_stress.CATEGORIES:
+        (a, b, c), _ = models[category]
+        assert b > 0  # every change of the batch costs gas
+
+
+@pytest.mark.slow
+def test_emergency_stress_large_batches(setup_protocol, owner, guardian, Empty, tmp_path):
+    """
+    Emergencies solved with batches of up to 256 changes per category
+    """
+    cross_chain_controller_emergency_mode = setup_protocol["cross_chain_controller_emergency_mode"]
+    cl_emergency_oracle = setup_protocol["cl_emergency_oracle"]
+    stress = emergency_stress.EmergencyStress(
+        cross_chain_controller_emergency_mode, cl_emergency_oracle, guardian, owner, Empty
+    )
+    stress.setup(max_batch_size=256)
+    results = stress.run(batch_sizes=[1, 16, 64, 128, 256], rounds=2)
+    emergency_stress.write_csv(str(tmp_path / "emergency_stress.csv"), results)
+    assert len(results) == len(emergency_stress.CATEGORIES) * 5 * 2
+    for (a, b, c), _ in emergency_stress.fit(results).values():
+        assert b > 0
+    for mean, worst in emergency_stress.restore_times(results).values():
+        assert 0 <= mean <= worst
+
+
 def test_emergency_token_transfer(setup_protocol, owner, deploy_usdt, alice):
     """
     Testing emergencyTokenTransfer()
@@ -0,0 +1,164 @@
+import brownie
+import pytest
+
+from brownie import (
+    # Brownie helpers
+    accounts,
+    web3,
+    reverts,
+    Wei,
+    chain,
+    Contract,
+)
+
+from eth_abi import encode_abi, encode_single
+from encoding_utils import (
+    Envelope,
+    Transaction,
+    benchmark,
+)
+import id_batch
+from encoding_fuzz import EncodingFuzzer
+
+
+@pytest.fixture(scope="module")
+def encoding_utils_mock(owner, EncodingUtilsMock):
+    return EncodingUtilsMock.deploy({"from": owner})
+
+
+def forward(setup_protocol, carol, MainnetChainIds, message):
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    destination = setup_protocol["destination_chain_bridge_adapter"]
+    tx = cross_chain_controller.forwardMessage(
+        MainnetChainIds.POLYGON, destination, 2000, message, {"from": carol}
+    )
+    envelope = Envelope(0, carol, destination, chain.id, MainnetChainIds.POLYGON, message)
+    return tx, envelope
+
+
+def test_matches_forward_message(setup_protocol, carol, MainnetChainIds):
+    """
+    Envelope and transaction encodings / ids match the ones computed by `forwardMessage()`
+    """
+    tx, envelope = forward(setup_protocol, carol, MainnetChainIds, b"test message")
+    encoded_envelope = envelope.encode()
+    encoded_transaction = Transaction(0, encoded_envelope.data).encode()
+
+    # same as the hand built encodings used in the other tests
+    assert encoded_envelope.data == encode_single(
+        "((uint256,address,address,uint256,uint256,bytes))", [list(envelope)]
+    )
+    assert encoded_envelope.id == web3.keccak(encoded_envelope.data)
+
+    assert tx.return_value[0] == "0x" + encoded_envelope.id.hex()
+    assert tx.return_value[1] == "0x" + encoded_transaction.id.hex()
+    event = tx.events["TransactionForwardingAttempted"]
+    assert event["envelopeId"] == "0x" + encoded_envelope.id.hex()
+    assert event["transactionId"] == "0x" + encoded_transaction.id.hex()
+    assert event["encodedTransaction"].hex() == "0x" + encoded_transaction.data.hex()
+
+
+@pytest.mark.parametrize("message", [b"", b"\x00", bytes(32), bytes(range(256)) * 4 + b"\x01"])
+def test_matches_forward_message_message_sizes(setup_protocol, carol, MainnetChainIds, message):
+    """
+    Messages which are empty or not a multiple of 32 bytes (no or partial padding word)
+    """
+    tx, envelope = forward(setup_protocol, carol, MainnetChainIds, message)
+    encoded_envelope = envelope.encode()
+    encoded_transaction = Transaction(0, encoded_envelope.data).encode()
+
+    assert tx.return_value[0] == "0x" + encoded_envelope.id.hex()
+    assert tx.return_value[1] == "0x" + encoded_transaction.id.hex()
+    assert tx.events["TransactionForwardingAttempted"]["encodedTransaction"].hex() == "0x" + encoded_transaction.data.hex()
+
+
+def test_decode(carol, bob):
+    """
+    `decode()` is the inverse of `encode()`, for envelopes and transactions
+    """
+    envelope = Envelope(2**256 - 1, carol, bob, 1, 2**256 - 1, b"test message")
+    transaction = Transaction(7, envelope.to_bytes())
+
+    decoded = Transaction.decode(transaction.to_bytes())
+    assert decoded == transaction
+    assert decoded.get_envelope() == envelope
+    assert decoded.get_envelope_id() == envelope.get_id()
+    assert list(Envelope.decode(envelope.to_bytes())) == [2**256 - 1, carol.address, bob.address, 1, 2**256 - 1, b"test message"]
+
+
+def test_decode_malformed(carol, bob):
+    """
+    `decode()` rejects what `abi.decode` would revert on
+    """
+    data = bytearray(Envelope(0, carol, bob, 1, 137, b"test message").to_bytes())
+
+    # truncated message
+    with pytest.raises(ValueError):
+        Envelope.decode(data[:-32])
+    # dirty upper bits in the origin address
+    dirty = bytearray(data)
+    dirty[0x40] = 1
+    with pytest.raises(ValueError):
+        Envelope.decode(dirty)
+    # tuple offset out of bounds
+    with pytest.raises(ValueError):
+        Envelope.decode(b"\xff" * 32 + bytes(data[32:]))
+
+
+def test_id_batch_matches_forward_message(setup_protocol, carol, MainnetChainIds, tmp_path):
+    """
+    Batch generated ids (process pool and file) match consecutive `forwardMessage()` calls
+    """
+    cross_chain_controller = setup_protocol["cross_chain_controller"]
+    destination = setup_protocol["destination_chain_bridge_adapter"]
+    messages = [b"message %d" % i for i in range(5)]
+    return_values = [
+        cross_chain_controller.forwardMessage(
+            MainnetChainIds.POLYGON, destination, 2000, message, {"from": carol}
+        ).return_value
+        for message in messages
+    ]
+
+    columns = (range(5), carol, destination, chain.id, MainnetChainIds.POLYGON, messages)
+    batch = id_batch.generate(*columns, workers=2, chunk_size=2)
+    # a generator is a column, not a single value
+    streamed = columns[:-1] + ((message for message in messages),)
+    assert id_batch.generate(*streamed, workers=1).envelope_ids == batch.envelope_ids
+    path = str(tmp_path / "ids.bin")
+    assert id_batch.write(path, *columns, workers=1, chunk_size=3) == 5
+    ids = id_batch.IdFile(path)
+
+    for i, (envelope_id, transaction_id) in enumerate(return_values):
+        assert envelope_id == "0x" + batch.envelope_id(i).hex()
+        assert transaction_id == "0x" + batch.transaction_id(i).hex()
+        assert ids.envelope_id(i) == batch.envelope_id(i)
+        assert ids.index_of_transaction(batch.transaction_id(i)) == i
+
+
+def test_differential_fuzz(encoding_utils_mock):
+    """
+    Python and on-chain encodings / decodings / ids agree on random envelopes
+    """
+    fuzzer = EncodingFuzzer(encoding_utils_mock, seed=0, max_message_size=4096)
+    report = fuzzer.run(cases=500, batch_size=50)
+    assert report.cases == 500
+    assert report.mismatches == []
+
+
+@pytest.mark.slow
+def test_differential_fuzz_large(encoding_utils_mock):
+    """
+    Many thousands of random envelopes, including messages up to 64 KiB
+    """
+    fuzzer = EncodingFuzzer(encoding_utils_mock, seed=1)
+    report = fuzzer.run(cases=20_000, batch_size=200)
+    assert report.mismatches == []
+
+
+@pytest.mark.slow
+def test_benchmark_id_throughput():
+    """
+    Envelope / transaction ids computed per second
+    """
+    rates = benchmark(count=200_000, message_size=128)
+    assert rates["envelope_ids"] > 0 and rates["transaction_ids"] > 0
@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 import types
 from typing import Dict, Tuple
 import time
@@ -11,6 +12,12 @@ from brownie import Contract
 from eth_abi import encode_single, encode_abi
 from eth_abi.packed import encode_abi_packed, encode_single_packed
 
+# modules shared by the test suites: tools/ at the repository root (/tools in the Docker image)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "..", "tools"))
+import fixture_reuse
+from account_pool import AccountPool
+from tx_pipeline import TxPipeline, load_compiled
+
 # Type aliases
 # includes ProjectContract and Contract instances
 CONTRACT_INSTANCE = brownie.network.contract._DeployedContractBase
@@ -18,6 +25,16 @@ NAME_WITH_INSTANCE = Tuple[str, CONTRACT_INSTANCE]
 NAME_TO_INSTANCE = Dict[str, CONTRACT_INSTANCE]
 
 
+@pytest.fixture(scope="module")
+def module_isolation(request):
+    """
+    Overrides brownie's `module_isolation`: resets ganache before and after each module, or,
+    with --reuse-fixtures, before and after each group of modules sharing the same module fixtures.
+    """
+    plugin = request.config.pluginmanager.get_plugin("fixture_reuse")
+    yield from plugin.module_isolation(request.node.nodeid)
+
+
 @pytest.fixture(scope="module", autouse=True)
 def mod_isolation(module_isolation):
     """Snapshot ganache at start of module."""
@@ -72,10 +89,20 @@ def constants():
 
 def pytest_addoption(parser):
     parser.addoption("--runslow", action="store_true", default=False, help="run slow tests")
+    parser.addoption(
+        "--reuse-fixtures",
+        action="store_true",
+        default=False,
+        help="group modules by module fixtures and build them once per group",
+    )
+    parser.addoption(
+        "--fixture-costs", action="store_true", default=False, help="report fixture setup costs"
+    )
 
 
 def pytest_configure(config):
     config.addinivalue_line("markers", "slow: mark test as slow to run")
+    fixture_reuse.register(config)
 
 
 def pytest_collection_modifyitems(config, items):
@@ -124,11 +151,20 @@ def carol(accounts):
     return accounts[4]
 
 
+@pytest.fixture(scope="session")
+def account_pool():
+    """
+    Deterministic pool of pre-derived accounts with known private keys.
+    Use this instead of `accounts.add()` when a test needs extra signers or addresses.
+    """
+    return AccountPool.load()
+
+
 @pytest.fixture(scope="module")
-def dartagnan(accounts):
-    # Add the account so we have the private key
-    accounts.add()
-    return accounts[-1]
+def dartagnan(account_pool, accounts):
+    # Draw an account from the pool so we have the private key, funded so it can also send transactions
+    account_pool.fund([0], 100 * 10**18, funder=accounts[0])
+    return account_pool.account(0)
 
 
 @pytest.fixture(scope="module")
@@ -160,15 +196,7 @@ def build_deployer(file_name, deployer, *args):
     If folder name change is required, modify the folder_path variable.
     """
 
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    folder_path = dir_path + "/../compiled"
-    json_path = folder_path + "/" + file_name
-
-    with open(json_path) as f:
-        data = json.load(f)
-
-    abi = data["abi"]
-    bytecode = data["bytecode"]
+    abi, bytecode = load_compiled(file_name)
 
     web3.eth.default_account = deployer
     contract = web3.eth.contract(abi=abi, bytecode=bytecode)
@@ -227,41 +255,31 @@ def deploy_usdc(owner, proxy_admin_eoa, lost_and_found_addr, constants):
 
     folder_name = "usdc"
 
+    # The implementations and the proxy don't depend on each other's receipts,
+    # submit them back-to-back and wait for all of them at once
+    pipeline = TxPipeline()
+
     # FiatTokenV1
-    file_name = folder_name + "/" + "FiatTokenV1.json"
-    # constructor arguments
-    args = []
-    # deployment
-    fiat_token_v1 = build_deployer(file_name, proxy_admin_eoa, *args)
+    fiat_token_v1 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV1.json", sender=proxy_admin_eoa)
 
     # FiatTokenV1_1
     # Not really used
-    # file_name = folder_name + "/" + "FiatTokenV1_1.json"
-    # # constructor arguments
-    # args = []
-    # # deployment
-    # fiat_token_v1_1 = build_deployer(file_name, proxy_admin_eoa, *args)
+    # fiat_token_v1_1 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV1_1.json", sender=proxy_admin_eoa)
 
     # FiatTokenV2
-    file_name = folder_name + "/" + "FiatTokenV2.json"
-    # constructor arguments
-    args = []
-    # deployment
-    fiat_token_v2 = build_deployer(file_name, proxy_admin_eoa, *args)
+    fiat_token_v2 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV2.json", sender=proxy_admin_eoa)
 
     # FiatTokenV2_1
-    file_name = folder_name + "/" + "FiatTokenV2_1.json"
-    # constructor arguments
-    args = []
-    # deployment
-    fiat_token_v2_1 = build_deployer(file_name, proxy_admin_eoa, *args)
+    fiat_token_v2_1 = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenV2_1.json", sender=proxy_admin_eoa)
 
-    # FiatTokenProxy
-    file_name = folder_name + "/" + "FiatTokenProxy.json"
-    # constructor arguments
-    args = [fiat_token_v1.address]
-    # deployment
-    proxy = build_deployer(file_name, proxy_admin_eoa, *args)
+    # FiatTokenProxy, constructor argument is the (precomputed) FiatTokenV1 address
+    proxy = pipeline.deploy_compiled(folder_name + "/" + "FiatTokenProxy.json", fiat_token_v1, sender=proxy_admin_eoa)
+
+    pipeline.flush()
+    fiat_token_v1 = fiat_token_v1.contract
+    fiat_token_v2 = fiat_token_v2.contract
+    fiat_token_v2_1 = fiat_token_v2_1.contract
+    proxy = proxy.contract
 
     # implementation V1
     token_name = "USD Coin"
@@ -337,9 +355,14 @@ def contracts(
     weth.deposit({"from": wethdonor, "value": wethdonor.balance()})
 
     # Some of the AAVE addresses used in deployment and as transaction sources
-    message_originator = Empty.deploy({"from": owner})
-    cross_chain_controller = MockCrossChainController.deploy({"from": owner})
-    power_strategy = Empty.deploy({"from": owner})
+    pipeline = TxPipeline()
+    message_originator = pipeline.deploy(Empty, sender=owner)
+    cross_chain_controller = pipeline.deploy(MockCrossChainController, sender=owner)
+    power_strategy = pipeline.deploy(Empty, sender=owner)
+    pipeline.flush()
+    message_originator = message_originator.contract
+    cross_chain_controller = cross_chain_controller.contract
+    power_strategy = power_strategy.contract
 
     contracts = {
         "usdc": usdc,
@@ -359,11 +382,13 @@ def voting_tokens(ERC20Mock, owner):
     Deploy some standard ERC20 tokens as voting tokens
     """
 
-    token_a = ERC20Mock.deploy("TokenA", "TokenA", {"from": owner})
-    token_b = ERC20Mock.deploy("TokenB", "TokenB", {"from": owner})
-    token_c = ERC20Mock.deploy("TokenC", "TokenC", {"from": owner})
+    pipeline = TxPipeline()
+    token_a = pipeline.deploy(ERC20Mock, "TokenA", "TokenA", sender=owner)
+    token_b = pipeline.deploy(ERC20Mock, "TokenB", "TokenB", sender=owner)
+    token_c = pipeline.deploy(ERC20Mock, "TokenC", "TokenC", sender=owner)
+    pipeline.flush()
 
-    voting_tokens = {"TokenA": token_a, "TokenB": token_b, "TokenC": token_c}
+    voting_tokens = {"TokenA": token_a.contract, "TokenB": token_b.contract, "TokenC": token_c.contract}
 
     return voting_tokens
 
@@ -465,29 +490,67 @@ def setup_protocol(
     Deploying contracts and setting up the protocol
     """
     cross_chain_controller = contracts["cross_chain_controller"]
+    message_originator = contracts["message_originator"]
 
-    
-    create3_factory = Create3Factory.deploy({"from": owner})
+    # Contracts whose deployment doesn't depend on another's receipt are submitted
+    # back-to-back, the receipts are collected together
+    pipeline = TxPipeline()
+
+    create3_factory = pipeline.deploy(Create3Factory, sender=owner)
 
     # Deploy 2 executors
-    executor1 = Executor.deploy({"from": owner})
-    executor2 = Executor.deploy({"from": owner})
+    executor1 = pipeline.deploy(Executor, sender=owner)
+    executor2 = pipeline.deploy(Executor, sender=owner)
 
     # Using the factory pattern
-    proxy_factory = TransparentProxyFactory.deploy({"from": owner})
-    # Get our admin contract
-    tx = proxy_factory.createProxyAdmin(owner, {"from": owner})
-    proxy_admin = ProxyAdmin.at(tx.events["ProxyAdminCreated"]["proxyAdmin"])
+    proxy_factory = pipeline.deploy(TransparentProxyFactory, sender=owner)
 
     # Deploy the payload controller
     # This logic contract has a constructor, but all its values are immutable,
     # so will be compiled into bytecode, so will work with the proxy pattern
-    message_originator = contracts["message_originator"]
-    cross_chain_controller = contracts["cross_chain_controller"]
-    payload_controller_logic = PayloadsController.deploy(
-        cross_chain_controller, message_originator, 1, {"from": owner}
+    payload_controller_logic = pipeline.deploy(
+        PayloadsController, cross_chain_controller, message_originator, 1, sender=owner
     )
 
+    # Governance logic
+    governance_logic = pipeline.deploy(
+        Governance, cross_chain_controller, constants.COOLDOWN_PERIOD, sender=owner
+    )
+
+    # Deploy MockPowerStrategy
+    power_strategy_mock = pipeline.deploy(MockPowerStrategy, sender=owner)
+
+    # VotingMachine
+    slot_utils = pipeline.deploy(SlotUtils, sender=owner)
+    data_warehouse = pipeline.deploy(DataWarehouse, sender=owner)
+    voting_strategy = pipeline.deploy(VotingStrategy, data_warehouse, sender=owner)
+
+    # Deploy `GovernancePowerStrategy`
+    governance_power_strategy = pipeline.deploy(GovernancePowerStrategy, sender=owner)
+
+    # Deploy `GovernancePowerDelegationTokenMock`
+    delegation_token_a = pipeline.deploy(GovernancePowerDelegationTokenMock, 1337, 1234, sender=owner)
+    delegation_token_b = pipeline.deploy(GovernancePowerDelegationTokenMock, 5555, 2222, sender=owner)
+    pipeline.flush()
+
+    create3_factory = create3_factory.contract
+    executor1 = executor1.contract
+    executor2 = executor2.contract
+    proxy_factory = proxy_factory.contract
+    payload_controller_logic = payload_controller_logic.contract
+    governance_logic = governance_logic.contract
+    power_strategy_mock = power_strategy_mock.contract
+    slot_utils = slot_utils.contract
+    data_warehouse = data_warehouse.contract
+    voting_strategy = voting_strategy.contract
+    governance_power_strategy = governance_power_strategy.contract
+    delegation_token_a = delegation_token_a.contract
+    delegation_token_b = delegation_token_b.contract
+
+    # Get our admin contract
+    tx = proxy_factory.createProxyAdmin(owner, {"from": owner})
+    proxy_admin = ProxyAdmin.at(tx.events["ProxyAdminCreated"]["proxyAdmin"])
+
     # encode a call to the initialize function
     data = payload_controller_logic.initialize.encode_input(
         owner,  # owner
@@ -523,30 +586,15 @@ def setup_protocol(
     executor2.transferOwnership(payload_controller_proxy, {"from": owner})
     # Deploy the Governance contract
 
-    # Governance logic
-
-    governance_logic = Governance.deploy(
-        cross_chain_controller,
-        constants.COOLDOWN_PERIOD,
-        {"from": owner},
-    )
     # votingConfig
     voting_config_1 = voting_config_level1["voting_config"]
     voting_config_2 = voting_config_level2["voting_config"]
 
-    # Deploy MockPowerStrategy
-    power_strategy_mock = MockPowerStrategy.deploy({"from": owner})
-
     # predicted address of VotingPortal
     voting_portal_address = create3_factory.predictAddress(owner, constants.VOTING_PORTAL_SALT.hex())
     # predicted address of VotingMachine
     voting_machine_address = create3_factory.predictAddress(owner, constants.VOTING_MACHINE_SALT.hex())
 
-    # VotingMachine
-    slot_utils = SlotUtils.deploy({"from": owner})
-    data_warehouse = DataWarehouse.deploy({"from": owner})
-    voting_strategy = VotingStrategy.deploy(data_warehouse, {"from": owner})
-    
     # Deploy VotingMachine Using create3
     code = VotingMachine.bytecode
     # init code in bytes
@@ -662,13 +710,6 @@ def setup_protocol(
         {"from": owner},
     )
     
-    # Deploy `GovernancePowerStrategy`
-    governance_power_strategy = GovernancePowerStrategy.deploy({"from": owner})
-
-    # Deploy `GovernancePowerDelegationTokenMock`
-    delegation_token_a = GovernancePowerDelegationTokenMock.deploy(1337, 1234, {"from": owner})
-    delegation_token_b = GovernancePowerDelegationTokenMock.deploy(5555, 2222, {"from": owner})
-
     # Deploy `GovernancePowerStrategyMock`
     #governance_power_strategy_mock = GovernancePowerStrategyMock.deploy(
     #    delegation_token_a.address, delegation_token_b.address, {"from": owner}
@@ -0,0 +1,110 @@
+"""✅❎⛔
+
+AccountPool:
+generate ✅
+load ✅
+addresses ✅
+fund ✅
+"""
+
+import os
+
+import pytest
+
+from brownie import (
+    # Brownie helpers
+    accounts,
+    web3,
+)
+from eth_keys import keys
+from eth_utils import to_checksum_address
+
+import account_pool
+from account_pool import AccountPool
+
+
+def test_generate_deterministic(tmp_path):
+    """
+    testing `generate()` gives the same file for the same seed, and keys matching the addresses
+    """
+    first, second = str(tmp_path / "first.bin"), str(tmp_path / "second.bin")
+    account_pool.generate(first, size=8, seed=b"seed")
+    account_pool.generate(second, size=8, seed=b"seed")
+    with open(first, "rb") as f, open(second, "rb") as g:
+        assert f.read() == g.read()
+
+    pool = AccountPool(first)
+    assert len(pool) == 8
+    for index in range(8):
+        private_key = account_pool.derive_private_key(b"seed", index)
+        assert pool.private_key(index) == private_key
+        assert pool.address(index) == to_checksum_address(keys.PrivateKey(private_key).public_key.to_canonical_address())
+
+    account_pool.generate(second, size=8, seed=b"other seed")
+    assert AccountPool(second).address(0) != pool.address(0)
+    # no temporary file is left behind
+    assert sorted(os.listdir(tmp_path)) == ["first.bin", "second.bin"]
+
+
+def test_load_reuses_file(tmp_path):
+    """
+    testing `load()` maps an existing pool and only regenerates it for another seed or a larger size
+    """
+    path = str(tmp_path / "pool.bin")
+    pool = AccountPool.load(path, size=8, seed=b"seed")
+    addresses = pool.addresses(8)
+    pool.close()
+    os.utime(path, (0, 0))
+
+    # reloaded from the memory-mapped file, not derived again
+    pool = AccountPool.load(path, size=4, seed=b"seed")
+    assert os.stat(path).st_mtime == 0
+    assert len(pool) == 8
+    assert pool.addresses(8) == addresses
+    pool.close()
+
+    pool = AccountPool.load(path, size=16, seed=b"seed")
+    assert len(pool) == 16
+    assert pool.addresses(8) == addresses
+    pool.close()
+
+    pool = AccountPool.load(path, size=16, seed=b"other seed")
+    assert pool.address(0) != addresses[0]
+    pool.close()
+
+    # a truncated file is regenerated
+    with open(path, "r+b") as f:
+        f.truncate(100)
+    with pytest.raises(ValueError):
+        AccountPool(path)
+    pool = AccountPool.load(path, size=16, seed=b"seed")
+    assert pool.addresses(8) == addresses
+    pool.close()
+
+
+def test_addresses(tmp_path):
+    """
+    testing `addresses()` with and without `start`
+    """
+    pool = AccountPool.load(str(tmp_path / "pool.bin"), size=16, seed=b"seed")
+    assert pool.addresses(0) == []
+    assert pool.addresses(4) == [pool.address(i) for i in range(4)]
+    assert pool.addresses(4, start=12) == [pool.address(i) for i in range(12, 16)]
+    assert len(set(pool.addresses(16))) == 16
+    with pytest.raises(IndexError):
+        pool.addresses(2, start=15)
+    pool.close()
+
+
+def test_fund(account_pool):
+    """
+    testing `fund()` sets the balance of the pool accounts (balance injection, or transfers on older nodes)
+    """
+    indices = list(range(100, 110))
+    balance = 10**18
+    account_pool.fund(indices, balance, funder=accounts[0])
+
+    for index in indices:
+        assert web3.eth.get_balance(account_pool.address(index)) == balance
+    # a funded pool account can send transactions
+    account_pool.account(indices[0]).transfer(accounts[1], 10**17)
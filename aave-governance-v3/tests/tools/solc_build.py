@@ -0,0 +1,282 @@
+"""
+Parallel, incremental solc build driver used by the `compile` target of the Makefile
+
+Purposes:
+- Compiles every changed source through solc's standard-JSON interface, either in a single
+  invocation or split across a pool of solc processes (`--jobs`)
+- Tracks a hash of every source and its transitive imports, so only units whose inputs
+  changed since the last build, or whose outputs were deleted, are recompiled
+- Writes `<Contract>.abi` / `<Contract>.bin` like `solc -o <dir> --abi --bin` and prints a
+  timing summary
+
+Usage (from the project root):
+    python tools/solc_build.py --build-dir build/solc --optimize-runs 10000 --jobs 4 contracts
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+PROJECT_ROOT = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+STATE_FILE = ".solc_build_state.json"
+
+IMPORT_RE = re.compile(r"""^\s*import\s+(?:[^'";]*?\s+from\s+)?['"]([^'"]+)['"]""", re.MULTILINE)
+
+
+def load_brownie_compiler_config():
+    """Remappings and evm version from brownie-config.yaml, so both builds resolve imports the same way."""
+    with open(os.path.join(PROJECT_ROOT, "brownie-config.yaml")) as f:
+        compiler = yaml.safe_load(f).get("compiler", {})
+    solc = compiler.get("solc", {})
+    return solc.get("remappings") or [], compiler.get("evm_version"), solc.get("version")
+
+
+def find_solc(version=None):
+    """`$SOLC`, then `solc` on the PATH, then the binary py-solc-x installed for `version`."""
+    if os.environ.get("SOLC"):
+        return os.environ["SOLC"]
+    if shutil.which("solc"):
+        return "solc"
+    try:
+        import solcx
+
+        return str(solcx.get_executable(version))
+    except Exception:
+        sys.exit("solc not found: install it, set $SOLC or run `brownie compile` once to fetch it")
+
+
+###########################
+##### Dependency Graph ####
+###########################
+
+
+class SourceGraph:
+    """Project-relative source files, their contents and their resolved imports."""
+
+    def __init__(self, remappings):
+        # longest prefix first so nested remappings win
+        pairs = [r.split("=", 1) for r in remappings]
+        self.remappings = sorted(pairs, key=lambda pair: len(pair[0]), reverse=True)
+        self.contents = {}
+        self.imports = {}
+        # files that are imported but do not exist
+        self.missing = set()
+
+    def resolve(self, importer, path):
+        if path.startswith("."):
+            resolved = os.path.join(os.path.dirname(importer), path)
+        else:
+            resolved = path
+            for prefix, target in self.remappings:
+                if path.startswith(prefix):
+                    resolved = target + path[len(prefix) :]
+                    break
+        return os.path.normpath(resolved)
+
+    def load(self, path):
+        """Read `path` and, recursively, everything it imports."""
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            if current in self.contents or current in self.missing:
+                continue
+            try:
+                with open(os.path.join(PROJECT_ROOT, current), encoding="utf-8") as f:
+                    source = f.read()
+            except FileNotFoundError:
+                self.missing.add(current)
+                continue
+            self.contents[current] = source
+            self.imports[current] = [self.resolve(current, i) for i in IMPORT_RE.findall(source)]
+            pending.extend(self.imports[current])
+
+    def closure(self, path):
+        """`path` and every file it transitively imports (import cycles are allowed in Solidity)."""
+        seen = set()
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            if current not in seen:
+                seen.add(current)
+                pending.extend(self.imports.get(current, []))
+        return seen
+
+    def unit_hash(self, path, settings_hash):
+        digest = hashlib.sha256(settings_hash.encode())
+        for dependency in sorted(self.closure(path)):
+            digest.update(dependency.encode())
+            digest.update(hashlib.sha1(self.contents[dependency].encode()).digest())
+        return digest.hexdigest()
+
+
+###################
+##### Compile #####
+###################
+
+
+def standard_json_input(graph, units, settings):
+    sources = set()
+    for unit in units:
+        sources |= graph.closure(unit)
+    return {
+        "language": "Solidity",
+        "sources": {path: {"content": graph.contents[path]} for path in sorted(sources)},
+        "settings": dict(
+            settings,
+            outputSelection={unit: {"*": ["abi", "evm.bytecode.object"]} for unit in units},
+        ),
+    }
+
+
+def compile_units(solc, graph, units, settings):
+    """Run one solc standard-JSON invocation for `units`, return (contracts, errors, seconds)."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [solc, "--standard-json"],
+        input=json.dumps(standard_json_input(graph, units, settings)),
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_ROOT,
+    )
+    if proc.returncode != 0 and not proc.stdout:
+        return {}, [proc.stderr], time.perf_counter() - start
+    output = json.loads(proc.stdout)
+    errors = [e["formattedMessage"] for e in output.get("errors", []) if e["severity"] == "error"]
+    return output.get("contracts", {}), errors, time.perf_counter() - start
+
+
+def write_outputs(build_dir, contracts):
+    """Write the `.abi` / `.bin` files, return {source path: [contract names written]}."""
+    written = {}
+    for path, path_contracts in contracts.items():
+        for name, data in path_contracts.items():
+            with open(os.path.join(build_dir, name + ".abi"), "w") as f:
+                json.dump(data["abi"], f)
+            with open(os.path.join(build_dir, name + ".bin"), "w") as f:
+                f.write(data["evm"]["bytecode"]["object"])
+            written.setdefault(path, []).append(name)
+    return written
+
+
+def outputs_exist(build_dir, names):
+    return all(
+        os.path.exists(os.path.join(build_dir, name + extension)) for name in names for extension in (".abi", ".bin")
+    )
+
+
+def is_up_to_date(build_dir, entry, unit_hash):
+    """True if the unit's inputs are unchanged and every file it wrote last time is still there."""
+    if not isinstance(entry, dict) or entry.get("hash") != unit_hash:
+        return False
+    return outputs_exist(build_dir, entry.get("contracts", []))
+
+
+def chunk(items, count):
+    """Split `items` into at most `count` interleaved, similarly sized chunks."""
+    return [items[i::count] for i in range(min(count, len(items)))]
+
+
+def collect_sources(paths):
+    sources = []
+    for path in paths:
+        path = os.path.relpath(os.path.join(PROJECT_ROOT, path), PROJECT_ROOT)
+        if path.endswith(".sol"):
+            sources.append(path)
+            continue
+        for root, _, files in os.walk(os.path.join(PROJECT_ROOT, path)):
+            for file_name in files:
+                if file_name.endswith(".sol"):
+                    sources.append(os.path.relpath(os.path.join(root, file_name), PROJECT_ROOT))
+    return sorted(sources)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", default=["contracts"], help="files or folders to compile")
+    parser.add_argument("--build-dir", default="build/solc")
+    parser.add_argument("--optimize-runs", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="number of solc processes")
+    parser.add_argument("--force", action="store_true", help="ignore the build state and recompile everything")
+    args = parser.parse_args(argv)
+
+    timings = {}
+    start = time.perf_counter()
+
+    remappings, evm_version, version = load_brownie_compiler_config()
+    settings = {"remappings": remappings, "optimizer": {"enabled": True, "runs": args.optimize_runs}}
+    if evm_version:
+        settings["evmVersion"] = evm_version
+    solc = find_solc(version)
+    solc_version = subprocess.run([solc, "--version"], capture_output=True, text=True).stdout.strip()
+    settings_hash = hashlib.sha256(json.dumps([solc_version, settings], sort_keys=True).encode()).hexdigest()
+
+    build_dir = os.path.join(PROJECT_ROOT, args.build_dir)
+    os.makedirs(build_dir, exist_ok=True)
+    state_path = os.path.join(build_dir, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path) and not args.force:
+        with open(state_path) as f:
+            state = json.load(f)
+
+    graph = SourceGraph(remappings)
+    units = collect_sources(args.sources)
+    for unit in units:
+        graph.load(unit)
+
+    errors = []
+    broken = [unit for unit in units if graph.closure(unit) & graph.missing]
+    for unit in broken:
+        # not fatal, the rest of the tree can still be built
+        print(f"warning: {unit} skipped, missing imports {sorted(graph.closure(unit) & graph.missing)}", file=sys.stderr)
+    units = [unit for unit in units if unit not in broken]
+    hashes = {unit: graph.unit_hash(unit, settings_hash) for unit in units}
+    # a unit whose outputs were deleted (e.g. `make clean` without the state file) is rebuilt too
+    changed = [unit for unit in units if not is_up_to_date(build_dir, state.get(unit), hashes[unit])]
+    timings["scan"] = time.perf_counter() - start
+
+    written = 0
+    solc_seconds = []
+    compile_start = time.perf_counter()
+    if changed:
+        batches = chunk(changed, max(1, args.jobs))
+        with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+            results = pool.map(lambda batch: compile_units(solc, graph, batch, settings), batches)
+            for batch, (contracts, batch_errors, seconds) in zip(batches, results):
+                solc_seconds.append(seconds)
+                errors.extend(batch_errors)
+                outputs = write_outputs(build_dir, contracts)
+                written += sum(len(names) for names in outputs.values())
+                if not batch_errors:
+                    state.update({unit: {"hash": hashes[unit], "contracts": outputs.get(unit, [])} for unit in batch})
+    timings["compile"] = time.perf_counter() - compile_start
+
+    # forget sources that were removed from the tree
+    state = {unit: h for unit, h in state.items() if unit in hashes}
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    timings["total"] = time.perf_counter() - start
+
+    for error in errors:
+        print(error, file=sys.stderr)
+    print(f"{solc_version.splitlines()[-1]}")
+    print(f"sources: {len(units)}, changed: {len(changed)}, up to date: {len(units) - len(changed)}")
+    print(f"solc invocations: {len(solc_seconds)}, contracts written: {written} -> {args.build_dir}")
+    print(
+        f"scan {timings['scan']:.2f}s | compile {timings['compile']:.2f}s"
+        f" (slowest solc {max(solc_seconds, default=0):.2f}s) | total {timings['total']:.2f}s"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Deterministic pool of pre-derived signing accounts
+
+Purposes:
+- Replaces `accounts.add()` when a test needs an account with a known private key
+- Stores the derived private keys and addresses in a compact binary file which is
+  memory-mapped, so the secp256k1 derivation only ever happens once per machine
+  (default `~/.cache/aave-public-tests/account_pool.bin`, shared by every test suite)
+- Funds accounts in bulk via balance injection instead of one transfer per account
+
+File layout (big endian):
+    header:  magic (8 bytes) | version (uint16) | size (uint32) | seed hash (32 bytes)
+    records: private key (32 bytes) | address (20 bytes), `size` times
+
+"""
+
+import mmap
+import os
+import struct
+
+from eth_keys import keys
+from eth_utils import keccak, to_checksum_address
+
+MAGIC = b"AAVEPOOL"
+VERSION = 1
+HEADER = struct.Struct(">8sHI32s")
+KEY_SIZE = 32
+ADDRESS_SIZE = 20
+RECORD_SIZE = KEY_SIZE + ADDRESS_SIZE
+
+DEFAULT_SEED = b"aave-public-tests/account-pool"
+DEFAULT_SIZE = 4096
+
+# secp256k1 group order, private keys must be in [1, N)
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "aave-public-tests", "account_pool.bin")
+
+
+###########################
+##### Key Derivation ######
+###########################
+
+
+def derive_private_key(seed, index):
+    """
+    Derive the private key of the account at `index` from `seed`.
+    The same seed and index always give the same key.
+    """
+    digest = keccak(seed + index.to_bytes(32, byteorder="big"))
+    key = int.from_bytes(digest, byteorder="big") % (SECP256K1_N - 1) + 1
+    return key.to_bytes(KEY_SIZE, byteorder="big")
+
+
+def generate(path=DEFAULT_PATH, size=DEFAULT_SIZE, seed=DEFAULT_SEED):
+    """
+    Derive `size` accounts from `seed` and write them to `path`.
+    This is the only place where public keys are computed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # one temporary file per process: parallel sessions (xdist workers) may generate the same pool
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, keccak(seed)))
+        for index in range(size):
+            private_key = derive_private_key(seed, index)
+            address = keys.PrivateKey(private_key).public_key.to_canonical_address()
+            f.write(private_key + address)
+    # Only expose complete files to other (possibly parallel) test runs
+    os.replace(tmp_path, path)
+
+
+########################
+##### Account Pool #####
+########################
+
+
+class AccountPool:
+    """
+    Read-only view over a memory-mapped account pool file.
+
+    Example:
+    pool = AccountPool.load()
+    signer = pool.account(0)           # brownie LocalAccount, can sign
+    voters = pool.addresses(100, 10)   # checksummed addresses only, no key handling
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, seed_hash = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an account pool file (version {VERSION})")
+        if len(self._map) != HEADER.size + size * RECORD_SIZE:
+            raise ValueError(f"{path} is truncated")
+        self.size = size
+        self.seed_hash = seed_hash
+        # index => brownie account, accounts are only registered with brownie once per session
+        self._accounts = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH, size=DEFAULT_SIZE, seed=DEFAULT_SEED):
+        """
+        Map the pool at `path`, (re)generating it first if it is missing or was built
+        with a different seed or a smaller size.
+        """
+        if os.path.exists(path):
+            try:
+                pool = cls(path)
+                if pool.seed_hash == keccak(seed) and pool.size >= size:
+                    return pool
+                pool.close()
+            except (ValueError, struct.error):
+                pass
+        generate(path, size, seed)
+        return cls(path)
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self._map.close()
+
+    def _offset(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(f"account pool index {index} out of range (size {self.size})")
+        return HEADER.size + index * RECORD_SIZE
+
+    def private_key(self, index):
+        """Raw 32 byte private key of the account at `index`."""
+        offset = self._offset(index)
+        return self._map[offset : offset + KEY_SIZE]
+
+    def address(self, index):
+        """Checksummed address of the account at `index`, read straight from the file."""
+        offset = self._offset(index) + KEY_SIZE
+        return to_checksum_address(self._map[offset : offset + ADDRESS_SIZE])
+
+    def addresses(self, count, start=0):
+        """Checksummed addresses of `count` consecutive accounts starting at `start`."""
+        return [self.address(i) for i in range(start, start + count)]
+
+    def account(self, index):
+        """
+        Brownie account (with its private key) for the account at `index`.
+        The account is added to `brownie.accounts` on first use only.
+        """
+        if index not in self._accounts:
+            # Imported here so the pool file can be generated without a brownie project
+            from brownie import accounts
+
+            self._accounts[index] = accounts.add(self.private_key(index))
+        return self._accounts[index]
+
+    def accounts(self, count, start=0):
+        """Brownie accounts for `count` consecutive pool entries starting at `start`."""
+        return [self.account(i) for i in range(start, start + count)]
+
+    def fund(self, indices, balance, funder=None):
+        """
+        Set the ether balance of the accounts at `indices` to `balance` (in wei).
+
+        Uses balance injection (`evm_setAccountBalance` on ganache >= 7,
+        `hardhat_setBalance` on hardhat), so no transactions are mined.
+        If the node supports neither, falls back to a transfer from `funder`.
+        """
+        from brownie import web3
+
+        for method in ("evm_setAccountBalance", "hardhat_setBalance"):
+            response = web3.provider.make_request(method, [self.address(indices[0]), hex(balance)])
+            if "error" not in response:
+                for index in indices[1:]:
+                    web3.provider.make_request(method, [self.address(index), hex(balance)])
+                return
+
+        if funder is None:
+            raise ValueError("node does not support balance injection and no funder was given")
+        for index in indices:
+            missing = balance - web3.eth.get_balance(self.address(index))
+            if missing > 0:
+                funder.transfer(self.address(index), missing)
@@ -0,0 +1,259 @@
+"""
+Content-addressed cache for brownie build artifacts
+
+Purposes:
+- Keeps compiled contracts outside of `build/`, so the first `brownie compile` of a fresh
+  checkout or of a new Docker container (empty `build/`) is near-instant
+- One script and one cache for every test suite of the repository (`run_docker_tests.sh`
+  mounts the cache into the container)
+
+An artifact is keyed by the solc settings it was actually compiled with (version,
+optimizer, evm_version, as recorded in the artifact) and the path and sha1 of every
+source in its resolved import closure (`allSourcePaths`), so a unit is only reused
+when all of its inputs are byte-for-byte identical. Remappings and other settings
+of the owning suite are not part of the key: they only decide which files are
+imported, which the import closure already captures. Units are not shared between the
+suites today: the delivery suite compiles for london, governance for brownie's default
+evm version, and their OpenZeppelin remappings resolve to different files.
+
+Cache layout (default `~/.cache/aave-public-tests/brownie`, override with `AAVE_COMPILE_CACHE`):
+    objects/<key>.json     brownie build artifact
+    index/<Contract>.json  {key: {"settings": {version, optimizer, evm_version}, "sources": {path: sha1}}}
+
+Usage (from a brownie project, i.e. a folder holding `brownie-config.yaml`, or with `--project`):
+    python ../../tools/compile_cache.py restore   # before `brownie compile` / `brownie test`
+    python ../../tools/compile_cache.py store     # after a successful compile
+
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+import time
+
+import yaml
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "aave-public-tests", "brownie")
+
+
+def cache_dir():
+    return os.environ.get("AAVE_COMPILE_CACHE", DEFAULT_CACHE_DIR)
+
+
+def find_project(path="."):
+    """Closest folder holding a `brownie-config.yaml`, from `path` up."""
+    path = os.path.realpath(path)
+    while not os.path.exists(os.path.join(path, "brownie-config.yaml")):
+        parent = os.path.dirname(path)
+        if parent == path:
+            sys.exit("brownie-config.yaml not found, run from a test suite or pass --project")
+        path = parent
+    return path
+
+
+def build_contracts(project_root):
+    return os.path.join(project_root, "build", "contracts")
+
+
+# brownie's default evm_version when `compiler.evm_version` is null (brownie.project.compiler.EVM_SOLC_VERSIONS)
+EVM_SOLC_VERSIONS = [("istanbul", (0, 5, 13)), ("petersburg", (0, 5, 5)), ("byzantium", (0, 4, 0))]
+
+
+def solc_version(version):
+    """`0.8.20+commit.a1b79de6` / `v0.8.20` -> `0.8.20`."""
+    return str(version).lstrip("v").split("+")[0]
+
+
+def default_evm_version(version):
+    version = tuple(int(i) for i in solc_version(version).split("."))
+    return next((evm for evm, minimum in EVM_SOLC_VERSIONS if version >= minimum), None)
+
+
+def artifact_settings(artifact):
+    """Effective solc settings an artifact was compiled with."""
+    compiler = artifact.get("compiler", {})
+    return {
+        "version": solc_version(compiler.get("version")),
+        "optimizer": compiler.get("optimizer"),
+        "evm_version": compiler.get("evm_version"),
+    }
+
+
+def project_settings(project_root):
+    """Effective solc settings brownie compiles the project with (version None = chosen per pragma)."""
+    with open(os.path.join(project_root, "brownie-config.yaml")) as f:
+        compiler = yaml.safe_load(f).get("compiler", {})
+    solc = compiler.get("solc", {})
+    version = solc.get("version")
+    return {
+        "version": solc_version(version) if version else None,
+        "optimizer": solc.get("optimizer", {"enabled": True, "runs": 200}),
+        "evm_version": compiler.get("evm_version"),
+    }
+
+
+def settings_match(settings, project):
+    """True if a unit compiled with `settings` is what brownie would compile for `project`."""
+    if project["version"] is not None and settings["version"] != project["version"]:
+        return False
+    if settings["optimizer"] != project["optimizer"]:
+        return False
+    evm_version = project["evm_version"] or default_evm_version(settings["version"])
+    return settings["evm_version"] == evm_version
+
+
+@functools.lru_cache(maxsize=None)
+def source_sha1(project_root, relative_path):
+    """sha1 of a project source file, None if it does not exist."""
+    try:
+        with open(os.path.join(project_root, relative_path), "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def relative_source_path(project_root, path):
+    """Project-relative form of a path from `allSourcePaths`, None if it lives outside the project."""
+    if os.path.isabs(path):
+        path = os.path.relpath(path, project_root)
+    if path.startswith(".."):
+        return None
+    return path
+
+
+def artifact_key(settings, contract_name, sources):
+    blob = json.dumps([settings, contract_name, sorted(sources.items())], sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+def write_json(path, data):
+    """Write atomically so parallel runs never read a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+###################
+##### Store #######
+###################
+
+
+def store(project_root):
+    """Copy every up-to-date artifact in build/contracts into the cache."""
+    stored = skipped = 0
+    contracts_dir = build_contracts(project_root)
+    if not os.path.isdir(contracts_dir):
+        return stored, skipped
+
+    for file_name in sorted(os.listdir(contracts_dir)):
+        if not file_name.endswith(".json"):
+            continue
+        artifact = read_json(os.path.join(contracts_dir, file_name))
+        if not artifact or "allSourcePaths" not in artifact or "compiler" not in artifact:
+            skipped += 1
+            continue
+
+        sources = {}
+        for path in artifact["allSourcePaths"].values():
+            relative = relative_source_path(project_root, path)
+            sha1 = source_sha1(project_root, relative) if relative else None
+            if sha1 is None:
+                break
+            sources[relative] = sha1
+        else:
+            contract_name = artifact["contractName"]
+            settings = artifact_settings(artifact)
+            key = artifact_key(settings, contract_name, sources)
+            object_path = os.path.join(cache_dir(), "objects", key + ".json")
+            if not os.path.exists(object_path):
+                write_json(object_path, artifact)
+            index_path = os.path.join(cache_dir(), "index", contract_name + ".json")
+            index = read_json(index_path, {})
+            if key not in index:
+                index[key] = {"settings": settings, "sources": sources}
+                write_json(index_path, index)
+            stored += 1
+            continue
+        # artifact depends on a file that changed or is outside the project
+        skipped += 1
+
+    return stored, skipped
+
+
+###################
+##### Restore #####
+###################
+
+
+def is_current(artifact_path, entry):
+    """True if the artifact already in build/ was compiled from the entry's sources."""
+    artifact = read_json(artifact_path)
+    if not artifact:
+        return False
+    return artifact.get("sha1") == entry["sources"].get(artifact.get("sourcePath"))
+
+
+def restore(project_root):
+    """Restore every cached artifact whose sources and settings match this checkout."""
+    project = project_settings(project_root)
+    restored = current = 0
+    index_dir = os.path.join(cache_dir(), "index")
+    if not os.path.isdir(index_dir):
+        return restored, current
+
+    for file_name in sorted(os.listdir(index_dir)):
+        contract_name = file_name[: -len(".json")]
+        for key, entry in read_json(os.path.join(index_dir, file_name), {}).items():
+            # entries written before units were keyed on their own settings have no "settings"
+            if "settings" not in entry or not settings_match(entry["settings"], project):
+                continue
+            if any(source_sha1(project_root, path) != sha1 for path, sha1 in entry["sources"].items()):
+                continue
+            target = os.path.join(build_contracts(project_root), contract_name + ".json")
+            if is_current(target, entry):
+                current += 1
+                break
+            artifact = read_json(os.path.join(cache_dir(), "objects", key + ".json"))
+            if artifact is None:
+                continue
+            write_json(target, artifact)
+            restored += 1
+            break
+
+    return restored, current
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["restore", "store"])
+    parser.add_argument("--project", default=".", help="brownie project (default: the one holding the current folder)")
+    args = parser.parse_args(argv)
+
+    project_root = find_project(args.project)
+    start = time.perf_counter()
+    if args.action == "restore":
+        restored, current = restore(project_root)
+        summary = f"restored {restored} artifacts, {current} already up to date"
+    else:
+        stored, skipped = store(project_root)
+        summary = f"stored {stored} artifacts, skipped {skipped}"
+    elapsed = time.perf_counter() - start
+    print(f"compile cache ({cache_dir()}): {summary} in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
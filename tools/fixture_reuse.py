@@ -0,0 +1,243 @@
+"""
+Fixture-cost-aware test ordering and module state reuse
+
+Purposes:
+- Measures the setup cost of every fixture (exclusive of its dependencies) and keeps it
+  in the pytest cache between runs
+- Groups test modules that use exactly the same module-scoped fixtures, runs each group
+  back to back and, with `--reuse-fixtures`, builds those fixtures only once per group
+- Reports projected (from the cached costs) and actual savings at the end of the run
+
+Reuse relies on two properties of this suite:
+- every test runs inside `fn_isolation`, so the chain is back at the "module fixtures
+  built" state once a module finishes
+- module fixtures have no teardown, so their values stay valid as long as the chain
+  is not reset
+Between two modules of a group the chain is therefore not reset and the cached fixture
+values are handed to the next module. The chain is reset at the start and end of
+every group, which is what brownie's `module_isolation` does for every module.
+
+Fixtures are identified by their definition (the folder / module defining them and their
+function), not their name: two modules defining their own fixture under the same name
+never share it. Handing out a cached value relies on pytest internals
+(`FixtureDef.cached_result`), so `--reuse-fixtures` requires the pytest version pinned in
+requirements.txt.
+
+"""
+
+import time
+
+import pytest
+
+CACHE_KEY = "fixture_reuse/costs"
+# `FixtureCache` fills `FixtureDef.cached_result` the way this pytest version does
+SUPPORTED_PYTEST = "6.2."
+
+# Never reused, these are what implement isolation
+ISOLATION_FIXTURES = {"mod_isolation", "module_isolation"}
+
+
+def module_id(item):
+    return item.nodeid.split("::")[0]
+
+
+def fixture_key(fixturedef):
+    """Identity of a fixture definition: where it is defined (baseid) and its function."""
+    return (fixturedef.baseid, fixturedef.func)
+
+
+def fixture_id(fixturedef):
+    """Readable, JSON-friendly form of `fixture_key`, for the cached costs and the report."""
+    return f"{fixturedef.baseid or '<root>'}::{fixturedef.argname}"
+
+
+def module_fixtures(item):
+    """
+    {fixture_key: fixture_id} of the module-scoped fixtures `item` requests (directly or
+    through other fixtures), resolved to the definition visible from `item`.
+    """
+    name2fixturedefs = item._fixtureinfo.name2fixturedefs
+    fixtures = {}
+    for name in item.fixturenames:
+        if name not in name2fixturedefs or name in ISOLATION_FIXTURES:
+            continue
+        fixturedef = name2fixturedefs[name][-1]
+        if fixturedef.scope == "module":
+            fixtures[fixture_key(fixturedef)] = fixture_id(fixturedef)
+    return fixtures
+
+
+def register(config):
+    """Register the plugins, called from `pytest_configure` in conftest.py."""
+    if config.getoption("--reuse-fixtures") and not pytest.__version__.startswith(SUPPORTED_PYTEST):
+        raise pytest.UsageError(
+            f"--reuse-fixtures needs pytest {SUPPORTED_PYTEST}x (see requirements.txt), found {pytest.__version__}"
+        )
+    plugin = FixtureReuse(config)
+    config.pluginmanager.register(plugin, "fixture_reuse")
+    config.pluginmanager.register(FixtureCache(plugin), "fixture_reuse_cache")
+    return plugin
+
+
+class FixtureReuse:
+    """Pytest plugin measuring fixture costs and planning the module order."""
+
+    def __init__(self, config):
+        self.config = config
+        self.reuse = config.getoption("--reuse-fixtures")
+        self.report = self.reuse or config.getoption("--fixture-costs")
+        # fixture id => setup seconds, from previous runs
+        self.previous_costs = config.cache.get(CACHE_KEY, {})
+        # fixture id => setup seconds measured in this run
+        self.costs = {}
+        # module id => index of its group, and the module that runs after it
+        self.group_of = {}
+        self.next_module = {}
+        self.groups = []
+        self.projected_savings = 0.0
+        # fixture key => (value, measured setup seconds) for the group currently running
+        self.cache = {}
+        self._running_group = None
+        self.builds = 0
+        self.reuses = 0
+        self.actual_savings = 0.0
+        self.setup_failed = False
+
+    ######################
+    ##### Collection #####
+    ######################
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, config, items):
+        """Group modules with identical module fixtures, keeping the first-seen order."""
+        modules = {}
+        for item in items:
+            modules.setdefault(module_id(item), []).append(item)
+
+        groups = {}
+        for module, module_items in modules.items():
+            # skipped tests (e.g. slow tests without --runslow) never set up fixtures
+            active = [i for i in module_items if not i.get_closest_marker("skip")]
+            fixtures = {}
+            for item in active:
+                fixtures.update(module_fixtures(item))
+            groups.setdefault(frozenset(fixtures), (fixtures, []))[1].append(module)
+
+        order = []
+        for index, (fixtures, group_modules) in enumerate(groups.values()):
+            self.groups.append((fixtures, group_modules))
+            cost = sum(self.previous_costs.get(name, 0.0) for name in fixtures.values())
+            self.projected_savings += cost * (len(group_modules) - 1)
+            for module in group_modules:
+                self.group_of[module] = index
+                order.append(module)
+
+        for module, following in zip(order, order[1:] + [None]):
+            self.next_module[module] = following
+
+        if self.reuse:
+            items[:] = [item for module in order for item in modules[module]]
+
+    ####################
+    ##### Fixtures #####
+    ####################
+
+    def continues_group(self, module):
+        """True if `module` can start from the state the previous module left behind."""
+        return bool(self.cache) and self.group_of.get(module) == self._running_group
+
+    def group_continues_after(self, module):
+        following = self.next_module.get(module)
+        return following is not None and self.group_of.get(following) == self.group_of.get(module)
+
+    def module_isolation(self, module):
+        """Body of the `module_isolation` fixture override in conftest.py."""
+        from brownie import chain
+        from brownie._config import CONFIG
+
+        if not self.reuse or not self.continues_group(module):
+            chain.reset()
+            self.cache.clear()
+            self.setup_failed = False
+        self._running_group = self.group_of.get(module)
+        yield
+        if CONFIG.argv["interrupt"]:
+            return
+        if not self.reuse or self.setup_failed or not self.group_continues_after(module):
+            chain.reset()
+            self.cache.clear()
+            self._running_group = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        """Measure every fixture setup and keep module fixture values for the rest of the group."""
+        key = fixture_key(fixturedef)
+        reused = key in self.cache
+        start = time.perf_counter()
+        outcome = yield
+        elapsed = time.perf_counter() - start
+        if reused:
+            return
+        if outcome.excinfo is not None:
+            self.setup_failed = True
+            return
+        self.costs[fixture_id(fixturedef)] = elapsed
+        if fixturedef.scope == "module" and fixturedef.argname not in ISOLATION_FIXTURES:
+            self.builds += 1
+            if self.reuse:
+                self.cache[key] = (outcome.get_result(), elapsed)
+
+    ###################
+    ##### Report ######
+    ###################
+
+    def pytest_sessionfinish(self, session):
+        costs = dict(self.previous_costs)
+        costs.update(self.costs)
+        self.config.cache.set(CACHE_KEY, costs)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.report:
+            return
+        tr = terminalreporter
+        tr.section("fixture costs")
+        expensive = sorted(self.costs.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        for name, seconds in expensive:
+            tr.write_line(f"{seconds:8.3f}s  {name}")
+        shared = [g for g in self.groups if len(g[1]) > 1]
+        tr.write_line(
+            f"{len(self.group_of)} modules in {len(self.groups)} fixture groups"
+            f" ({len(shared)} shared by more than one module)"
+        )
+        tr.write_line(f"projected savings (previous run costs): {self.projected_savings:.2f}s")
+        if self.reuse:
+            tr.write_line(
+                f"actual savings: {self.actual_savings:.2f}s"
+                f" ({self.reuses} fixture setups reused, {self.builds} built)"
+            )
+        else:
+            tr.write_line("run with --reuse-fixtures to build each group's module fixtures once")
+
+
+class FixtureCache:
+    """
+    Pytest plugin returning cached module fixture values.
+    Kept apart from `FixtureReuse` because it needs a `tryfirst` implementation of
+    `pytest_fixture_setup` next to the measuring hookwrapper.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        """Hand out the value built by an earlier module of the same group."""
+        key = fixture_key(fixturedef)
+        if not self.plugin.reuse or key not in self.plugin.cache:
+            return None
+        value, cost = self.plugin.cache[key]
+        # same bookkeeping as pytest's own pytest_fixture_setup (SUPPORTED_PYTEST, checked in `register`)
+        fixturedef.cached_result = (value, fixturedef.cache_key(request), None)
+        self.plugin.reuses += 1
+        self.plugin.actual_savings += cost
+        return value
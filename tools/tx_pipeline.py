@@ -0,0 +1,201 @@
+"""
+Pipelined transaction submission for fixtures and load scripts
+
+Purposes:
+- Queues deployments and calls, precomputing the nonce of every transaction and the
+  address of every deployed contract, so later steps can already reference them
+- Submits the whole queue back-to-back without waiting for receipts in between, then
+  collects all the receipts together
+- Hands back brownie contract objects, like `Container.deploy()` and `build_deployer` do
+
+Dependencies:
+A step may use the address of any step queued before it (a `Pending` can be passed
+anywhere an address is expected). Transactions of one sender are mined in nonce order,
+and steps are submitted in queue order, so a contract always exists before a later step
+touches it. What cannot be pipelined is a step that needs the *result* of an earlier
+one (an event, a return value, a view call on a contract that is not mined yet):
+call `flush()` before queueing it.
+
+Example:
+pipeline = TxPipeline()
+oracle = pipeline.deploy(CLEmergencyOracleMock, sender=owner)
+logic = pipeline.deploy(CrossChainControllerWithEmergencyMode, oracle, sender=owner)
+pipeline.flush()
+logic.contract  # ProjectContract, same as CrossChainControllerWithEmergencyMode[-1]
+
+"""
+
+import json
+import os
+
+import brownie
+from brownie import web3
+from hexbytes import HexBytes
+
+def load_compiled(file_name):
+    """ABI and bytecode of a JSON artifact from the "compiled" folder of the brownie project under test."""
+    with open(os.path.join(str(brownie.project.check_for_project()), "compiled", file_name)) as f:
+        data = json.load(f)
+    return data["abi"], data["bytecode"]
+
+
+def resolve(value):
+    """Replace accounts, contracts and `Pending` deployments (also inside lists / tuples) with their address."""
+    if hasattr(value, "address") and not isinstance(value, str):
+        return value.address
+    if isinstance(value, (list, tuple)):
+        return type(value)(resolve(v) for v in value)
+    return value
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Pending:
+    """A queued transaction. For deployments `address` is known before it is mined."""
+
+    def __init__(self, label, sender, nonce, data, to=None, address=None, abi=None, build=None):
+        self.label = label
+        self.sender = sender
+        self.nonce = nonce
+        self.data = data
+        self.to = to
+        self.address = address
+        self.abi = abi
+        # called with the receipt once mined, returns the brownie contract object
+        self._build = build
+        self.tx_hash = None
+        self.receipt = None
+        self._contract = None
+
+    def __str__(self):
+        return self.address or self.label
+
+    def __repr__(self):
+        return f"<Pending {self.label} nonce={self.nonce} address={self.address}>"
+
+    @property
+    def contract(self):
+        """Brownie contract object for a deployment, available after `flush()`."""
+        if self.receipt is None:
+            raise PipelineError(f"{self.label} has not been flushed yet")
+        if self._contract is None and self._build is not None:
+            self._contract = self._build(self.receipt)
+        return self._contract
+
+
+class TxPipeline:
+    """
+    Queue of transactions submitted back-to-back on `flush()`.
+    Senders must not send other transactions between queueing and `flush()`,
+    since their nonces are reserved when the first step is queued.
+    """
+
+    def __init__(self, gas_price=0):
+        self.gas_price = gas_price
+        self.queue = []
+        # sender address => next nonce to hand out
+        self._nonces = {}
+        self._gas_limit = None
+
+    def __len__(self):
+        return len(self.queue)
+
+    def _next_nonce(self, sender):
+        address = str(sender)
+        if address not in self._nonces:
+            self._nonces[address] = web3.eth.get_transaction_count(address, "pending")
+        nonce = self._nonces[address]
+        self._nonces[address] += 1
+        return nonce
+
+    def _queue(self, label, sender, data, to=None, abi=None, build=None):
+        nonce = self._next_nonce(sender)
+        address = None
+        if to is None:
+            address = sender.get_deployment_address(nonce)
+        step = Pending(label, sender, nonce, HexBytes(data).hex(), to, address, abi, build)
+        self.queue.append(step)
+        return step
+
+    #################
+    ##### Steps #####
+    #################
+
+    def deploy(self, container, *args, sender):
+        """Queue `container.deploy(*args, {"from": sender})`."""
+        data = container.deploy.encode_input(*resolve(args))
+        return self._queue(
+            container._name,
+            sender,
+            data,
+            abi=container.abi,
+            build=lambda receipt: container.at(receipt.contractAddress),
+        )
+
+    def deploy_compiled(self, file_name, *args, sender):
+        """Queue a `build_deployer(file_name, sender, *args)` deployment."""
+        abi, bytecode = load_compiled(file_name)
+        data = web3.eth.contract(abi=abi, bytecode=bytecode).constructor(*resolve(args)).data_in_transaction
+        return self._queue(
+            file_name,
+            sender,
+            data,
+            abi=abi,
+            build=lambda receipt: brownie.network.contract.Contract.from_abi(
+                "contract", receipt.contractAddress, abi
+            ),
+        )
+
+    def transact(self, target, fn_name, *args, sender):
+        """Queue `target.fn_name(*args, {"from": sender})`, `target` is a contract or a `Pending` deployment."""
+        data = web3.eth.contract(abi=target.abi).encodeABI(fn_name=fn_name, args=list(resolve(args)))
+        return self._queue(f"{target}.{fn_name}()", sender, data, to=str(resolve(target)))
+
+    ##################
+    ##### Submit #####
+    ##################
+
+    def _send(self, step):
+        tx = {
+            "from": str(step.sender),
+            "nonce": step.nonce,
+            "gas": self._gas_limit,
+            "gasPrice": self.gas_price,
+            "data": step.data,
+            "value": 0,
+        }
+        if step.to is not None:
+            tx["to"] = step.to
+        if hasattr(step.sender, "private_key"):
+            # LocalAccount (e.g. from the account pool), the node can't sign for it
+            tx["chainId"] = web3.eth.chain_id
+            signed = web3.eth.account.sign_transaction(tx, step.sender.private_key)
+            return web3.eth.send_raw_transaction(signed.rawTransaction)
+        return web3.eth.send_transaction(tx)
+
+    def flush(self):
+        """Submit every queued step without waiting, then wait for all receipts."""
+        steps, self.queue = self.queue, []
+        self._nonces.clear()
+        if not steps:
+            return []
+        self._gas_limit = web3.eth.get_block("latest").gasLimit
+
+        for step in steps:
+            try:
+                step.tx_hash = self._send(step)
+            except ValueError as e:
+                raise PipelineError(f"{step.label} (nonce {step.nonce}) was rejected: {e}") from e
+
+        for step in steps:
+            step.receipt = web3.eth.wait_for_transaction_receipt(step.tx_hash)
+            if step.receipt.status != 1:
+                raise PipelineError(f"{step.label} (nonce {step.nonce}) reverted")
+            if step.address is not None and step.receipt.contractAddress != step.address:
+                raise PipelineError(
+                    f"{step.label} deployed at {step.receipt.contractAddress}, expected {step.address}"
+                )
+
+        return [step.receipt for step in steps]